@@ -0,0 +1,146 @@
+import math
+import time
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Union
+from langchain_core.embeddings import Embeddings
+
+
+@dataclass
+class AnswerCacheEntry:
+
+    """
+    Data class for a cached answer.
+    """
+
+    query_vector: List[float]
+    answer: str
+    created_at: float
+
+
+class SemanticAnswerCache:
+
+    """
+    Cache of generated answers looked up by the semantic similarity of the query.
+
+    A query whose embedding is close enough to an earlier query gets the earlier answer back
+    without retrieval or generation. Entries expire after a TTL, the least recently used entries
+    are evicted beyond max_entries and the whole cache is dropped when the corpus version changes.
+    """
+
+    def __init__(
+            self,
+            embedding: Embeddings,
+            similarity_threshold: float = 0.92,
+            ttl_seconds: float = 3600,
+            max_entries: int = 256
+        ):
+
+        """Initialize SemanticAnswerCache class.
+
+        Args:
+            embedding (Embeddings): Embedding model for the queries
+            similarity_threshold (float, optional): Minimum cosine similarity for a query to reuse an answer. Defaults to 0.92.
+            ttl_seconds (float, optional): Seconds an answer stays valid. Defaults to 3600.
+            max_entries (int, optional): Maximum number of cached answers. Defaults to 256.
+        """
+
+        self.embedding: Embeddings = embedding
+        self.similarity_threshold: float = similarity_threshold
+        self.ttl_seconds: float = ttl_seconds
+        self.max_entries: int = max_entries
+        self.hits: int = 0
+        self.misses: int = 0
+        self.invalidations: int = 0
+        self._entries: "OrderedDict[str, AnswerCacheEntry]" = OrderedDict()
+        self._corpus_version: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _cosine_similarity(a: List[float], b: List[float]) -> float:
+
+        dot = sum(x * y for x, y in zip(a, b))
+        norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+        return dot / norm if norm else 0.0
+
+    def _sync_corpus_version(self, corpus_version: int) -> None:
+
+        # answers were generated from the old corpus, so none of them can be trusted anymore
+        if corpus_version != self._corpus_version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._corpus_version = corpus_version
+
+    def _evict_expired(self, now: float) -> None:
+
+        expired = [query for query, entry in self._entries.items() if now - entry.created_at > self.ttl_seconds]
+        for query in expired:
+            del self._entries[query]
+
+    def lookup(self, query: str, corpus_version: int) -> Optional[str]:
+
+        """Find the answer of the most similar cached query.
+
+        Args:
+            query (str): User query
+            corpus_version (int): Version of the ingested corpus
+
+        Returns:
+            Optional[str]: Cached answer or None on a miss
+        """
+
+        query_vector = self.embedding.embed_query(query)
+        with self._lock:
+            self._sync_corpus_version(corpus_version)
+            self._evict_expired(time.time())
+
+            best_query, best_similarity = None, self.similarity_threshold
+            for cached_query, entry in self._entries.items():
+                similarity = self._cosine_similarity(query_vector, entry.query_vector)
+                if similarity >= best_similarity:
+                    best_query, best_similarity = cached_query, similarity
+
+            if best_query is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._entries.move_to_end(best_query)
+            return self._entries[best_query].answer
+
+    def store(self, query: str, corpus_version: int, answer: str) -> None:
+
+        """Cache the answer to a query.
+
+        Args:
+            query (str): User query
+            corpus_version (int): Version of the corpus the answer was generated from
+            answer (str): Generated answer
+        """
+
+        query_vector = self.embedding.embed_query(query)
+        with self._lock:
+            self._sync_corpus_version(corpus_version)
+            self._entries[query] = AnswerCacheEntry(query_vector, answer, time.time())
+            self._entries.move_to_end(query)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+
+        """Hit and miss counters of the cache.
+
+        Returns:
+            Dict[str, Union[int, float]]: hits, misses, hit_rate, invalidations and entries
+        """
+
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "entries": len(self._entries)
+        }
@@ -0,0 +1,546 @@
+import os
+import re
+import sys
+import json
+import zlib
+import time
+import math
+import random
+import shutil
+import argparse
+import logging
+import platform
+import tempfile
+import threading
+import os.path as osp
+from typing import Any, Dict, Iterator, List, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+# offline benchmark of the ingestion and query pipeline: the Groq chat models and the
+# HuggingFace embedding are replaced by local stand-ins with configurable latency, so
+# throughput and latency can be tracked across changes without network access
+
+_WORDS = (
+    "ocean current salinity temperature pressure sensor buoy depth station survey sample "
+    "reading calibration drift tide wave height period vessel cruise transect profile "
+    "instrument deployment recovery battery voltage logger interval average maximum minimum "
+    "anomaly threshold alert report quality control flag season region coastal offshore"
+).split()
+
+_calls_lock = threading.Lock()
+
+
+class FakeChatModel(BaseChatModel):
+
+    """
+    Chat model stand-in answering from its prompt after a fixed latency.
+
+    Packed summary prompts get a JSON object with one summary per item, every other prompt gets
+    the first words of its text back. Streaming yields one word at a time.
+    """
+
+    model_name: str = "fake-chat"
+    latency: float = 0.2
+    """Seconds before the first token."""
+    token_latency: float = 0.0
+    """Seconds per streamed token."""
+    answer_words: int = 40
+    """Number of words of every answer or summary."""
+    calls: int = 0
+    """Number of requests answered."""
+
+    @property
+    def _llm_type(self) -> str:
+
+        return "fake-chat"
+
+    def _answer(self, messages: List[BaseMessage]) -> str:
+
+        with _calls_lock:
+            self.calls += 1
+
+        content = messages[-1].content
+        if isinstance(content, list):
+            content = "\n".join(part.get('text', '') for part in content if isinstance(part, dict))
+        words: List[str] = content.split()
+
+        # packed summary requests from Summarizer.summarize_packed
+        items = re.findall(r"^Item (\d+) \(", content, re.MULTILINE)
+        if items:
+            return json.dumps({number: " ".join(words[:self.answer_words]) for number in items})
+        return " ".join(words[-self.answer_words:])
+
+    def _usage(self, messages: List[BaseMessage], answer: str) -> dict:
+
+        prompt_chars = sum(len(str(message.content)) for message in messages)
+        input_tokens, output_tokens = math.ceil(prompt_chars / 4), math.ceil(len(answer) / 4)
+        return {"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+
+        time.sleep(self.latency)
+        answer = self._answer(messages)
+        time.sleep(self.token_latency * len(answer.split()))
+        message = AIMessage(content=answer, usage_metadata=self._usage(messages, answer))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+
+        time.sleep(self.latency)
+        answer = self._answer(messages)
+        for word in answer.split():
+            time.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._usage(messages, answer)))
+
+
+class FakeEmbeddings(Embeddings):
+
+    """
+    Embedding stand-in hashing words into a fixed size vector after a configurable latency.
+
+    Texts sharing words get similar vectors, so retrieval results stay meaningful.
+    """
+
+    def __init__(self, size: int = 768, batch_latency: float = 0.01, text_latency: float = 0.002):
+
+        """Initialize FakeEmbeddings class.
+
+        Args:
+            size (int, optional): Vector size. Defaults to 768, the size of all-mpnet-base-v2.
+            batch_latency (float, optional): Seconds per embed call. Defaults to 0.01.
+            text_latency (float, optional): Seconds per embedded text. Defaults to 0.002.
+        """
+
+        self.size: int = size
+        self.batch_latency: float = batch_latency
+        self.text_latency: float = text_latency
+
+    def _vector(self, text: str) -> List[float]:
+
+        vector = [0.0] * self.size
+        for word in re.findall(r"\w+", text.lower()):
+            vector[zlib.crc32(word.encode('utf-8')) % self.size] += 1.0
+        norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+        return [x / norm for x in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+
+        time.sleep(self.batch_latency + self.text_latency * len(texts))
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+
+        time.sleep(self.batch_latency + self.text_latency)
+        return self._vector(text)
+
+
+class SyntheticEmbeddings(Embeddings):
+
+    """
+    Embedding stand-in for vector store benchmarks, mapping "chunk <i>" to a fixed random vector.
+
+    Every vector is generated from its own seed, so millions of them are never held at once.
+    The query "query <i>" gets the vector of chunk i plus noise, chunk i is its expected nearest neighbour.
+    """
+
+    def __init__(self, size: int = 768, noise: float = 1.0, seed: int = 0):
+
+        """Initialize SyntheticEmbeddings class.
+
+        Args:
+            size (int, optional): Vector size. Defaults to 768, the size of all-mpnet-base-v2.
+            noise (float, optional): Scale of the noise added to query vectors, relative to the vectors. Defaults to 1.0.
+            seed (int, optional): Seed of the vectors. Defaults to 0.
+        """
+
+        self.size: int = size
+        self.noise: float = noise
+        self.seed: int = seed
+
+    def _vector(self, kind: int, index: int) -> np.ndarray:
+
+        return np.random.default_rng((self.seed, kind, index)).standard_normal(self.size, dtype=np.float32)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+
+        return np.stack([self._vector(0, int(text.rsplit(" ", 1)[1])) for text in texts]).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+
+        index = int(text.rsplit(" ", 1)[1])
+        return (self._vector(0, index) + self.noise * self._vector(1, index)).tolist()
+
+
+def _directory_size(path: str) -> int:
+
+    return sum(osp.getsize(osp.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def _rss_bytes() -> Optional[int]:
+
+    # psutil is only used when it is installed
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss
+
+
+def run_vector_store_benchmark(num_chunks: int, work_dir: str, args: argparse.Namespace) -> List[Dict[str, Any]]:
+
+    """Compare the insert time, memory and query latency of the vector store backends.
+
+    Every backend stores the same synthetic vectors. Queries are noisy copies of random chunks,
+    recall is the share of queries whose chunk is among the k results.
+
+    Args:
+        num_chunks (int): Number of stored vectors
+        work_dir (str): Directory for the stores of this run
+        args (argparse.Namespace): Benchmark options
+
+    Returns:
+        List[Dict[str, Any]]: Measurements per backend
+    """
+
+    from quantized_vector_store import QuantizedVectorStore
+
+    embedding = SyntheticEmbeddings()
+    rng = random.Random(num_chunks)
+    query_indices = [rng.randrange(num_chunks) for _ in range(args.vector_queries)]
+    results: List[Dict[str, Any]] = []
+
+    for backend in args.vector_backends.split(","):
+        persist_directory = osp.join(work_dir, f"{backend}_{num_chunks}")
+        if backend == "chroma":
+            # imported here, so the quantized backends can be measured without chroma installed
+            from langchain_chroma import Chroma
+            store = Chroma(collection_name="benchmark", embedding_function=embedding, persist_directory=persist_directory)
+        else:
+            dtype, _, index = backend.partition("-")
+            store = QuantizedVectorStore(embedding, persist_directory, dtype=dtype, index=index or "exact")
+
+        rss_before = _rss_bytes()
+        start = time.perf_counter()
+        for batch_start in range(0, num_chunks, 4096):
+            texts = [f"chunk {i}" for i in range(batch_start, min(num_chunks, batch_start + 4096))]
+            store.add_texts(texts, [{"doc_id": text} for text in texts], ids=texts)
+        insert_seconds = time.perf_counter() - start
+
+        store.similarity_search_with_relevance_scores(f"query {query_indices[0]}", k=args.k)
+        samples: List[float] = []
+        hits = 0
+        for index in query_indices:
+            start = time.perf_counter()
+            documents = store.similarity_search_with_relevance_scores(f"query {index}", k=args.k)
+            samples.append(time.perf_counter() - start)
+            hits += any(document.metadata.get("doc_id") == f"chunk {index}" for document, _ in documents)
+        rss_after = _rss_bytes()
+
+        results.append({
+            "backend": backend,
+            "chunks": num_chunks,
+            "insert_seconds": insert_seconds,
+            "chunks_per_second": num_chunks / insert_seconds if insert_seconds else None,
+            "disk_bytes": _directory_size(persist_directory),
+            # includes the pages of the memory-mapped vectors touched by the queries
+            "rss_growth_bytes": rss_after - rss_before if rss_before is not None else None,
+            "query": latency_stats(samples),
+            f"recall_at_{args.k}": hits / len(query_indices) if query_indices else None,
+            **({"store": store.stats()} if backend != "chroma" else {})
+        })
+        del store
+    return results
+
+
+def _pdf_text(text: str) -> str:
+
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_synthetic_pdf(num_pages: int, table_every: int = 4, seed: int = 0) -> bytes:
+
+    """Write a pdf with titled paragraphs and ruled tables, without any pdf library.
+
+    Args:
+        num_pages (int): Number of pages
+        table_every (int, optional): Every table_every-th page holds a ruled table, 0 for text only. Defaults to 4.
+        seed (int, optional): Seed of the generated words and numbers. Defaults to 0.
+
+    Returns:
+        bytes: Content of the pdf
+    """
+
+    rng = random.Random(seed)
+    page_ids = [4 + 2 * i for i in range(num_pages)]
+    objects: Dict[int, bytes] = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        2: ("<< /Type /Pages /Kids [%s] /Count %d >>" % (" ".join(f"{i} 0 R" for i in page_ids), num_pages)).encode(),
+        3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"
+    }
+
+    for page_index, page_id in enumerate(page_ids):
+        ops: List[str] = [f"BT /F1 16 Tf 72 750 Td ({_pdf_text(f'Section {page_index + 1} {rng.choice(_WORDS).title()} Report')}) Tj ET"]
+        y = 720
+        if table_every and (page_index + 1) % table_every == 0:
+            # a ruled grid, which pdfplumber reports as a table
+            rows, cols, cell_width, cell_height = 6, 4, 110, 20
+            for row in range(rows):
+                for col in range(cols):
+                    x, cell_y = 72 + col * cell_width, y - (row + 1) * cell_height
+                    ops.append(f"{x} {cell_y} {cell_width} {cell_height} re S")
+                    if row == 0:
+                        cell = rng.choice(_WORDS).title()
+                    elif col == 0:
+                        cell = f"ST-{rng.randint(100, 999)}"
+                    else:
+                        cell = f"{rng.uniform(0, 100):.2f}"
+                    ops.append(f"BT /F1 10 Tf {x + 4} {cell_y + 6} Td ({_pdf_text(cell)}) Tj ET")
+            y -= rows * cell_height + 30
+
+        ops.append(f"BT /F1 11 Tf 14 TL 72 {y} Td")
+        while y > 80:
+            line = " ".join(rng.choice(_WORDS) for _ in range(12))
+            if rng.random() < 0.2:
+                line += f" AB-{rng.randint(1000, 9999)}"
+            ops.append(f"({_pdf_text(line)}) Tj T*")
+            y -= 14
+        ops.append("ET")
+
+        stream = "\n".join(ops).encode("latin-1")
+        objects[page_id] = (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {page_id + 1} 0 R >>"
+        ).encode()
+        objects[page_id + 1] = b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream)
+
+    pdf = bytearray(b"%PDF-1.4\n")
+    offsets: Dict[int, int] = {}
+    for object_id in sorted(objects):
+        offsets[object_id] = len(pdf)
+        pdf += b"%d 0 obj\n%s\nendobj\n" % (object_id, objects[object_id])
+
+    xref_offset = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for object_id in sorted(objects):
+        pdf += b"%010d 00000 n \n" % offsets[object_id]
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset)
+    return bytes(pdf)
+
+
+def latency_stats(samples: List[float]) -> Dict[str, float]:
+
+    """Summarize latency samples.
+
+    Args:
+        samples (List[float]): Seconds per operation
+
+    Returns:
+        Dict[str, float]: count, mean, p50, p95 and max in seconds
+    """
+
+    from metrics import percentile
+
+    if not samples:
+        return {"count": 0}
+    return {
+        "count": len(samples),
+        "mean": sum(samples) / len(samples),
+        "p50": percentile(samples, 0.50),
+        "p95": percentile(samples, 0.95),
+        "max": max(samples)
+    }
+
+
+def run_benchmark(num_pages: int, work_dir: str, args: argparse.Namespace, chat_model: FakeChatModel, embedding: Embeddings) -> Dict[str, Any]:
+
+    """Run every stage of the pipeline on one synthetic pdf.
+
+    Args:
+        num_pages (int): Number of pages of the synthetic pdf
+        work_dir (str): Directory for the pdf, the images and the databases of this run
+        args (argparse.Namespace): Benchmark options
+        chat_model (FakeChatModel): Chat model stand-in, its request counter is reported
+        embedding (Embeddings): Embedding model used for the embedding stage
+
+    Returns:
+        Dict[str, Any]: Measurements per stage
+    """
+
+    from summarizer import Summarizer
+    from summary_cache import SummaryCache
+    from data_ingestor import DataIngestor
+    from retriever import Retriever
+    from multi_modal_rag import MultiModalRAG
+    from ingestion_manifest import chunk_fingerprint
+    from metrics import METRICS
+
+    os.makedirs(work_dir, exist_ok=True)
+    pdf_path = osp.join(work_dir, f"synthetic_{num_pages}.pdf")
+    with open(pdf_path, "wb") as f:
+        f.write(make_synthetic_pdf(num_pages, args.table_every, seed=num_pages))
+
+    # a fresh summary cache and metrics per run, so every summary is requested and counted
+    METRICS.reset()
+    Summarizer.cache = SummaryCache(osp.join(work_dir, "summary_cache.db"))
+    result: Dict[str, Any] = {"pages": num_pages}
+
+    data_ingestor = DataIngestor(
+        pdf_path,
+        image_output_dir_path=osp.join(work_dir, "figures"),
+        extraction_workers=args.workers
+    )
+    data_ingestor.locate_data()
+    start = time.perf_counter()
+    data_instances = list(data_ingestor.iter_text_tables_images())
+    elapsed = time.perf_counter() - start
+    result["extraction"] = {
+        "seconds": elapsed,
+        "pages_per_second": num_pages / elapsed if elapsed else None,
+        "chunks": len(data_instances),
+        "page_strategies": {s: data_ingestor.page_strategy_report[pdf_path].count(s) for s in set(data_ingestor.page_strategy_report[pdf_path])}
+    }
+
+    calls_before = chat_model.calls
+    start = time.perf_counter()
+    data_summaries = [s for batch in data_ingestor.iter_summaries(data_instances, args.batch_size) for s in batch]
+    elapsed = time.perf_counter() - start
+    result["summarization"] = {
+        "seconds": elapsed,
+        "chunks_per_second": len(data_summaries) / elapsed if elapsed else None,
+        "summaries": len(data_summaries),
+        "requests": chat_model.calls - calls_before,
+        "policy": data_ingestor.summary_policy.stats()
+    }
+
+    texts = [d.summary for d in data_summaries]
+    start = time.perf_counter()
+    embedding.embed_documents(texts)
+    elapsed = time.perf_counter() - start
+    result["embedding"] = {"seconds": elapsed, "texts_per_second": len(texts) / elapsed if elapsed else None}
+
+    retriever = Retriever(
+        collection_name=f"benchmark_{num_pages}",
+        persist_directory=osp.join(work_dir, "chroma_db"),
+        docstore_path=osp.join(work_dir, "docstore.db"),
+        k=args.k
+    )
+    ids = [chunk_fingerprint(d.data_type, d.data) for d in data_summaries]
+    start = time.perf_counter()
+    for batch_start in range(0, len(data_summaries), args.batch_size):
+        batch_end = batch_start + args.batch_size
+        retriever._ingest_data_into_db(data_summaries[batch_start:batch_end], ids[batch_start:batch_end])
+    elapsed = time.perf_counter() - start
+    # insertion embeds the summaries again, the vector database gets the same model
+    result["insert"] = {"seconds": elapsed, "chunks_per_second": len(ids) / elapsed if elapsed else None}
+
+    rng = random.Random(num_pages)
+    queries = [f"What is the {rng.choice(_WORDS)} {rng.choice(_WORDS)} reported for {rng.choice(_WORDS)}?" for _ in range(args.queries)]
+
+    rag = MultiModalRAG(retriever=retriever)
+    retrieval_samples: List[float] = []
+    prompt_samples: List[float] = []
+    for query in queries:
+        start = time.perf_counter()
+        retrieved_data = retriever.retriever.invoke(query)
+        retrieval_samples.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        rag.create_query_context_prompt({'query': query, 'retrieved_data': retrieved_data})
+        prompt_samples.append(time.perf_counter() - start)
+    result["retrieval"] = latency_stats(retrieval_samples)
+    result["prompt_assembly"] = latency_stats(prompt_samples)
+
+    first_token_samples: List[float] = []
+    total_samples: List[float] = []
+    for query in queries:
+        rag.answer_query(query)
+        first_token_samples.append(rag.last_query_stats["time_to_first_token"])
+        total_samples.append(rag.last_query_stats["total_time"])
+    result["query_time_to_first_token"] = latency_stats(first_token_samples)
+    result["query_total"] = latency_stats(total_samples)
+    result["metrics"] = METRICS.to_json()
+
+    return result
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+
+    parser = argparse.ArgumentParser(description="Offline benchmark of ingestion and query latency with local model stand-ins.")
+    parser.add_argument("--pages", default="2,8,32", help="Comma separated page counts of the synthetic pdfs, empty to skip the pipeline runs (default: 2,8,32)")
+    parser.add_argument("--table-every", type=int, default=4, help="Put a ruled table on every n-th page, 0 for text only (default: 4)")
+    parser.add_argument("--chat-latency", type=float, default=0.2, help="Seconds per fake chat request (default: 0.2)")
+    parser.add_argument("--token-latency", type=float, default=0.005, help="Seconds per streamed fake token (default: 0.005)")
+    parser.add_argument("--embedding", choices=("fake", "local"), default="fake", help="Fake hashed embedding or a small sentence-transformers model from the local cache (default: fake)")
+    parser.add_argument("--local-model", default="sentence-transformers/all-MiniLM-L6-v2", help="Model of --embedding local, set HF_HUB_OFFLINE=1 to use the cache only")
+    parser.add_argument("--embedding-latency", type=float, default=0.002, help="Seconds per text of the fake embedding (default: 0.002)")
+    parser.add_argument("--requests-per-minute", type=float, default=0, help="Request budget of the client side rate limiter, 0 for unlimited (default: 0)")
+    parser.add_argument("--tokens-per-minute", type=float, default=0, help="Token budget of the client side rate limiter, 0 for unlimited (default: 0)")
+    parser.add_argument("--workers", type=int, default=None, help="Extraction processes (default: number of CPUs)")
+    parser.add_argument("--batch-size", type=int, default=16, help="Chunks per summary and insert batch (default: 16)")
+    parser.add_argument("--queries", type=int, default=20, help="Queries per run (default: 20)")
+    parser.add_argument("--k", type=int, default=4, help="Documents retrieved per query (default: 4)")
+    parser.add_argument("--vector-sizes", default="", help="Comma separated chunk counts of the vector store comparison, e.g. 10000,100000,1000000 (default: none)")
+    parser.add_argument("--vector-backends", default="chroma,float16,int8,int8-ivf", help="Vector stores to compare: chroma or <float16|int8>[-ivf] (default: chroma,float16,int8,int8-ivf)")
+    parser.add_argument("--vector-queries", type=int, default=100, help="Queries per vector store (default: 100)")
+    parser.add_argument("--work-dir", default=None, help="Directory for pdfs and databases, kept after the run (default: a temporary directory)")
+    parser.add_argument("--output", default=None, help="Write the JSON results to this file instead of stdout")
+    parser.add_argument("--log-level", default="WARNING", help="Level of the pipeline logs written to stderr (default: WARNING)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(name)s %(levelname)s %(message)s")
+
+    from chat_models import set_model_overrides
+    from embeddings import build_embedding
+    from rate_limiter import RateLimiter, set_rate_limiter
+
+    chat_model = FakeChatModel(model_name="fake-chat", latency=args.chat_latency, token_latency=args.token_latency)
+    vision_chat_model = FakeChatModel(model_name="fake-vision", latency=args.chat_latency, token_latency=args.token_latency)
+    if args.embedding == "local":
+        embedding: Embeddings = build_embedding(model_name=args.local_model)
+    else:
+        embedding = FakeEmbeddings(text_latency=args.embedding_latency)
+    set_model_overrides(chat_model=chat_model, vision_chat_model=vision_chat_model, embedding=embedding)
+    for model in (chat_model, vision_chat_model):
+        set_rate_limiter(model.model_name, RateLimiter(args.requests_per_minute, args.tokens_per_minute, name=model.model_name))
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="mm_rag_benchmark_")
+    try:
+        runs = [
+            run_benchmark(int(pages), osp.join(work_dir, f"run_{pages}"), args, chat_model, embedding)
+            for pages in args.pages.split(",") if pages
+        ]
+        vector_stores = [
+            result
+            for size in args.vector_sizes.split(",") if size
+            for result in run_vector_store_benchmark(int(size), osp.join(work_dir, "vector_stores"), args)
+        ]
+    finally:
+        if args.work_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    results: Dict[str, Any] = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": vars(args),
+        "runs": runs,
+        "vector_stores": vector_stores
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -1,52 +1,196 @@
 
+import os
+import time
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, TypeVar
 from dotenv import load_dotenv
-import shutil
-from langchain_groq import ChatGroq
-from langchain_huggingface import HuggingFaceEmbeddings
-import torch
-
-torch.classes.__path__ = []
+from embeddings import CachedEmbeddings
+from embeddings import LazyEmbeddings
+from embeddings import build_embedding
 
 import pytesseract  #crucial for performing ocr task (eg:- images maybe present in pdfs)
 pytesseract.pytesseract.tesseract_cmd = r'C:\\Program Files\\Tesseract-OCR\\tesseract.exe'
 
-load_dotenv(override = True) 
+load_dotenv(override = True)
+
+# models are built on first use and shared by every caller in the process, which includes
+# all streamlit sessions and reruns, so importing this module costs next to nothing
+
+T = TypeVar("T")
+
+SUMMARY_MAX_TOKENS: int = 800  #output tokens of a summary request, bounds the items of a packed request
+
+STARTUP_TIMINGS: Dict[str, float] = {}  #seconds spent importing modules and loading models
+_lock = threading.RLock()
+
+
+@contextmanager
+def startup_timer(label: str) -> Iterator[None]:
+
+    """Record the wall time of a block in the startup report.
+
+    Only the first run of a step is recorded, so reruns of the script, which find their
+    modules already imported, do not overwrite the real cost.
+
+    Args:
+        label (str): Name of the timed step, e.g. "import multi_modal_rag"
+    """
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STARTUP_TIMINGS.setdefault(label, time.perf_counter() - start)
+
+
+def startup_report() -> Dict[str, float]:
+
+    """Seconds spent per import and model load so far, slowest first.
+
+    Returns:
+        Dict[str, float]: Timed step to seconds
+    """
+
+    return dict(sorted(STARTUP_TIMINGS.items(), key=lambda item: item[1], reverse=True))
+
+
+def _singleton(label: str) -> Callable[[Callable[[], T]], Callable[[], T]]:
+
+    def decorator(factory: Callable[[], T]) -> Callable[[], T]:
+        instance = []
+
+        def get() -> T:
+            if not instance:
+                with _lock:
+                    if not instance:
+                        with startup_timer(label):
+                            instance.append(factory())
+            return instance[0]
+
+        def set_instance(value: T) -> None:
+            with _lock:
+                instance[:] = [value]
+
+        get.__doc__ = factory.__doc__
+        get.set_instance = set_instance
+        return get
 
-shutil.rmtree("./chroma_db", ignore_errors=True)
+    return decorator
 
-# chat_model used to answer users text queries
 
-chat_model = ChatGroq(
-    model="llama-3.1-8b-instant",
-    temperature=0.0,
-    max_retries=2,
-    max_tokens=800
-)
+def set_model_overrides(chat_model=None, vision_chat_model=None, embedding=None) -> None:
 
-# the vision_chat_model is used to obtain a text description of an image ,
-# which will be stored in vector database
+    """Replace the shared models, e.g. with local stand-ins for benchmarks and offline runs.
 
-vision_chat_model = ChatGroq(
-    model="meta-llama/llama-4-scout-17b-16e-instruct",
-    temperature=0.0,
-    max_retries=2,
-    max_tokens=800
-)
+    Must be called before the models are used, since callers may keep references to them.
 
+    Args:
+        chat_model (BaseChatModel, optional): Replaces get_chat_model() and get_summary_chat_model(). Defaults to None, keeping the current models.
+        vision_chat_model (BaseChatModel, optional): Replaces get_vision_chat_model(). Defaults to None, keeping the current model.
+        embedding (Embeddings, optional): Replaces get_embedding(), also behind hf_embedding. Defaults to None, keeping the current model.
+    """
 
+    for getter, value in (
+            (get_chat_model, chat_model),
+            (get_summary_chat_model, chat_model),
+            (get_vision_chat_model, vision_chat_model),
+            (get_embedding, embedding)
+        ):
+        if value is not None:
+            getter.set_instance(value)
 
 
+def patch_torch_classes() -> None:
 
-# the following embedding function is used to convert the data into embeddings 
+    # streamlit's file watcher trips over torch.classes, so its path is emptied once torch is loaded
+    import torch
+    torch.classes.__path__ = []
+
+
+@_singleton("load chat_model")
+def get_chat_model():
+
+    """
+    chat_model used to answer users text queries
+    """
+
+    from langchain_groq import ChatGroq
+
+    return ChatGroq(
+        model="llama-3.1-8b-instant",
+        temperature=0.0,
+        max_retries=2,
+        max_tokens=800
+    )
+
+
+@_singleton("load summary chat_model")
+def get_summary_chat_model():
+
+    """
+    chat_model used to summarize text and tables, the same model as get_chat_model
+    """
+
+    from langchain_groq import ChatGroq
+
+    # summary requests go through the RateLimiter, which owns their retries and backoff,
+    # so the client does not retry 429s silently behind the limiter's adaptive concurrency
+    return ChatGroq(
+        model="llama-3.1-8b-instant",
+        temperature=0.0,
+        max_retries=0,
+        max_tokens=SUMMARY_MAX_TOKENS
+    )
+
+
+@_singleton("load vision_chat_model")
+def get_vision_chat_model():
+
+    """
+    the vision_chat_model is used to obtain a text description of an image ,
+    which will be stored in vector database
+    """
+
+    from langchain_groq import ChatGroq
+
+    # only used through the RateLimiter, which retries failed requests
+    return ChatGroq(
+        model="meta-llama/llama-4-scout-17b-16e-instruct",
+        temperature=0.0,
+        max_retries=0,
+        max_tokens=800
+    )
+
+
+# the following embedding function is used to convert the data into embeddings
 # before storing into vector database
+# the CPU backend can be switched to onnxruntime ("onnx") or int8 quantized onnxruntime ("int8")
+# through the environment, and vectors are cached by text hash so nothing is embedded twice
 
 model_name = "sentence-transformers/all-mpnet-base-v2"
-model_kwargs = {'device': 'cpu'}
-encode_kwargs = {'normalize_embeddings': False}
+embedding_backend = os.getenv("EMBEDDING_BACKEND", "torch")
+
+
+@_singleton("load embedding model")
+def get_embedding() -> CachedEmbeddings:
+
+    """
+    embedding model with its text-hash cache
+    """
+
+    patch_torch_classes()
+    return CachedEmbeddings(
+        build_embedding(
+            model_name=model_name,
+            backend=embedding_backend,
+            batch_size=int(os.getenv("EMBEDDING_BATCH_SIZE", "32")),
+            num_threads=int(os.getenv("EMBEDDING_THREADS", "0")) or None
+        ),
+        model_name=f"{model_name}:{embedding_backend}",
+        db_path=os.getenv("EMBEDDING_CACHE_PATH", "./embedding_cache.db")
+    )
 
 
-hf_embedding = HuggingFaceEmbeddings(
-    model_name=model_name,
-    model_kwargs=model_kwargs,
-    encode_kwargs=encode_kwargs
-)
\ No newline at end of file
+# handed to the vector database, loads the embedding model only when the first text is embedded
+hf_embedding = LazyEmbeddings(get_embedding)
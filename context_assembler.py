@@ -0,0 +1,152 @@
+import re
+import math
+from dataclasses import dataclass, field
+from typing import Dict, List, Set
+from langchain_core.documents.base import Document
+from data_classes import RAGDataType
+
+
+def estimate_tokens(text: str) -> int:
+
+    """Estimate the number of tokens of a text.
+
+    Llama tokenizers average roughly four characters per token on English text, which is close
+    enough for budgeting without loading a tokenizer.
+
+    Args:
+        text (str): Text to measure
+
+    Returns:
+        int: Estimated number of tokens
+    """
+
+    return math.ceil(len(text) / 4)
+
+
+@dataclass
+class AssembledContext:
+
+    """
+    Data class for the context documents selected for a prompt.
+    """
+
+    text_docs: List[str] = field(default_factory=list)
+    table_docs: List[str] = field(default_factory=list)
+    image_docs: List[str] = field(default_factory=list)
+    tokens: int = 0
+    stats: Dict[str, int] = field(default_factory=dict)
+
+
+class ContextAssembler:
+
+    """
+    Context assembler selecting retrieved documents for a prompt within a token budget.
+
+    Documents are ranked by retrieval score, overlapping documents are dropped, and a payload
+    that does not fit the remaining budget is replaced by its stored summary or truncated.
+    """
+
+    def __init__(
+            self,
+            token_budget: int = 3000,
+            min_truncated_tokens: int = 100,
+            overlap_threshold: float = 0.8,
+            shingle_size: int = 5
+        ):
+
+        """Initialize ContextAssembler class.
+
+        Args:
+            token_budget (int, optional): Maximum tokens of the whole prompt. Defaults to 3000.
+            min_truncated_tokens (int, optional): Smallest truncated payload worth including. Defaults to 100.
+            overlap_threshold (float, optional): Share of a document's word shingles found in a kept document above which it is dropped. Defaults to 0.8.
+            shingle_size (int, optional): Number of words per shingle for the overlap check. Defaults to 5.
+        """
+
+        self.token_budget: int = token_budget
+        self.min_truncated_tokens: int = min_truncated_tokens
+        self.overlap_threshold: float = overlap_threshold
+        self.shingle_size: int = shingle_size
+
+    def _shingles(self, text: str) -> Set[tuple]:
+
+        words = re.findall(r"\w+", text.lower())
+        if len(words) < self.shingle_size:
+            return {tuple(words)} if words else set()
+        return {tuple(words[i:i + self.shingle_size]) for i in range(len(words) - self.shingle_size + 1)}
+
+    def _deduplicate(self, docs: List[Document]) -> List[Document]:
+
+        kept: List[Document] = []
+        kept_shingles: List[Set[tuple]] = []
+        seen_ids: Set[str] = set()
+        for doc in docs:
+            doc_id = doc.metadata.get('doc_id')
+            if doc_id is not None and doc_id in seen_ids:
+                continue
+
+            # a document mostly contained in an already kept one adds nothing to the prompt
+            shingles = self._shingles(doc.page_content)
+            if shingles and any(
+                len(shingles & other) / len(shingles) >= self.overlap_threshold for other in kept_shingles
+            ):
+                continue
+
+            seen_ids.add(doc_id)
+            kept.append(doc)
+            kept_shingles.append(shingles)
+        return kept
+
+    def assemble(self, retrieved_data: List[Document], reserved_text: str = "") -> AssembledContext:
+
+        """Select the context documents for a prompt.
+
+        Args:
+            retrieved_data (List[Document]): Retrieved documents, with an optional 'score' and 'summary' in their metadata
+            reserved_text (str, optional): Rest of the prompt (instructions and query), counted against the budget. Defaults to "".
+
+        Returns:
+            AssembledContext: Selected payloads per data type and the prompt's token count
+        """
+
+        # documents keep their retrieval order when no score is available
+        ranked: List[Document] = sorted(
+            retrieved_data, key=lambda doc: doc.metadata.get('score', 0.0), reverse=True
+        )
+        unique: List[Document] = self._deduplicate(ranked)
+
+        context = AssembledContext()
+        context.tokens = estimate_tokens(reserved_text)
+        stats: Dict[str, int] = {
+            "retrieved": len(retrieved_data), "duplicates": len(ranked) - len(unique),
+            "full": 0, "summary": 0, "truncated": 0, "dropped": 0
+        }
+
+        for doc in unique:
+            remaining: int = self.token_budget - context.tokens
+            payload: str = doc.page_content
+            summary: str = doc.metadata.get('summary')
+
+            if estimate_tokens(payload) <= remaining:
+                stats["full"] += 1
+            elif summary and estimate_tokens(summary) <= remaining:
+                payload = summary
+                stats["summary"] += 1
+            elif remaining >= self.min_truncated_tokens:
+                payload = payload[:remaining * 4]
+                stats["truncated"] += 1
+            else:
+                stats["dropped"] += 1
+                continue
+
+            context.tokens += estimate_tokens(payload)
+            data_type = doc.metadata['data_type']
+            if data_type == RAGDataType.TEXT.value:
+                context.text_docs.append(payload)
+            elif data_type == RAGDataType.TABLE.value:
+                context.table_docs.append(payload)
+            elif data_type == RAGDataType.IMAGE.value:
+                context.image_docs.append(payload)
+
+        context.stats = stats
+        return context
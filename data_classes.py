@@ -1,5 +1,5 @@
 from enum import Enum, auto
-from typing import List, Union, ByteString
+from typing import List, Optional, Union, ByteString
 from dataclasses import dataclass
 
 class RAGDataType(Enum):
@@ -22,6 +22,7 @@ class DataInstance:
 
     data_type: RAGDataType
     data: Union[ByteString, str]
+    source: Optional[str] = None  #name of the document the data was extracted from
 
 
 @dataclass
@@ -33,4 +34,31 @@ class DataSummaryInstance:
 
     data_type: RAGDataType
     data: Union[ByteString, str]
-    summary: str
\ No newline at end of file
+    summary: str
+    source: Optional[str] = None  #name of the document the data was extracted from
+
+
+@dataclass
+class SourceDocument:
+
+    """
+    Data class for a document to be ingested, held in memory or read from a path.
+    """
+
+    source: str
+    content: Optional[bytes] = None
+    path: Optional[str] = None
+    image_output_dir_path: Optional[str] = None  #directory for the images extracted from the document
+
+    def read(self) -> bytes:
+
+        """Content of the document, read from its path when it is not held in memory.
+
+        Returns:
+            bytes: Content of the document
+        """
+
+        if self.content is not None:
+            return self.content
+        with open(self.path, "rb") as f:
+            return f.read()
\ No newline at end of file
@@ -1,19 +1,68 @@
 import os
+import io
+import time
+import logging
 import os.path as osp
 import shutil
-import streamlit as st
-from typing import List, Union, ByteString
-from unstructured.partition.pdf import partition_pdf 
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union, ByteString
+from pdf_partitioning import classify_pages
+from pdf_partitioning import count_pages
+from pdf_partitioning import iter_partition_pdf_pages
+from pipeline import batched
+from pipeline import merge
 from summarizer import Summarizer
+from summary_policy import SummaryPolicy
+from image_preprocessor import ImagePreprocessor
+from chat_models import patch_torch_classes
 from data_classes import DataInstance
 from data_classes import DataSummaryInstance
 from data_classes import RAGDataType
-import torch
+from data_classes import SourceDocument
+from ingestion_manifest import bytes_fingerprint
+from metrics import METRICS
+import pytesseract  #crucial for performing ocr task (eg:- images maybe present in pdfs)
+pytesseract.pytesseract.tesseract_cmd = os.getenv("TESSERACT_CMD", r'C:\\Program Files\\Tesseract-OCR\\tesseract.exe')
 
-torch.classes.__path__ = []
+logger = logging.getLogger(__name__)
+
+
+def find_pdfs(docs_dir: str) -> List[str]:
+
+    """Find the pdfs in a directory tree.
+
+    Args:
+        docs_dir (str): Directory searched recursively
+
+    Returns:
+        List[str]: Paths of the pdfs, in a stable order
+    """
+
+    paths: List[str] = []
+    for root, dirs, files in os.walk(docs_dir):
+        dirs.sort()  #walked in sorted order, so runs over the same tree see the same order
+        paths.extend(osp.join(root, file) for file in sorted(files) if file.lower().endswith(".pdf"))
+    return paths
+
+
+def locate_documents(docs_dir: str) -> List[Tuple[str, str]]:
+
+    """Find the pdfs to ingest and name them.
+
+    Args:
+        docs_dir (str): A pdf or a directory searched recursively
+
+    Returns:
+        List[Tuple[str, str]]: (source, path) of every pdf, sources are paths relative to docs_dir so they stay the same when the tree is moved
+    """
+
+    if osp.isdir(docs_dir):
+        return [(osp.relpath(path, docs_dir).replace(osp.sep, "/"), path) for path in find_pdfs(docs_dir)]
+    if docs_dir.lower().endswith(".pdf") and osp.isfile(docs_dir):
+        return [(osp.basename(docs_dir), docs_dir)]
+    return []
 
-import pytesseract  #crucial for performing ocr task (eg:- images maybe present in pdfs)
-pytesseract.pytesseract.tesseract_cmd = r'C:\\Program Files\\Tesseract-OCR\\tesseract.exe'
 
 class DataIngestor:
 
@@ -22,32 +71,275 @@ class DataIngestor:
     """
 
 
-    def __init__(self, docs_dir: str, image_output_dir_path: str = 'figures'):
+    def __init__(
+            self, docs_dir: str = None,
+            image_output_dir_path: str = 'figures',
+            chat_concurrency: int = 4,
+            vision_concurrency: int = 2,
+            extraction_workers: int = None,
+            pages_per_shard: int = 8,
+            adaptive_strategy: bool = True,
+            pack_summaries: bool = True,
+            max_request_tokens: int = 4000,
+            max_items_per_request: Optional[int] = None,
+            summary_policy: SummaryPolicy = None,
+            retry_rounds: int = 2,
+            document_workers: int = 4
+        ):
 
         """Initialize DataIngestor class.
 
         Args:
-            docs_dir (str): Path to documents directory
+            docs_dir (str, optional): Path to documents directory, None when documents are added from memory with add_document. Defaults to None.
             image_output_dir_path (str, optional): Directory for storing extracted images. Defaults to 'figures'.
+            chat_concurrency (int, optional): Maximum number of parallel chat_model requests (text and tables). Defaults to 4.
+            vision_concurrency (int, optional): Maximum number of parallel vision_chat_model requests (images). Defaults to 2.
+            extraction_workers (int, optional): Number of processes partitioning page shards of a pdf. Defaults to the number of CPUs.
+            pages_per_shard (int, optional): Number of pages partitioned by one process at a time. Defaults to 8.
+            adaptive_strategy (bool, optional): Classify pages first and run hi_res or OCR only on the pages that need it. Defaults to True.
+            pack_summaries (bool, optional): Summarize several text and table chunks per chat_model request. Defaults to True.
+            max_request_tokens (int, optional): Maximum estimated prompt tokens of a packed request. Defaults to 4000.
+            max_items_per_request (Optional[int], optional): Maximum chunks of a packed request. Defaults to the items whose summaries fit into the summary model's output, see Summarizer.max_packed_items.
+            summary_policy (SummaryPolicy, optional): Decides which chunks are embedded without a summary. Defaults to SummaryPolicy().
+            retry_rounds (int, optional): Passes over the retry queue of failed summaries once the input is exhausted. Defaults to 2.
+            document_workers (int, optional): Maximum number of documents extracted at the same time. Defaults to 4.
         """
 
+        if chat_concurrency < 1 or vision_concurrency < 1:
+            raise ValueError("Concurrency must be at least 1")
+
         self.docs_dir: str = docs_dir
         self.image_output_dir_path = image_output_dir_path
+        self.chat_concurrency: int = chat_concurrency
+        self.vision_concurrency: int = vision_concurrency
+        self.extraction_workers: int = extraction_workers or os.cpu_count() or 1
+        self.pages_per_shard: int = pages_per_shard
+        self.adaptive_strategy: bool = adaptive_strategy
+        self.pack_summaries: bool = pack_summaries
+        self.max_request_tokens: int = max_request_tokens
+        self.max_items_per_request: Optional[int] = max_items_per_request
+        self.summary_policy: SummaryPolicy = summary_policy if summary_policy is not None else SummaryPolicy()
+        self.retry_rounds: int = retry_rounds
+        self.document_workers: int = max(1, document_workers)
+        self.retry_queue: List[DataInstance] = []  #data instances whose summary failed, retried after the input
+        self.page_strategy_report: Dict[str, List[str]] = {}  #partition strategy used for every page of every document
+        self.image_stats: Dict[str, int] = {}  #image preprocessing outcomes summed over the documents
+        self._image_stats_lock = threading.Lock()
+        self.datatype_counts: Dict[RAGDataType, int] = {RAGDataType.TEXT: 0, RAGDataType.TABLE: 0, RAGDataType.IMAGE: 0}
         self.document_paths: List[str] = []
-        shutil.rmtree(self.image_output_dir_path, ignore_errors=True)
+        self.documents: List[SourceDocument] = []  #documents to extract, located on disk or added from memory
+        self.extracted_sources: List[str] = []  #documents whose extraction is done, in completion order
 
     def locate_data(self):
 
         """
-        Locate documents in the directory.
+        Locate the pdfs at docs_dir, a single pdf or a directory searched recursively.
         """
 
-        with st.spinner("Locating"): #a spinner to show the status that file is being located
-            file = self.docs_dir
-            if file.endswith(".pdf"):
-                    self.document_paths.append(file)
+        logger.info("Locating documents in %s", self.docs_dir)
+        if osp.isdir(self.docs_dir):
+            # every pdf of a directory extracts its images into a subdirectory of its own
+            for i, path in enumerate(find_pdfs(self.docs_dir)):
+                self.document_paths.append(path)
+                self.documents.append(
+                    SourceDocument(path, path=path, image_output_dir_path=osp.join(self.image_output_dir_path, f"doc_{i}"))
+                )
+        elif self.docs_dir.lower().endswith(".pdf"):
+            self.document_paths.append(self.docs_dir)
+            self.documents.append(SourceDocument(self.docs_dir, path=self.docs_dir, image_output_dir_path=self.image_output_dir_path))
         
-        print("Located documents: ", len(self.document_paths))
+        logger.info("Located documents: %d", len(self.document_paths))
+
+    @staticmethod
+    def read_content(content: Union[bytes, BinaryIO]) -> bytes:
+
+        """Read an in-memory document.
+
+        Args:
+            content (Union[bytes, BinaryIO]): Content of the document or a file-like object, e.g. an uploaded file
+
+        Returns:
+            bytes: Content of the document
+        """
+
+        if isinstance(content, (bytes, bytearray, memoryview)):
+            return bytes(content)
+        if hasattr(content, "getvalue"):
+            return content.getvalue()
+        content.seek(0)
+        return content.read()
+
+    def add_document(self, source: str, content: Union[bytes, BinaryIO], image_output_dir_path: str = None) -> SourceDocument:
+
+        """Add a document held in memory, nothing is written to disk but its extracted images.
+
+        Args:
+            source (str): Name of the document, every data instance extracted from it carries it
+            content (Union[bytes, BinaryIO]): Content of the pdf or a file-like object
+            image_output_dir_path (str, optional): Directory for the images extracted from the document, cleared before extraction. Defaults to a directory named after the content hash under image_output_dir_path.
+
+        Returns:
+            SourceDocument: Added document
+        """
+
+        content = DataIngestor.read_content(content)
+        if image_output_dir_path is None:
+            image_output_dir_path = osp.join(self.image_output_dir_path, bytes_fingerprint(content)[:16])
+        document = SourceDocument(source, content=content, image_output_dir_path=image_output_dir_path)
+        self.documents.append(document)
+        return document
+
+    def _iter_partition_pdf(self, document: SourceDocument, pool: Optional[Executor] = None) -> Iterator:
+
+        """Partition a pdf into chunked elements.
+
+        With adaptive_strategy, pages are classified first and each run of pages goes through the
+        cheapest strategy that handles it ('fast', 'ocr_only' or 'hi_res'). Documents longer than
+        one shard are split into page ranges which are partitioned in parallel processes and
+        merged back in page order, and chunks are yielded as soon as their shards are done.
+
+        Args:
+            document (SourceDocument): Pdf to partition
+            pool (Optional[Executor], optional): Worker processes shared by the documents extracted in parallel. Defaults to None.
+
+        Yields:
+            Element: Unstructured element chunked by title
+        """
+
+        # partitioning loads torch, which needs the streamlit workaround
+        patch_torch_classes()
+
+        pdf_bytes: bytes = document.read()
+
+        with METRICS.span("classify_pages"):
+            if self.adaptive_strategy:
+                page_strategies: List[str] = classify_pages(pdf_bytes)
+            else:
+                page_strategies: List[str] = ['hi_res'] * count_pages(pdf_bytes)
+        self.page_strategy_report[document.source] = page_strategies
+        strategy_counts: Dict[str, int] = {s: page_strategies.count(s) for s in set(page_strategies)}
+        for strategy, count in strategy_counts.items():
+            METRICS.inc("pages_extracted", count, strategy=strategy)
+        logger.info("Page strategies: %s", strategy_counts)
+
+        # with a shared pool every document is partitioned in the worker processes
+        sharded = pool is not None or (self.extraction_workers > 1 and len(page_strategies) > self.pages_per_shard)
+        if self.adaptive_strategy or sharded:
+            yield from iter_partition_pdf_pages(
+                pdf_bytes,
+                document.image_output_dir_path,
+                page_strategies,
+                pages_per_shard=self.pages_per_shard,
+                max_workers=self.extraction_workers,
+                max_characters=4000,
+                pool=pool
+            )
+            return
+
+        # unstructured loads its layout models on import, so it is only imported when a pdf is partitioned
+        from unstructured.partition.pdf import partition_pdf
+
+        yield from partition_pdf(
+            file=io.BytesIO(pdf_bytes),
+            extract_images_in_pdf=True,
+            infer_table_structure=True,
+            chunking_strategy="by_title",
+            strategy='hi_res',
+            mode='elements',
+            max_characters=4000,
+            image_output_dir_path=document.image_output_dir_path
+        )
+
+    def _iter_document(self, document: SourceDocument, pool: Optional[Executor] = None) -> Iterator[DataInstance]:
+
+        """Extract text, tables and images from one document.
+
+        Args:
+            document (SourceDocument): Document to extract
+            pool (Optional[Executor], optional): Worker processes shared by the documents extracted in parallel. Defaults to None.
+
+        Yields:
+            DataInstance: Next extracted data instance, tagged with the document's source
+        """
+
+        # images of an earlier, interrupted extraction of the document are dropped
+        shutil.rmtree(document.image_output_dir_path, ignore_errors=True)
+        os.makedirs(document.image_output_dir_path)
+
+        # data from pdf is extracted using partition_pdf function from unstructured library
+
+        # only the time spent partitioning is measured, not the time consumers hold the generator
+        extract_seconds: float = 0.0
+        elements: Iterator = self._iter_partition_pdf(document, pool)
+        while True:
+            start = time.perf_counter()
+            element = next(elements, None)
+            extract_seconds += time.perf_counter() - start
+            if element is None:
+                break
+            if element.category == 'Table':
+                METRICS.inc("chunks_extracted", data_type=RAGDataType.TABLE.name)
+                yield DataInstance(RAGDataType.TABLE, element.text, document.source)
+            elif element.category == 'CompositeElement':
+                METRICS.inc("chunks_extracted", data_type=RAGDataType.TEXT.name)
+                yield DataInstance(RAGDataType.TEXT, element.text, document.source)
+            else:
+                logger.info("Unsupported element category: %s", element.category)
+        METRICS.observe("extract_document_seconds", extract_seconds)
+
+        # images extracted from the document are picked up once the document is done,
+        # tiny and duplicate images are dropped before they cost a vision model call.
+        # duplicates are only looked for within the document, so a figure shared by several
+        # documents is recorded for each of them whatever order they are extracted in
+        image_preprocessor = ImagePreprocessor()
+        for file in sorted(os.listdir(document.image_output_dir_path)):
+            if file.endswith(".jpg") or file.endswith(".png"):
+                image_path = osp.join(document.image_output_dir_path, file)
+                if image_preprocessor.accept(image_path):
+                    METRICS.inc("chunks_extracted", data_type=RAGDataType.IMAGE.name)
+                    yield DataInstance(RAGDataType.IMAGE, image_path, document.source)
+        with self._image_stats_lock:
+            for outcome, count in image_preprocessor.stats.items():
+                self.image_stats[outcome] = self.image_stats.get(outcome, 0) + count
+
+        self.extracted_sources.append(document.source)
+        METRICS.inc("documents_extracted")
+
+    def iter_text_tables_images(self) -> Iterator[DataInstance]:
+
+        """Extract text, tables and images from documents, yielding each data instance as soon as it is extracted.
+
+        Several documents are extracted at the same time, up to document_workers, and their pages
+        are partitioned in one pool of extraction_workers processes, so a batch of documents takes
+        about as long as its largest document. Data instances of different documents are
+        interleaved, those of one document keep their order.
+
+        Yields:
+            DataInstance: Next extracted data instance, tagged with its document's source
+        """
+
+        self.extracted_sources = []
+        self.image_stats = {}
+        documents: List[SourceDocument] = [d for d in self.documents if d.path is None or d.path.lower().endswith(".pdf")]
+
+        if len(documents) <= 1:
+            for document in documents:
+                yield from self._iter_document(document)
+        else:
+            pool = ProcessPoolExecutor(max_workers=self.extraction_workers) if self.extraction_workers > 1 else None
+            try:
+                yield from merge(
+                    (self._iter_document(document, pool) for document in documents),
+                    min(self.document_workers, len(documents)),
+                    max_buffered=4 * self.document_workers
+                )
+            finally:
+                if pool is not None:
+                    pool.shutdown(cancel_futures=True)
+
+        for outcome, count in self.image_stats.items():
+            METRICS.inc("images_preprocessed", count, outcome=outcome)
+        logger.info("Image preprocessing: %s", self.image_stats)
 
     def extract_text_tables_images(self) -> List[DataInstance]:
 
@@ -55,44 +347,175 @@ class DataIngestor:
         Extract text, tables and images from documents.
         """
 
-        data_instances: List[DataInstance] = []
-
-        # if a directory to store images doesn't exist create it
-        if not os.path.exists(self.image_output_dir_path):
-            os.makedirs(self.image_output_dir_path)
-
-        with st.spinner("Extracting Data"):#spinner to show that data is being extracted
-            
-            # data from pdf is extracted using partition_pdf function from unstructured library
-
-            for doc_path in self.document_paths:
-                if doc_path.endswith(".pdf"):
-                    pdf_elements = partition_pdf(
-                        filename=doc_path,
-                        extract_images_in_pdf=True,
-                        infer_table_structure=True,
-                        chunking_strategy="by_title",
-                        strategy='hi_res',
-                        mode='elements',
-                        max_characters=4000,
-                        image_output_dir_path=self.image_output_dir_path
-                    )
-                    for element in pdf_elements:
-                        if element.category == 'Table':
-                            data_instances.append(DataInstance(RAGDataType.TABLE, element.text))
-                        elif element.category == 'CompositeElement':
-                            data_instances.append(DataInstance(RAGDataType.TEXT, element.text))
-                        else:
-                            print('Unsupported element category: ', element.category)
-
-            for file in os.listdir(self.image_output_dir_path):
-                if file.endswith(".jpg") or file.endswith(".png"):
-                    data_instances.append(DataInstance(RAGDataType.IMAGE, osp.join(self.image_output_dir_path, file)))
+        logger.info("Extracting data")
+        data_instances: List[DataInstance] = list(self.iter_text_tables_images())
         
-        print("Extracted data instances: ", len(data_instances))
+        logger.info("Extracted data instances: %d", len(data_instances))
         return data_instances
     
-    def summarize_text_tables_images(self, data_instances: List[DataInstance]) -> List[str]:
+    @staticmethod
+    def _get_summarize_fn(data_type: RAGDataType) -> Callable[[str], str]:
+
+        """Get the Summarizer function for a data type.
+
+        Args:
+            data_type (RAGDataType): Type of the data instance
+
+        Raises:
+            ValueError: Unsupported data type
+
+        Returns:
+            Callable[[str], str]: Summarizer function
+        """
+
+        if data_type == RAGDataType.TEXT:
+            return Summarizer.summarize_text
+        elif data_type == RAGDataType.TABLE:
+            return Summarizer.summarize_table
+        elif data_type == RAGDataType.IMAGE:
+            return Summarizer.summarize_image
+        else:
+            raise ValueError("Unsupported data type")
+
+    @staticmethod
+    def _summarize_single(summarize_fn: Callable[[str], str], data: str) -> List[str]:
+
+        # single requests return a list like packed ones so both are collected the same way
+        return [summarize_fn(data)]
+
+    def _summarize_batch(
+            self,
+            batch: List[DataInstance],
+            chat_pool: ThreadPoolExecutor,
+            vision_pool: ThreadPoolExecutor,
+            apply_policy: bool = True
+        ) -> List[Optional[str]]:
+
+        """Summarize one batch of data instances through the thread pools.
+
+        Args:
+            batch (List[DataInstance]): Data instances to summarize
+            chat_pool (ThreadPoolExecutor): Pool of chat_model requests
+            vision_pool (ThreadPoolExecutor): Pool of vision_chat_model requests
+            apply_policy (bool, optional): Let the summary_policy embed short and dense chunks directly. Defaults to True.
+
+        Raises:
+            ValueError: Unsupported data type
+
+        Returns:
+            List[Optional[str]]: Summary of every data instance in input order, None where it failed
+        """
+
+        # resolve every summarizer up front so an unsupported type fails before any request is sent
+        summarize_fns = [DataIngestor._get_summarize_fn(d.data_type) for d in batch]
+        batch_start = time.perf_counter()
+
+        # every future resolves to the summaries of the batch positions it covers
+        batch_summaries: List[Optional[str]] = [None] * len(batch)
+        futures: List[tuple] = []
+        chat_positions: List[int] = []
+        for i, (d, fn) in enumerate(zip(batch, summarize_fns)):
+            if apply_policy and not self.summary_policy.should_summarize(d):
+                METRICS.inc("summaries_skipped", data_type=d.data_type.name)
+                batch_summaries[i] = d.data
+            elif d.data_type == RAGDataType.IMAGE:
+                futures.append(([i], vision_pool.submit(DataIngestor._summarize_single, fn, d.data)))
+            elif self.pack_summaries:
+                chat_positions.append(i)
+            else:
+                futures.append(([i], chat_pool.submit(DataIngestor._summarize_single, fn, d.data)))
+
+        packs = Summarizer.pack(
+            [batch[i] for i in chat_positions], self.max_request_tokens, self.max_items_per_request
+        )
+        start = 0
+        for pack in packs:
+            positions = chat_positions[start:start + len(pack)]
+            futures.append((positions, chat_pool.submit(Summarizer.summarize_packed, pack)))
+            start += len(pack)
+
+        for positions, future in futures:
+            for i, summary in zip(positions, future.result()):
+                batch_summaries[i] = summary
+        METRICS.observe("summarize_batch_seconds", time.perf_counter() - batch_start)
+        return batch_summaries
+
+    def _collect_summaries(self, batch: List[DataInstance], batch_summaries: List[Optional[str]]) -> List[DataSummaryInstance]:
+
+        # results are collected by position so the output order matches the input,
+        # data instances without a summary wait in the retry queue instead of being dropped
+        summaries: List[DataSummaryInstance] = []
+        for data_instance, summary in zip(batch, batch_summaries):
+            if summary is not None:
+                summaries.append(
+                    DataSummaryInstance(
+                        data_instance.data_type,
+                        data_instance.data,
+                        summary,
+                        data_instance.source
+                    )
+                )
+                self.datatype_counts[data_instance.data_type] += 1
+                METRICS.inc("chunks_summarized", data_type=data_instance.data_type.name)
+            else:
+                self.retry_queue.append(data_instance)
+        return summaries
+
+    def iter_summaries(
+            self,
+            data_instances: Iterable[DataInstance],
+            batch_size: int = 16
+        ) -> Iterator[List[DataSummaryInstance]]:
+
+        """Summarize a stream of data instances in batches.
+
+        Text and tables are summarized by chat_model and images by vision_chat_model, each
+        through its own bounded thread pool so the two models are rate limited separately.
+        With pack_summaries, the text and tables of a batch are packed into as few chat_model
+        requests as the token budget allows. Chunks the summary_policy rejects are short or dense
+        enough to be embedded directly and use their raw data as summary. Data instances whose
+        summary failed go to the retry_queue, which is retried for retry_rounds passes after the
+        input is exhausted, and whatever still fails is left in it. The summarized data instances
+        are counted per type in datatype_counts.
+
+        Args:
+            data_instances (Iterable[DataInstance]): Data instances to summarize
+            batch_size (int, optional): Number of data instances per yielded batch. Defaults to 16.
+
+        Raises:
+            ValueError: Unsupported data type
+
+        Yields:
+            List[DataSummaryInstance]: Summarized data instances of the next batch, in input order, followed by the recovered retries
+        """
+
+        self.datatype_counts = {RAGDataType.TEXT: 0, RAGDataType.TABLE: 0, RAGDataType.IMAGE: 0}
+        self.summary_policy.reset()
+        self.retry_queue = []
+
+        with ThreadPoolExecutor(max_workers=self.chat_concurrency) as chat_pool, \
+                ThreadPoolExecutor(max_workers=self.vision_concurrency) as vision_pool:
+
+            for batch in batched(data_instances, batch_size):
+                yield self._collect_summaries(batch, self._summarize_batch(batch, chat_pool, vision_pool))
+
+            for retry_round in range(self.retry_rounds):
+                if not self.retry_queue:
+                    break
+                pending, self.retry_queue = self.retry_queue, []
+                logger.info("Retrying %d failed summaries, round %d of %d", len(pending), retry_round + 1, self.retry_rounds)
+                METRICS.inc("summary_retries", len(pending))
+                for batch in batched(pending, batch_size):
+                    yield self._collect_summaries(
+                        batch, self._summarize_batch(batch, chat_pool, vision_pool, apply_policy=False)
+                    )
+
+        for data_instance in self.retry_queue:
+            METRICS.inc("summary_failures", data_type=data_instance.data_type.name)
+        if self.retry_queue:
+            logger.warning("Summaries still failing after %d retry rounds: %d", self.retry_rounds, len(self.retry_queue))
+
+    def summarize_text_tables_images(self, data_instances: List[DataInstance]) -> List[DataSummaryInstance]:
 
         """Summarize text, tables and images.
 
@@ -103,34 +526,29 @@ class DataIngestor:
             ValueError: Unsupported data type
 
         Returns:
-            List[str]: List of summarized data instances
+            List[DataSummaryInstance]: List of summarized data instances, in input order
         """    
 
 
-        with st.spinner("Summarizing data instances"):  #spinner to show data is being summarized
-            summaries: List[DataSummaryInstance] = []
-            datatype_counts = {RAGDataType.TEXT: 0, RAGDataType.TABLE: 0, RAGDataType.IMAGE: 0}
-            for data_instance in data_instances:
-                summary: str = None
-                if data_instance.data_type == RAGDataType.TEXT:
-                    summary = Summarizer.summarize_text(data_instance.data)
-                elif data_instance.data_type == RAGDataType.TABLE:
-                    summary = Summarizer.summarize_table(data_instance.data)
-                elif data_instance.data_type == RAGDataType.IMAGE:
-                    summary = Summarizer.summarize_image(data_instance.data)
-                else:
-                    raise ValueError("Unsupported data type")
-                if summary is not None:
-                    summaries.append(
-                        DataSummaryInstance(
-                            data_instance.data_type,
-                            data_instance.data,
-                            summary
-                        )
-                    )
-                    datatype_counts[data_instance.data_type] += 1
+        logger.info("Summarizing data instances: %d", len(data_instances))
+        summaries: List[DataSummaryInstance] = [
+            summary
+            for batch in self.iter_summaries(data_instances, batch_size=max(1, len(data_instances)))
+            for summary in batch
+        ]
+
+        self.report_summaries()
+
+        return summaries
 
-        print("Summarized data instances: ", len(summaries))
-        print("Data type counts: ", datatype_counts)
+    def report_summaries(self) -> None:
+
+        """
+        Log the number of summarized data instances per type.
+        """
 
-        return summaries
\ No newline at end of file
+        logger.info("Summarized data instances: %d", sum(self.datatype_counts.values()))
+        logger.info("Data type counts: %s", self.datatype_counts)
+        logger.info("Summary policy: %s", self.summary_policy.stats())
+        if Summarizer.cache is not None:
+            logger.info("Summary cache: %s", Summarizer.cache.stats())
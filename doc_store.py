@@ -0,0 +1,123 @@
+import json
+import sqlite3
+import threading
+from typing import Iterator, List, Optional, Sequence, Tuple
+from langchain_core.stores import BaseStore
+from langchain_core.documents.base import Document
+
+
+class SQLiteDocStore(BaseStore[str, Document]):
+
+    """
+    Persistent docstore keeping the original data values in SQLite, keyed by doc_id.
+
+    Only the documents requested by the retriever are read from disk, so the corpus
+    survives restarts without being loaded into memory.
+    """
+
+    def __init__(self, db_path: str = "./docstore.db"):
+
+        """Initialize SQLiteDocStore class.
+
+        Args:
+            db_path (str, optional): Path to the SQLite database file. Defaults to "./docstore.db".
+        """
+
+        self.db_path: str = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "doc_id TEXT PRIMARY KEY, page_content TEXT NOT NULL, metadata TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+    def mget(self, keys: Sequence[str]) -> List[Optional[Document]]:
+
+        """Get the documents for the given doc_ids.
+
+        Args:
+            keys (Sequence[str]): doc_ids to look up
+
+        Returns:
+            List[Optional[Document]]: Documents in the order of keys, None for unknown doc_ids
+        """
+
+        if not keys:
+            return []
+
+        with self._lock:
+            placeholders = ",".join("?" for _ in keys)
+            rows = self._conn.execute(
+                f"SELECT doc_id, page_content, metadata FROM documents WHERE doc_id IN ({placeholders})",
+                list(keys)
+            ).fetchall()
+
+        found = {
+            doc_id: Document(page_content=page_content, metadata=json.loads(metadata))
+            for doc_id, page_content, metadata in rows
+        }
+        return [found.get(key) for key in keys]
+
+    def mset(self, key_value_pairs: Sequence[Tuple[str, Document]]) -> None:
+
+        """Store documents under their doc_ids.
+
+        Args:
+            key_value_pairs (Sequence[Tuple[str, Document]]): (doc_id, document) pairs
+        """
+
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO documents (doc_id, page_content, metadata) VALUES (?, ?, ?)",
+                [(key, doc.page_content, json.dumps(doc.metadata)) for key, doc in key_value_pairs]
+            )
+            self._conn.commit()
+
+    def mdelete(self, keys: Sequence[str]) -> None:
+
+        """Delete the documents with the given doc_ids.
+
+        Args:
+            keys (Sequence[str]): doc_ids to delete
+        """
+
+        with self._lock:
+            self._conn.executemany("DELETE FROM documents WHERE doc_id = ?", [(key,) for key in keys])
+            self._conn.commit()
+
+    def yield_keys(self, prefix: Optional[str] = None) -> Iterator[str]:
+
+        """Iterate over the stored doc_ids.
+
+        Args:
+            prefix (Optional[str], optional): Only yield doc_ids starting with this prefix. Defaults to None.
+
+        Yields:
+            str: doc_id
+        """
+
+        with self._lock:
+            keys = [row[0] for row in self._conn.execute("SELECT doc_id FROM documents")]
+        for key in keys:
+            if prefix is None or key.startswith(prefix):
+                yield key
+
+    def count(self) -> int:
+
+        """
+        Number of stored documents.
+        """
+
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def clear(self) -> None:
+
+        """
+        Delete every stored document.
+        """
+
+        with self._lock:
+            self._conn.execute("DELETE FROM documents")
+            self._conn.commit()
@@ -0,0 +1,300 @@
+import time
+import sqlite3
+import hashlib
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Union
+from langchain_core.embeddings import Embeddings
+
+
+EMBEDDING_BACKENDS = ("torch", "onnx", "int8")
+
+# int8 dynamically quantized export shipped in the sentence-transformers model repositories
+DEFAULT_INT8_ONNX_FILE = "onnx/model_qint8_avx512_vnni.onnx"
+
+
+def build_embedding(
+        model_name: str = "sentence-transformers/all-mpnet-base-v2",
+        backend: str = "torch",
+        batch_size: int = 32,
+        num_threads: Optional[int] = None,
+        onnx_file_name: Optional[str] = None
+    ) -> Embeddings:
+
+    """Build the sentence-transformers embedding model for CPU inference.
+
+    Args:
+        model_name (str, optional): Name of the sentence-transformers model. Defaults to "sentence-transformers/all-mpnet-base-v2".
+        backend (str, optional): 'torch', 'onnx' (onnxruntime, float32) or 'int8' (onnxruntime, int8 quantized). Defaults to "torch".
+        batch_size (int, optional): Number of texts encoded per forward pass. Defaults to 32.
+        num_threads (Optional[int], optional): Number of CPU threads used for inference. Defaults to the library default.
+        onnx_file_name (Optional[str], optional): ONNX file inside the model repository. Defaults to the backend's standard export.
+
+    Raises:
+        ValueError: Unsupported backend
+
+    Returns:
+        Embeddings: Embedding model
+    """
+
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unsupported embedding backend {backend}, expected one of {EMBEDDING_BACKENDS}")
+
+    model_kwargs: dict = {'device': 'cpu'}
+    encode_kwargs: dict = {'normalize_embeddings': False, 'batch_size': batch_size}
+
+    if backend == "torch":
+        if num_threads:
+            import torch
+            torch.set_num_threads(num_threads)
+    else:
+        ort_kwargs: dict = {'provider': 'CPUExecutionProvider'}
+        if backend == "int8" or onnx_file_name:
+            ort_kwargs['file_name'] = onnx_file_name or DEFAULT_INT8_ONNX_FILE
+        if num_threads:
+            import onnxruntime
+            session_options = onnxruntime.SessionOptions()
+            session_options.intra_op_num_threads = num_threads
+            ort_kwargs['session_options'] = session_options
+        model_kwargs.update({'backend': 'onnx', 'model_kwargs': ort_kwargs})
+
+    return HuggingFaceEmbeddings(
+        model_name=model_name,
+        model_kwargs=model_kwargs,
+        encode_kwargs=encode_kwargs
+    )
+
+
+class LazyEmbeddings(Embeddings):
+
+    """
+    Embeddings placeholder that builds the real embedding model on first use.
+
+    Vector stores can be opened with it without paying for loading the model up front.
+    """
+
+    def __init__(self, factory: Callable[[], Embeddings]):
+
+        """Initialize LazyEmbeddings class.
+
+        Args:
+            factory (Callable[[], Embeddings]): Returns the embedding model, called on the first embedding
+        """
+
+        self.factory: Callable[[], Embeddings] = factory
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+
+        return self.factory().embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+
+        return self.factory().embed_query(text)
+
+
+class CachedEmbeddings(Embeddings):
+
+    """
+    Embeddings wrapper caching vectors in memory (LRU) and on disk (SQLite), keyed by a hash of the text.
+
+    Repeated summaries and repeated queries are embedded only once, also across restarts. Vectors
+    are stored as float32 and returned as float32 values whether they were cached or computed,
+    so a text always gets the same vector. The least recently used rows on disk are dropped
+    beyond max_disk_entries.
+    """
+
+    def __init__(
+            self,
+            embedding: Embeddings,
+            model_name: str,
+            db_path: Optional[str] = "./embedding_cache.db",
+            max_memory_entries: int = 10000,
+            max_disk_entries: int = 1000000
+        ):
+
+        """Initialize CachedEmbeddings class.
+
+        Args:
+            embedding (Embeddings): Embedding model computing the missing vectors
+            model_name (str): Name of the model, part of the cache key
+            db_path (Optional[str], optional): Path to the SQLite database file, None to cache in memory only. Defaults to "./embedding_cache.db".
+            max_memory_entries (int, optional): Maximum number of vectors kept in memory. Defaults to 10000.
+            max_disk_entries (int, optional): Maximum number of vectors kept on disk. Defaults to 1000000.
+        """
+
+        self.embedding: Embeddings = embedding
+        self.model_name: str = model_name
+        self.db_path: Optional[str] = db_path
+        self.max_memory_entries: int = max_memory_entries
+        self.max_disk_entries: int = max_disk_entries
+        self.hits: int = 0
+        self.misses: int = 0
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._conn: sqlite3.Connection = None
+        self._disk_entries: int = 0  #upper bound of the rows on disk, recounted when pruning
+        self._lock = threading.Lock()
+
+    def _key(self, kind: str, text: str) -> str:
+
+        # queries and documents may be embedded differently, so they are cached separately
+        return hashlib.sha256(f"{self.model_name}\0{kind}\0{text}".encode("utf-8")).hexdigest()
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+
+        if self.db_path is None:
+            return None
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL DEFAULT 0)"
+            )
+            # caches written before rows were aged get the column, their rows count as least recently used
+            if "last_used" not in [row[1] for row in self._conn.execute("PRAGMA table_info(embeddings)")]:
+                self._conn.execute("ALTER TABLE embeddings ADD COLUMN last_used REAL NOT NULL DEFAULT 0")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+            self._conn.commit()
+            self._disk_entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        return self._conn
+
+    @staticmethod
+    def _float32(vector: List[float]) -> List[float]:
+
+        # the precision of the stored vectors
+        return array('f', vector).tolist()
+
+    def _remember(self, key: str, vector: List[float]) -> None:
+
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+
+            missing = [key for key in keys if key not in found]
+            conn = self._connection()
+            if conn is not None and missing:
+                for start in range(0, len(missing), 500):
+                    batch = missing[start:start + 500]
+                    placeholders = ",".join("?" for _ in batch)
+                    for key, blob in conn.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                    ):
+                        vector = array('f')
+                        vector.frombytes(blob)
+                        found[key] = vector.tolist()
+                        self._remember(key, found[key])
+                used = [key for key in missing if key in found]
+                if used:
+                    now = time.time()
+                    conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, key) for key in used])
+                    conn.commit()
+        return found
+
+    def _store(self, vectors: Dict[str, List[float]]) -> None:
+
+        with self._lock:
+            for key, vector in vectors.items():
+                self._remember(key, vector)
+            conn = self._connection()
+            if conn is not None:
+                now = time.time()
+                conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                    [(key, array('f', vector).tobytes(), now) for key, vector in vectors.items()]
+                )
+                self._disk_entries += len(vectors)
+                if self._disk_entries > self.max_disk_entries:
+                    # pruned to 90% of the cap, so rows are not deleted on every insert
+                    self._disk_entries = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+                    excess = self._disk_entries - int(0.9 * self.max_disk_entries)
+                    if self._disk_entries > self.max_disk_entries and excess > 0:
+                        conn.execute(
+                            "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                            (excess,)
+                        )
+                        self._disk_entries -= excess
+                conn.commit()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+
+        """Embed documents, computing only the vectors that are not cached.
+
+        Args:
+            texts (List[str]): Texts to embed
+
+        Returns:
+            List[List[float]]: One vector per text
+        """
+
+        keys = [self._key("document", text) for text in texts]
+        found = self._lookup(keys)
+
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+
+        with self._lock:
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            computed = {
+                key: self._float32(vector)
+                for key, vector in zip(missing, self.embedding.embed_documents(list(missing.values())))
+            }
+            self._store(computed)
+            found.update(computed)
+
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+
+        """Embed a query, using the cached vector if the query was seen before.
+
+        Args:
+            text (str): Query to embed
+
+        Returns:
+            List[float]: Vector of the query
+        """
+
+        key = self._key("query", text)
+        found = self._lookup([key])
+        with self._lock:
+            if key in found:
+                self.hits += 1
+                return found[key]
+            self.misses += 1
+
+        vector = self._float32(self.embedding.embed_query(text))
+        self._store({key: vector})
+        return vector
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+
+        """Hit and miss counters of this cache instance.
+
+        Returns:
+            Dict[str, Union[int, float]]: hits, misses and hit_rate
+        """
+
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups else 0.0
+        }
@@ -0,0 +1,147 @@
+import io
+import logging
+import threading
+from typing import Dict, List, Tuple
+from PIL import Image
+from metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+
+class ImagePreprocessor:
+
+    """
+    Image preprocessor applied before images are sent to the vision model.
+
+    Tiny images (icons, bullets, page decorations) are dropped, near duplicates (repeated logos)
+    are detected with a perceptual difference hash, and the remaining images are downscaled and
+    re-encoded with their correct MIME type to shrink the upload. Images of documents extracted
+    in parallel may be checked from several threads.
+    """
+
+    def __init__(
+            self,
+            min_width: int = 64,
+            min_height: int = 64,
+            min_bytes: int = 2048,
+            max_hash_distance: int = 4,
+            max_side: int = 1024,
+            jpeg_quality: int = 85
+        ):
+
+        """Initialize ImagePreprocessor class.
+
+        Args:
+            min_width (int, optional): Images narrower than this are dropped. Defaults to 64.
+            min_height (int, optional): Images lower than this are dropped. Defaults to 64.
+            min_bytes (int, optional): Image files smaller than this are dropped. Defaults to 2048.
+            max_hash_distance (int, optional): Maximum hamming distance of the 64 bit hashes of two duplicates. Defaults to 4.
+            max_side (int, optional): Longest side of an uploaded image in pixels. Defaults to 1024.
+            jpeg_quality (int, optional): Quality of re-encoded JPEG images. Defaults to 85.
+        """
+
+        self.min_width: int = min_width
+        self.min_height: int = min_height
+        self.min_bytes: int = min_bytes
+        self.max_hash_distance: int = max_hash_distance
+        self.max_side: int = max_side
+        self.jpeg_quality: int = jpeg_quality
+        self._seen_hashes: List[int] = []
+        self.stats: Dict[str, int] = {"kept": 0, "dropped_small": 0, "dropped_duplicate": 0, "dropped_unreadable": 0}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def dhash(image: Image.Image, hash_size: int = 8) -> int:
+
+        """Perceptual difference hash of an image.
+
+        Args:
+            image (Image.Image): Image to hash
+            hash_size (int, optional): Width and height of the hash grid. Defaults to 8.
+
+        Returns:
+            int: hash_size * hash_size bit hash, similar images differ in few bits
+        """
+
+        pixels = list(image.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS).getdata())
+        value = 0
+        for row in range(hash_size):
+            for col in range(hash_size):
+                left = pixels[row * (hash_size + 1) + col]
+                right = pixels[row * (hash_size + 1) + col + 1]
+                value = (value << 1) | int(left > right)
+        return value
+
+    def accept(self, image_path: str) -> bool:
+
+        """Decide whether an extracted image is worth summarizing.
+
+        Args:
+            image_path (str): Path to the image
+
+        Returns:
+            bool: False for images that are too small or duplicate an accepted image
+        """
+
+        with open(image_path, "rb") as image_file:
+            image_bytes = image_file.read()
+
+        try:
+            image = Image.open(io.BytesIO(image_bytes))
+            image.load()
+        except Exception as e:
+            logger.warning("Error in ImagePreprocessor.accept %s: %s", image_path, e)
+            METRICS.inc("image_decode_errors")
+            with self._lock:
+                self.stats["dropped_unreadable"] += 1
+            return False
+
+        if len(image_bytes) < self.min_bytes or image.width < self.min_width or image.height < self.min_height:
+            with self._lock:
+                self.stats["dropped_small"] += 1
+            return False
+
+        image_hash = ImagePreprocessor.dhash(image)
+        with self._lock:
+            if any(bin(image_hash ^ seen).count("1") <= self.max_hash_distance for seen in self._seen_hashes):
+                self.stats["dropped_duplicate"] += 1
+                return False
+
+            self._seen_hashes.append(image_hash)
+            self.stats["kept"] += 1
+        return True
+
+    def prepare_for_upload(self, image_bytes: bytes) -> Tuple[bytes, str]:
+
+        """Downscale and re-encode an image for the vision model.
+
+        Images with transparency are encoded as PNG and everything else as JPEG. The original
+        bytes are kept when re-encoding would not make the upload smaller.
+
+        Args:
+            image_bytes (bytes): Content of the image file
+
+        Returns:
+            Tuple[bytes, str]: Content to upload and its MIME type
+        """
+
+        image = Image.open(io.BytesIO(image_bytes))
+        original_mime = Image.MIME.get(image.format, "image/jpeg")
+
+        resized = image.width > self.max_side or image.height > self.max_side
+        if resized:
+            image = image.copy()
+            image.thumbnail((self.max_side, self.max_side), Image.LANCZOS)
+
+        has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+        buffer = io.BytesIO()
+        if has_alpha:
+            image.save(buffer, format="PNG", optimize=True)
+            mime = "image/png"
+        else:
+            image.convert("RGB").save(buffer, format="JPEG", quality=self.jpeg_quality, optimize=True)
+            mime = "image/jpeg"
+
+        if not resized and len(buffer.getvalue()) >= len(image_bytes):
+            return image_bytes, original_mime
+        return buffer.getvalue(), mime
@@ -0,0 +1,161 @@
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+import os.path as osp
+from typing import Any, Dict, List, Optional, Tuple
+from data_ingestor import locate_documents
+from ingestion_manifest import bytes_fingerprint
+from retriever import Retriever
+from metrics import METRICS
+
+# headless bulk ingestion of a directory tree of pdfs, e.g. for nightly loads on batch nodes:
+#   python ingest_cli.py ./reports --persist-directory ./chroma_db --collection reports --workers 8
+
+logger = logging.getLogger("ingest_cli")
+
+
+def _read(path: str) -> bytes:
+
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _counter_total(metrics: Dict[str, List[dict]], name: str) -> float:
+
+    # sum of a counter over all of its labels
+    return sum(counter["value"] for counter in metrics["counters"] if counter["name"] == name)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+
+    parser = argparse.ArgumentParser(description="Ingest a directory tree of pdfs into a collection without the Streamlit app.")
+    parser.add_argument("docs_dir", help="Directory searched recursively for pdfs, or a single pdf")
+    parser.add_argument("--persist-directory", default="./chroma_db", help="Directory of the vector database (default: ./chroma_db)")
+    parser.add_argument("--collection", default="mm_rag", help="Name of the collection (default: mm_rag)")
+    parser.add_argument("--docstore-path", default="./docstore.db", help="Path of the SQLite docstore (default: ./docstore.db)")
+    parser.add_argument("--figures-dir", default="figures", help="Directory for the extracted images (default: figures)")
+    parser.add_argument("--workers", type=int, default=None, help="Extraction processes (default: number of CPUs)")
+    parser.add_argument("--parallel-documents", type=int, default=4, help="Documents extracted at the same time (default: 4)")
+    parser.add_argument("--batch-documents", type=int, default=16, help="Documents read into memory and ingested together (default: 16)")
+    parser.add_argument("--batch-size", type=int, default=16, help="Chunks per summary and insert batch (default: 16)")
+    parser.add_argument("--resume", action=argparse.BooleanOptionalAction, default=True, help="Skip documents already indexed with the same content, --no-resume re-ingests every document found (default: resume)")
+    parser.add_argument("--sync", action="store_true", help="Remove indexed documents that are no longer in docs_dir")
+    parser.add_argument("--vector-backend", choices=("chroma", "quantized"), default="chroma", help="Vector database (default: chroma)")
+    parser.add_argument("--vector-dtype", choices=("int8", "float16"), default="int8", help="Vectors of the quantized backend (default: int8)")
+    parser.add_argument("--vector-index", choices=("exact", "ivf"), default="exact", help="Search of the quantized backend (default: exact)")
+    parser.add_argument("--metrics-output", default=None, help="Write the pipeline metrics of the run as JSON to this file")
+    parser.add_argument("--log-level", default="INFO", help="Level of the pipeline logs written to stderr (default: INFO)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    if args.parallel_documents < 1 or args.batch_documents < 1:
+        parser.error("--parallel-documents and --batch-documents must be at least 1")
+
+    documents: List[Tuple[str, str]] = locate_documents(args.docs_dir)
+    logger.info("Located documents: %d", len(documents))
+
+    os.makedirs(osp.dirname(osp.abspath(args.docstore_path)), exist_ok=True)
+    retriever = Retriever(
+        collection_name=args.collection,
+        persist_directory=args.persist_directory,
+        docstore_path=args.docstore_path,
+        batch_size=args.batch_size,
+        figures_dir=args.figures_dir,
+        vector_backend=args.vector_backend,
+        vector_dtype=args.vector_dtype,
+        vector_index=args.vector_index
+    )
+
+    if not args.resume:
+        retriever.remove_documents(source for source, _ in documents)
+
+    METRICS.reset()
+    ingested: List[str] = []
+    failed: List[str] = []
+    incomplete: List[str] = []
+    interrupted: bool = False
+    start = time.perf_counter()
+    try:
+        for offset in range(0, len(documents), args.batch_documents):
+            batch: List[Tuple[str, bytes]] = []
+            for source, path in documents[offset:offset + args.batch_documents]:
+                try:
+                    batch.append((source, _read(path)))
+                except OSError:
+                    logger.exception("Could not read %s", path)
+                    failed.append(source)
+            fingerprints: Dict[str, str] = {source: bytes_fingerprint(content) for source, content in batch}
+            already_indexed = {source for source in fingerprints if retriever.manifest.is_document_indexed(source, fingerprints[source])}
+            try:
+                retriever.ingest_documents(
+                    batch,
+                    max_parallel_documents=args.parallel_documents,
+                    extraction_workers=args.workers
+                )
+                batch_failed = False
+            except Exception:
+                # the documents of the batch that completed stay indexed, the others are retried by the next run
+                logger.exception("Ingestion of documents %d to %d failed", offset + 1, offset + len(batch))
+                batch_failed = True
+
+            # a document counts as ingested once the manifest records it as indexed with its content,
+            # one whose summaries failed is not, and the next run completes it
+            for source, fingerprint in fingerprints.items():
+                if retriever.manifest.is_document_indexed(source, fingerprint):
+                    if source not in already_indexed:
+                        ingested.append(source)
+                elif batch_failed:
+                    failed.append(source)
+                else:
+                    incomplete.append(source)
+            if batch_failed:
+                continue
+            logger.info("Documents done: %d / %d", min(offset + args.batch_documents, len(documents)), len(documents))
+
+        if args.sync:
+            retriever.sync_documents(source for source, _ in documents)
+    except KeyboardInterrupt:
+        interrupted = True
+        logger.warning("Interrupted, the next run resumes from the documents already indexed")
+    elapsed = time.perf_counter() - start
+
+    metrics: Dict[str, List[dict]] = METRICS.to_json()
+    skipped = int(_counter_total(metrics, "documents_skipped"))
+    pages = int(_counter_total(metrics, "pages_extracted"))
+    chunks_extracted = int(_counter_total(metrics, "chunks_extracted"))
+    chunks_indexed = int(_counter_total(metrics, "chunks_inserted"))
+    summary: Dict[str, Any] = {
+        "documents_found": len(documents),
+        "documents_skipped": skipped,
+        "documents_ingested": len(ingested),
+        "documents_incomplete": len(incomplete),
+        "documents_failed": len(failed),
+        "pages": pages,
+        "chunks_extracted": chunks_extracted,
+        "chunks_indexed": chunks_indexed,
+        "seconds": elapsed,
+        "pages_per_second": pages / elapsed if elapsed else 0.0,
+        "chunks_per_second": chunks_extracted / elapsed if elapsed else 0.0
+    }
+
+    for name, value in summary.items():
+        print(f"{name:>20}: {value:.2f}" if isinstance(value, float) else f"{name:>20}: {value}")
+    for source in failed:
+        print(f"failed: {source}")
+    for source in incomplete:
+        print(f"incomplete: {source}")
+
+    if args.metrics_output:
+        with open(args.metrics_output, "w") as f:
+            json.dump({"summary": summary, "metrics": metrics}, f, indent=2)
+
+    if interrupted:
+        return 130
+    return 1 if failed or incomplete else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
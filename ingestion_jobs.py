@@ -0,0 +1,397 @@
+import os
+import re
+import time
+import uuid
+import shutil
+import logging
+import threading
+import os.path as osp
+from enum import Enum, auto
+from dataclasses import dataclass, field
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from retriever import IngestionCancelled
+from retriever import Retriever
+from metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SessionWorkspace:
+
+    """
+    Data class for the collection and working directories of one session or tenant.
+
+    Sessions never share a Chroma directory, docstore or image directory, so they can ingest
+    and query at the same time without touching each other's data.
+    """
+
+    session_id: str
+    root: str
+
+    @staticmethod
+    def for_session(session_id: str, root_dir: str = "./sessions") -> "SessionWorkspace":
+
+        """Get the workspace of a session.
+
+        Args:
+            session_id (str): Session or tenant identifier
+            root_dir (str, optional): Directory holding every workspace. Defaults to "./sessions".
+
+        Returns:
+            SessionWorkspace: Workspace under root_dir, named after the session
+        """
+
+        safe_id = re.sub(r"[^a-zA-Z0-9_-]", "_", session_id)[:48]
+        return SessionWorkspace(session_id, osp.join(root_dir, safe_id))
+
+    @property
+    def collection_name(self) -> str:
+
+        # chroma collection names are limited to 63 alphanumeric, '_' and '-' characters
+        return "mm_rag_" + re.sub(r"[^a-zA-Z0-9_-]", "_", self.session_id)[:48]
+
+    @property
+    def persist_directory(self) -> str:
+
+        return osp.join(self.root, "chroma_db")
+
+    @property
+    def docstore_path(self) -> str:
+
+        return osp.join(self.root, "docstore.db")
+
+    @property
+    def figures_dir(self) -> str:
+
+        return osp.join(self.root, "figures")
+
+    def create_retriever(self, **kwargs) -> Retriever:
+
+        """Open the retriever over this workspace.
+
+        Args:
+            **kwargs: Further Retriever arguments
+
+        Returns:
+            Retriever: Retriever on the workspace's collection, docstore and figures directory
+        """
+
+        os.makedirs(self.root, exist_ok=True)
+        return Retriever(
+            collection_name=self.collection_name,
+            persist_directory=self.persist_directory,
+            docstore_path=self.docstore_path,
+            figures_dir=self.figures_dir,
+            **kwargs
+        )
+
+    def remove(self) -> None:
+
+        """
+        Delete every file of the workspace.
+        """
+
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+class JobStatus(Enum):
+
+    """
+    States of an ingestion job.
+    """
+
+    QUEUED = auto()
+    RUNNING = auto()
+    SUCCEEDED = auto()
+    FAILED = auto()
+    CANCELLED = auto()
+
+
+@dataclass
+class IngestionJob:
+
+    """
+    Data class for the state and progress of a background ingestion.
+    """
+
+    job_id: str
+    session_id: str
+    sources: List[str]
+    status: JobStatus = JobStatus.QUEUED
+    documents_done: int = 0
+    chunks_extracted: int = 0
+    chunks_indexed: int = 0
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    cancel_event: threading.Event = field(default_factory=threading.Event, repr=False)
+    future: Optional[Future] = field(default=None, repr=False)
+
+    @property
+    def finished(self) -> bool:
+
+        return self.status in (JobStatus.SUCCEEDED, JobStatus.FAILED, JobStatus.CANCELLED)
+
+    @property
+    def progress(self) -> float:
+
+        """
+        Share of the job's documents that are done, between 0 and 1.
+        """
+
+        return 1.0 if self.finished else self.documents_done / max(1, len(self.sources))
+
+    def cancel(self) -> None:
+
+        """
+        Ask the job to stop, a running job stops after its current batch.
+        """
+
+        self.cancel_event.set()
+
+
+class IngestionJobManager:
+
+    """
+    Worker pool running ingestions in the background.
+
+    Jobs of different sessions run in parallel up to max_workers, jobs of the same session run
+    one after the other since they write to the same collection. The documents of a job are
+    ingested from memory as one parallel batch. Every job reports its progress
+    on its IngestionJob and can be cancelled. Workspaces of sessions that have not been seen
+    for workspace_ttl seconds are deleted, together with their jobs and lock.
+    """
+
+    def __init__(
+            self,
+            max_workers: int = 2,
+            root_dir: str = "./sessions",
+            max_finished_jobs: int = 100,
+            max_parallel_documents: int = 4,
+            workspace_ttl: float = 24 * 3600,
+            sweep_interval: float = 60.0
+        ):
+
+        """Initialize IngestionJobManager class.
+
+        Args:
+            max_workers (int, optional): Number of ingestions running at the same time. Defaults to 2.
+            root_dir (str, optional): Directory holding the session workspaces. Defaults to "./sessions".
+            max_finished_jobs (int, optional): Finished jobs kept for reporting. Defaults to 100.
+            max_parallel_documents (int, optional): Documents of one job extracted at the same time. Defaults to 4.
+            workspace_ttl (float, optional): Seconds after which the workspace of an idle session is deleted. Defaults to 24 hours.
+            sweep_interval (float, optional): Minimum seconds between two sweeps for idle workspaces. Defaults to 60.
+        """
+
+        self.root_dir: str = root_dir
+        self.max_finished_jobs: int = max_finished_jobs
+        self.max_parallel_documents: int = max_parallel_documents
+        self.workspace_ttl: float = workspace_ttl
+        self.sweep_interval: float = sweep_interval
+        self._last_seen: Dict[str, float] = {}  #session id -> time of its last page run or job
+        self._last_sweep: float = 0.0
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingestion")
+        self._jobs: Dict[str, IngestionJob] = {}
+        self._session_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def workspace(self, session_id: str) -> SessionWorkspace:
+
+        """Get the workspace of a session.
+
+        Args:
+            session_id (str): Session or tenant identifier
+
+        Returns:
+            SessionWorkspace: Workspace of the session
+        """
+
+        return SessionWorkspace.for_session(session_id, self.root_dir)
+
+    def touch(self, session_id: str) -> None:
+
+        """Mark a session as active and delete the workspaces of idle ones, at most every sweep_interval.
+
+        Args:
+            session_id (str): Session or tenant identifier
+        """
+
+        now = time.time()
+        with self._lock:
+            self._last_seen[session_id] = now
+            if now - self._last_sweep < self.sweep_interval:
+                return
+            self._last_sweep = now
+        self.sweep_idle_workspaces(now)
+
+    def sweep_idle_workspaces(self, now: Optional[float] = None) -> List[str]:
+
+        """Delete the workspaces of sessions idle for longer than workspace_ttl.
+
+        Sessions with an unfinished job are kept. Workspaces left by an earlier server process,
+        whose sessions are unknown, are deleted once their directory is older than workspace_ttl.
+
+        Args:
+            now (Optional[float], optional): Current time. Defaults to time.time().
+
+        Returns:
+            List[str]: Deleted workspace directories
+        """
+
+        now = time.time() if now is None else now
+        with self._lock:
+            busy = {job.session_id for job in self._jobs.values() if not job.finished}
+            idle = [
+                session_id for session_id, last_seen in self._last_seen.items()
+                if now - last_seen > self.workspace_ttl and session_id not in busy
+            ]
+            for session_id in idle:
+                del self._last_seen[session_id]
+                self._session_locks.pop(session_id, None)
+                for job in [job for job in self._jobs.values() if job.session_id == session_id]:
+                    del self._jobs[job.job_id]
+            active_roots = {self.workspace(session_id).root for session_id in set(self._last_seen) | busy}
+
+        roots = [self.workspace(session_id).root for session_id in idle]
+        if osp.isdir(self.root_dir):
+            roots.extend(
+                root for root in (osp.join(self.root_dir, name) for name in os.listdir(self.root_dir))
+                if root not in active_roots and root not in roots and osp.isdir(root)
+                and now - osp.getmtime(root) > self.workspace_ttl
+            )
+        for root in roots:
+            logger.info("Removing idle workspace %s", root)
+            shutil.rmtree(root, ignore_errors=True)
+        if roots:
+            METRICS.inc("workspaces_removed", len(roots))
+        return roots
+
+    def submit(
+            self,
+            session_id: str,
+            retriever: Retriever,
+            documents: List[Tuple[str, bytes]],
+            sync: bool = True
+        ) -> IngestionJob:
+
+        """Queue the ingestion of documents.
+
+        Args:
+            session_id (str): Session or tenant identifier
+            retriever (Retriever): Retriever of the session's workspace
+            documents (List[Tuple[str, bytes]]): (name, content) of every pdf
+            sync (bool, optional): Remove the session's documents that are not in documents once the job succeeded. Defaults to True.
+
+        Returns:
+            IngestionJob: Job, updated while it runs
+        """
+
+        job = IngestionJob(uuid.uuid4().hex, session_id, [name for name, _ in documents])
+        with self._lock:
+            self._last_seen[session_id] = time.time()
+            self._evict_finished()
+            self._jobs[job.job_id] = job
+            session_lock = self._session_locks.setdefault(session_id, threading.Lock())
+        job.future = self._pool.submit(self._run, job, session_lock, retriever, documents, sync)
+        METRICS.inc("ingestion_jobs_submitted")
+        return job
+
+    def _evict_finished(self) -> None:
+
+        finished = [job for job in self._jobs.values() if job.finished]
+        for job in sorted(finished, key=lambda job: job.finished_at)[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self._jobs[job.job_id]
+
+    def _run(
+            self,
+            job: IngestionJob,
+            session_lock: threading.Lock,
+            retriever: Retriever,
+            documents: List[Tuple[str, bytes]],
+            sync: bool
+        ) -> None:
+
+        def progress(update: Dict[str, int]) -> None:
+            job.chunks_extracted = update["chunks_extracted"]
+            job.chunks_indexed = update["chunks_indexed"]
+            job.documents_done = update["documents_done"]
+
+        with session_lock:
+            if job.cancel_event.is_set():
+                self._finish(job, JobStatus.CANCELLED)
+                return
+
+            job.status = JobStatus.RUNNING
+            try:
+                with METRICS.span("ingestion_job"):
+                    # the documents are extracted and summarized in parallel straight from memory
+                    retriever.ingest_documents(
+                        documents,
+                        progress=progress,
+                        cancel_event=job.cancel_event,
+                        max_parallel_documents=self.max_parallel_documents
+                    )
+                    job.documents_done = len(documents)
+
+                    if sync:
+                        retriever.sync_documents(job.sources)
+            except IngestionCancelled:
+                logger.info("Ingestion job %s cancelled", job.job_id)
+                self._finish(job, JobStatus.CANCELLED)
+            except Exception as e:
+                logger.exception("Ingestion job %s failed", job.job_id)
+                job.error = str(e)
+                self._finish(job, JobStatus.FAILED)
+            else:
+                self._finish(job, JobStatus.SUCCEEDED)
+
+    @staticmethod
+    def _finish(job: IngestionJob, status: JobStatus) -> None:
+
+        job.finished_at = time.time()
+        job.status = status
+        METRICS.inc("ingestion_jobs_finished", status=status.name)
+
+    def jobs(self, session_id: str) -> List[IngestionJob]:
+
+        """Jobs of a session, oldest first.
+
+        Args:
+            session_id (str): Session or tenant identifier
+
+        Returns:
+            List[IngestionJob]: Queued, running and recently finished jobs
+        """
+
+        with self._lock:
+            return sorted(
+                (job for job in self._jobs.values() if job.session_id == session_id), key=lambda job: job.created_at
+            )
+
+    def cancel_session(self, session_id: str) -> None:
+
+        """Cancel every unfinished job of a session.
+
+        Args:
+            session_id (str): Session or tenant identifier
+        """
+
+        for job in self.jobs(session_id):
+            if not job.finished:
+                job.cancel()
+
+    def shutdown(self, cancel: bool = True) -> None:
+
+        """Stop the worker pool.
+
+        Args:
+            cancel (bool, optional): Cancel unfinished jobs instead of waiting for them. Defaults to True.
+        """
+
+        if cancel:
+            with self._lock:
+                for job in self._jobs.values():
+                    job.cancel()
+        self._pool.shutdown(wait=True)
@@ -0,0 +1,274 @@
+import sqlite3
+import hashlib
+import threading
+from typing import Iterable, List, Optional, Set, Union, ByteString
+from data_classes import RAGDataType
+
+
+def file_fingerprint(path: str) -> str:
+
+    """Fingerprint a document by the hash of its bytes.
+
+    Args:
+        path (str): Path to the document
+
+    Returns:
+        str: Hex digest of the document
+    """
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def bytes_fingerprint(content: bytes) -> str:
+
+    """Fingerprint a document held in memory, equal to the file_fingerprint of the same bytes.
+
+    Args:
+        content (bytes): Content of the document
+
+    Returns:
+        str: Hex digest of the document
+    """
+
+    return hashlib.sha256(content).hexdigest()
+
+
+def chunk_fingerprint(data_type: RAGDataType, data: Union[ByteString, str]) -> str:
+
+    """Fingerprint an extracted chunk. The fingerprint is used as its doc_id in the db.
+
+    Images are fingerprinted by the bytes of the image file, text and tables by their text.
+
+    Args:
+        data_type (RAGDataType): Type of the chunk
+        data (Union[ByteString, str]): Text of the chunk or path to the image
+
+    Returns:
+        str: Hex digest of the chunk
+    """
+
+    if data_type == RAGDataType.IMAGE:
+        with open(data, "rb") as image_file:
+            content = image_file.read()
+    elif isinstance(data, str):
+        content = data.encode("utf-8")
+    else:
+        content = bytes(data)
+
+    digest = hashlib.sha256()
+    digest.update(data_type.name.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(content)
+    return digest.hexdigest()
+
+
+class IngestionManifest:
+
+    """
+    Record of the ingested documents and the chunks indexed for each of them.
+
+    A document is identified by its source name and fingerprinted by its bytes. Chunks are
+    identified by their fingerprint, which may be shared by several documents; a chunk is only
+    removed from the db once no document references it anymore.
+    """
+
+    def __init__(self, db_path: str = "./docstore.db"):
+
+        """Initialize IngestionManifest class.
+
+        Args:
+            db_path (str, optional): Path to the SQLite database file. Defaults to "./docstore.db".
+        """
+
+        self.db_path: str = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS manifest_documents (source TEXT PRIMARY KEY, fingerprint TEXT)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS manifest_chunks ("
+            "source TEXT NOT NULL, doc_id TEXT NOT NULL, PRIMARY KEY (source, doc_id))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS manifest_chunks_doc_id ON manifest_chunks (doc_id)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS manifest_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+        )
+        self._conn.execute("INSERT OR IGNORE INTO manifest_meta (key, value) VALUES ('corpus_version', 0)")
+        self._conn.commit()
+
+    def corpus_version(self) -> int:
+
+        """Version of the indexed corpus, incremented on every change to the db.
+
+        Returns:
+            int: Corpus version
+        """
+
+        with self._lock:
+            return self._conn.execute(
+                "SELECT value FROM manifest_meta WHERE key = 'corpus_version'"
+            ).fetchone()[0]
+
+    def _bump_corpus_version(self) -> None:
+
+        self._conn.execute("UPDATE manifest_meta SET value = value + 1 WHERE key = 'corpus_version'")
+
+    def is_document_indexed(self, source: str, fingerprint: str) -> bool:
+
+        """Check whether a document has been fully indexed with this exact content.
+
+        Args:
+            source (str): Name of the document
+            fingerprint (str): Fingerprint of the document
+
+        Returns:
+            bool: True if the document can be skipped
+        """
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT fingerprint FROM manifest_documents WHERE source = ?", (source,)
+            ).fetchone()
+        return row is not None and row[0] == fingerprint
+
+    def sources(self) -> List[str]:
+
+        """
+        Names of all documents in the manifest.
+        """
+
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT source FROM manifest_documents")]
+
+    def indexed_chunks(self, doc_ids: Iterable[str]) -> Set[str]:
+
+        """Filter the doc_ids down to the chunks that are already indexed.
+
+        Args:
+            doc_ids (Iterable[str]): Chunk fingerprints
+
+        Returns:
+            Set[str]: Chunk fingerprints already present in the db
+        """
+
+        doc_ids = list(doc_ids)
+        indexed: Set[str] = set()
+        with self._lock:
+            # sqlite limits the number of bound parameters per statement
+            for start in range(0, len(doc_ids), 500):
+                batch = doc_ids[start:start + 500]
+                placeholders = ",".join("?" for _ in batch)
+                indexed.update(
+                    row[0] for row in self._conn.execute(
+                        f"SELECT DISTINCT doc_id FROM manifest_chunks WHERE doc_id IN ({placeholders})", batch
+                    )
+                )
+        return indexed
+
+    def add_chunks(self, source: str, doc_ids: Iterable[str]) -> None:
+
+        """Record chunks indexed for a document while it is still being ingested.
+
+        The document is recorded without a fingerprint until update_document completes it, so
+        the chunks of a cancelled or failed ingestion can still be removed with the document.
+
+        Args:
+            source (str): Name of the document
+            doc_ids (Iterable[str]): Chunk fingerprints just added to the db
+        """
+
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO manifest_chunks (source, doc_id) VALUES (?, ?)",
+                [(source, doc_id) for doc_id in doc_ids]
+            )
+            self._conn.execute(
+                "INSERT OR IGNORE INTO manifest_documents (source, fingerprint) VALUES (?, NULL)", (source,)
+            )
+            # a new version of the document is incomplete until update_document records it
+            self._conn.execute("UPDATE manifest_documents SET fingerprint = NULL WHERE source = ?", (source,))
+            self._bump_corpus_version()
+            self._conn.commit()
+
+    def update_document(self, source: str, fingerprint: Optional[str], doc_ids: Iterable[str]) -> List[str]:
+
+        """Replace the chunks recorded for a document.
+
+        Args:
+            source (str): Name of the document
+            fingerprint (Optional[str]): Fingerprint of the document, None if some chunks are still missing
+            doc_ids (Iterable[str]): Chunk fingerprints now indexed for the document
+
+        Returns:
+            List[str]: Chunks no longer referenced by any document, to be deleted from the db
+        """
+
+        with self._lock:
+            old_doc_ids = {
+                row[0] for row in self._conn.execute(
+                    "SELECT doc_id FROM manifest_chunks WHERE source = ?", (source,)
+                )
+            }
+            self._conn.execute("DELETE FROM manifest_chunks WHERE source = ?", (source,))
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO manifest_chunks (source, doc_id) VALUES (?, ?)",
+                [(source, doc_id) for doc_id in doc_ids]
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO manifest_documents (source, fingerprint) VALUES (?, ?)",
+                (source, fingerprint)
+            )
+            orphans = self._orphans(old_doc_ids)
+            self._bump_corpus_version()
+            self._conn.commit()
+        return orphans
+
+    def remove_document(self, source: str) -> List[str]:
+
+        """Forget a document.
+
+        Args:
+            source (str): Name of the document
+
+        Returns:
+            List[str]: Chunks no longer referenced by any document, to be deleted from the db
+        """
+
+        with self._lock:
+            old_doc_ids = {
+                row[0] for row in self._conn.execute(
+                    "SELECT doc_id FROM manifest_chunks WHERE source = ?", (source,)
+                )
+            }
+            self._conn.execute("DELETE FROM manifest_chunks WHERE source = ?", (source,))
+            self._conn.execute("DELETE FROM manifest_documents WHERE source = ?", (source,))
+            orphans = self._orphans(old_doc_ids)
+            self._bump_corpus_version()
+            self._conn.commit()
+        return orphans
+
+    def _orphans(self, doc_ids: Set[str]) -> List[str]:
+
+        return [
+            doc_id for doc_id in doc_ids
+            if self._conn.execute(
+                "SELECT 1 FROM manifest_chunks WHERE doc_id = ? LIMIT 1", (doc_id,)
+            ).fetchone() is None
+        ]
+
+    def clear(self) -> None:
+
+        """
+        Forget every document.
+        """
+
+        with self._lock:
+            self._conn.execute("DELETE FROM manifest_chunks")
+            self._conn.execute("DELETE FROM manifest_documents")
+            self._bump_corpus_version()
+            self._conn.commit()
@@ -0,0 +1,146 @@
+import re
+import math
+import sqlite3
+import threading
+from collections import Counter
+from typing import Iterable, List, Sequence, Tuple
+
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-./_][a-z0-9]+)*")
+
+
+def tokenize(text: str) -> List[str]:
+
+    """Split a text into lowercase terms for the lexical index.
+
+    Compound tokens such as part numbers ("AB-1234", "3.5mm") are kept whole and also split into
+    their parts, so both exact and partial spellings match.
+
+    Args:
+        text (str): Text to tokenize
+
+    Returns:
+        List[str]: Terms of the text
+    """
+
+    terms: List[str] = []
+    for token in _TOKEN_PATTERN.findall(text.lower()):
+        terms.append(token)
+        parts = re.split(r"[-./_]", token)
+        if len(parts) > 1:
+            terms.extend(part for part in parts if part)
+    return terms
+
+
+class BM25Index:
+
+    """
+    BM25 inverted index over the original chunk text, stored in SQLite next to the docstore.
+
+    Search runs entirely locally, so exact terms like part numbers and table values can be
+    found without a network call.
+    """
+
+    def __init__(self, db_path: str = "./docstore.db", k1: float = 1.5, b: float = 0.75):
+
+        """Initialize BM25Index class.
+
+        Args:
+            db_path (str, optional): Path to the SQLite database file. Defaults to "./docstore.db".
+            k1 (float, optional): BM25 term frequency saturation. Defaults to 1.5.
+            b (float, optional): BM25 document length normalization. Defaults to 0.75.
+        """
+
+        self.db_path: str = db_path
+        self.k1: float = k1
+        self.b: float = b
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS bm25_postings ("
+            "term TEXT NOT NULL, doc_id TEXT NOT NULL, tf INTEGER NOT NULL, PRIMARY KEY (term, doc_id))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS bm25_postings_doc_id ON bm25_postings (doc_id)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS bm25_docs (doc_id TEXT PRIMARY KEY, length INTEGER NOT NULL)")
+        self._conn.commit()
+
+    def add(self, docs: Iterable[Tuple[str, str]]) -> None:
+
+        """Index documents, replacing earlier versions with the same doc_id.
+
+        Args:
+            docs (Iterable[Tuple[str, str]]): (doc_id, text) pairs
+        """
+
+        with self._lock:
+            for doc_id, text in docs:
+                terms = tokenize(text)
+                self._conn.execute("DELETE FROM bm25_postings WHERE doc_id = ?", (doc_id,))
+                self._conn.executemany(
+                    "INSERT INTO bm25_postings (term, doc_id, tf) VALUES (?, ?, ?)",
+                    [(term, doc_id, tf) for term, tf in Counter(terms).items()]
+                )
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO bm25_docs (doc_id, length) VALUES (?, ?)", (doc_id, len(terms))
+                )
+            self._conn.commit()
+
+    def delete(self, doc_ids: Sequence[str]) -> None:
+
+        """Remove documents from the index.
+
+        Args:
+            doc_ids (Sequence[str]): doc_ids to remove
+        """
+
+        with self._lock:
+            self._conn.executemany("DELETE FROM bm25_postings WHERE doc_id = ?", [(i,) for i in doc_ids])
+            self._conn.executemany("DELETE FROM bm25_docs WHERE doc_id = ?", [(i,) for i in doc_ids])
+            self._conn.commit()
+
+    def clear(self) -> None:
+
+        """
+        Remove every document from the index.
+        """
+
+        with self._lock:
+            self._conn.execute("DELETE FROM bm25_postings")
+            self._conn.execute("DELETE FROM bm25_docs")
+            self._conn.commit()
+
+    def search(self, query: str, k: int = 20) -> List[Tuple[str, float]]:
+
+        """Rank the indexed documents against a query with BM25.
+
+        Args:
+            query (str): Query text
+            k (int, optional): Number of results. Defaults to 20.
+
+        Returns:
+            List[Tuple[str, float]]: (doc_id, score) pairs, best first
+        """
+
+        query_terms = set(tokenize(query))
+        if not query_terms:
+            return []
+
+        with self._lock:
+            num_docs, avg_length = self._conn.execute("SELECT COUNT(*), AVG(length) FROM bm25_docs").fetchone()
+            if not num_docs:
+                return []
+
+            scores: Counter = Counter()
+            for term in query_terms:
+                postings = self._conn.execute(
+                    "SELECT p.doc_id, p.tf, d.length FROM bm25_postings p "
+                    "JOIN bm25_docs d ON d.doc_id = p.doc_id WHERE p.term = ?", (term,)
+                ).fetchall()
+                if not postings:
+                    continue
+                idf = math.log(1 + (num_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf, length in postings:
+                    norm = self.k1 * (1 - self.b + self.b * length / (avg_length or 1))
+                    scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        return scores.most_common(k)
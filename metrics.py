@@ -0,0 +1,243 @@
+import math
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def percentile(samples: List[float], p: float) -> float:
+
+    """Nearest rank percentile of samples.
+
+    Args:
+        samples (List[float]): Samples, in any order
+        p (float): Percentile between 0 and 1
+
+    Returns:
+        float: Smallest sample with at least p of the samples at or below it, 0.0 without samples
+    """
+
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(p * len(ordered)) - 1))]
+
+
+class _Latency:
+
+    # totals cover every observation, percentiles the most recent ones
+
+    def __init__(self, max_samples: int):
+
+        self.count: int = 0
+        self.total: float = 0.0
+        self.samples: Deque[float] = deque(maxlen=max_samples)
+
+    def observe(self, value: float) -> None:
+
+        self.count += 1
+        self.total += value
+        self.samples.append(value)
+
+
+class Metrics:
+
+    """
+    Registry of counters and latency distributions of the pipeline.
+
+    Stages are timed with span(), which records the wall time under '<name>_seconds' and counts
+    failures under '<name>_errors'. Every value is keyed by its name and labels, e.g. the model
+    or the data type. The registry is exported as OpenMetrics text or as JSON.
+    """
+
+    QUANTILES: Tuple[float, ...] = (0.5, 0.9, 0.99)
+
+    def __init__(self, max_samples: int = 1024):
+
+        """Initialize Metrics class.
+
+        Args:
+            max_samples (int, optional): Recent observations kept per latency series for its percentiles. Defaults to 1024.
+        """
+
+        self.max_samples: int = max_samples
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._latencies: Dict[str, Dict[LabelKey, _Latency]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(labels: Dict[str, Any]) -> LabelKey:
+
+        return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels: Any) -> None:
+
+        """Increase a counter.
+
+        Args:
+            name (str): Counter name, without the '_total' suffix
+            value (float, optional): Amount to add. Defaults to 1.
+            **labels: Labels of the series
+        """
+
+        key = self._key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels: Any) -> None:
+
+        """Record a latency.
+
+        Args:
+            name (str): Latency series name, usually ending in '_seconds'
+            seconds (float): Observed latency
+            **labels: Labels of the series
+        """
+
+        key = self._key(labels)
+        with self._lock:
+            series = self._latencies.setdefault(name, {})
+            if key not in series:
+                series[key] = _Latency(self.max_samples)
+            series[key].observe(seconds)
+
+    @contextmanager
+    def span(self, name: str, **labels: Any) -> Iterator[None]:
+
+        """Time a stage of the pipeline.
+
+        Args:
+            name (str): Stage name, e.g. "summarize_batch"
+            **labels: Labels of the series
+        """
+
+        start = time.perf_counter()
+        failed = False
+        try:
+            yield
+        except GeneratorExit:
+            # a consumer stopping a generator early is not a failure of the stage
+            raise
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            self.observe(f"{name}_seconds", seconds, **labels)
+            if failed:
+                self.inc(f"{name}_errors", **labels)
+            logger.debug("%s took %.3fs %s", name, seconds, labels)
+
+    def record_llm_call(self, model_name: str, response: Any, seconds: Optional[float], kind: str = "summary") -> None:
+
+        """Record the latency and token usage of a chat model request.
+
+        Args:
+            model_name (str): Name of the requested model
+            response (Any): Response message, its usage_metadata is read if present
+            seconds (Optional[float]): Latency of the request, None when it cannot be separated from the surrounding stage
+            kind (str, optional): Purpose of the request, e.g. "summary" or "answer". Defaults to "summary".
+        """
+
+        self.inc("llm_requests", model=model_name, kind=kind)
+        if seconds is not None:
+            self.observe("llm_request_seconds", seconds, model=model_name, kind=kind)
+        usage: Optional[dict] = getattr(response, "usage_metadata", None)
+        if usage:
+            self.inc("llm_prompt_tokens", usage.get("input_tokens", 0), model=model_name, kind=kind)
+            self.inc("llm_completion_tokens", usage.get("output_tokens", 0), model=model_name, kind=kind)
+
+    def counter(self, name: str, **labels: Any) -> float:
+
+        """Current value of a counter series.
+
+        Args:
+            name (str): Counter name
+            **labels: Labels of the series
+
+        Returns:
+            float: Value, 0 for a series that was never increased
+        """
+
+        with self._lock:
+            return self._counters.get(name, {}).get(self._key(labels), 0)
+
+    def reset(self) -> None:
+
+        """
+        Drop every recorded value.
+        """
+
+        with self._lock:
+            self._counters.clear()
+            self._latencies.clear()
+
+    def to_json(self) -> Dict[str, List[dict]]:
+
+        """Export the registry as JSON serializable data.
+
+        Returns:
+            Dict[str, List[dict]]: 'counters' with name, labels and value, 'latencies' with name, labels, count, sum and quantiles
+        """
+
+        with self._lock:
+            counters = [
+                {"name": name, "labels": dict(key), "value": value}
+                for name, series in sorted(self._counters.items()) for key, value in sorted(series.items())
+            ]
+            latencies = [
+                {
+                    "name": name, "labels": dict(key), "count": latency.count, "sum": latency.total,
+                    **{f"p{int(q * 100)}": percentile(list(latency.samples), q) for q in self.QUANTILES}
+                }
+                for name, series in sorted(self._latencies.items()) for key, latency in sorted(series.items())
+            ]
+        return {"counters": counters, "latencies": latencies}
+
+    @staticmethod
+    def _format_labels(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+
+        pairs = list(key) + list(extra)
+        if not pairs:
+            return ""
+        escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+        return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+    def to_openmetrics(self) -> str:
+
+        """Export the registry in the OpenMetrics text format.
+
+        Counters are exported with a '_total' suffix and latencies as summaries with quantiles.
+
+        Returns:
+            str: Exposition text ending in '# EOF'
+        """
+
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# TYPE {name} counter")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{name}_total{self._format_labels(key)} {value}")
+            for name, series in sorted(self._latencies.items()):
+                lines.append(f"# TYPE {name} summary")
+                lines.append(f"# UNIT {name} seconds")
+                for key, latency in sorted(series.items()):
+                    samples = list(latency.samples)
+                    for q in self.QUANTILES:
+                        lines.append(f"{name}{self._format_labels(key, (('quantile', str(q)),))} {percentile(samples, q)}")
+                    lines.append(f"{name}_sum{self._format_labels(key)} {latency.total}")
+                    lines.append(f"{name}_count{self._format_labels(key)} {latency.count}")
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+# shared by every stage of the pipeline in the process
+METRICS = Metrics()
@@ -1,14 +1,23 @@
-import shutil
+import time
+import asyncio
+import logging
+import threading
 from retriever import Retriever
-from data_classes import RAGDataType
-from chat_models import chat_model
+from chat_models import get_chat_model
+from chat_models import hf_embedding
+from answer_cache import SemanticAnswerCache
+from context_assembler import AssembledContext
+from context_assembler import ContextAssembler
+from metrics import METRICS
 from operator import itemgetter
-from typing import List, Union, ByteString
+from typing import Dict, Iterator, List, Union, ByteString
 from langchain_core.runnables import RunnableLambda
 from langchain_core.documents.base import Document
 from langchain_core.messages import HumanMessage, BaseMessage
 from langchain_core.output_parsers import StrOutputParser 
 
+logger = logging.getLogger(__name__)
+
 
 class MultiModalRAG:
 
@@ -16,65 +25,92 @@ class MultiModalRAG:
     Multi-modal RAG class to answer queries using context documents.
     """
 
-    def __init__(self,docs_dir=""):
+    def __init__(
+            self,
+            docs_dir="",
+            answer_cache: SemanticAnswerCache = None,
+            context_assembler: ContextAssembler = None,
+            retriever: Retriever = None
+        ):
 
         """Initialize MultiModalRAG class.
 
         Args:
             docs_dir (str): Path to documents directory
+            answer_cache (SemanticAnswerCache, optional): Cache of answers to similar queries. Defaults to a cache with default settings.
+            context_assembler (ContextAssembler, optional): Selects the context documents within a token budget. Defaults to a 3000 token budget.
+            retriever (Retriever, optional): Retriever over the ingested corpus. Defaults to the Retriever on the default paths.
         """
 
         self.docs_dirs = docs_dir
-        self.retriver: Retriever = Retriever()
+        self.retriver: Retriever = retriever or Retriever()
         self.retriever_chain = ""
+        self.answer_cache: SemanticAnswerCache = answer_cache or SemanticAnswerCache(hf_embedding)
+        self.context_assembler: ContextAssembler = context_assembler or ContextAssembler()
+        self.last_query_stats: Dict[str, Union[float, bool]] = {}  #latency of the last answered query
+        self.generate_answer_chain = None
+        self._chain_corpus_version: int = None
+        self._chain_lock = threading.Lock()
 
-    def ingest_data(self,pdf_path):
+    def ingest_data(self,pdf_path,source=None):
 
         # data is ingested into the database once the path of pdf file is passed
+        # source is the name the document is tracked under across ingestions
 
         self.docs_dirs = pdf_path
-        self.retriver.ingest_data(pdf_path)
+        self.retriver.ingest_data(pdf_path,source)
+
+    def sync_documents(self,sources):
+
+        # documents that are no longer uploaded are removed from the database
+
+        self.retriver.sync_documents(sources)
 
     def clear(self):
 
-        # for clearing the contents in vector database 
+        # for clearing the contents in vector database and docstore
         # when the input pdf is changed/deleted 
 
-        shutil.rmtree("./chroma_db", ignore_errors=True)
+        self.retriver.clear()
 
-    @staticmethod
-    def create_query_context_prompt(args) -> List[HumanMessage]:
+    def create_query_context_prompt(self, args) -> List[HumanMessage]:
 
         """
-        Create query context prompt using the retrieved documents from database
+        Create query context prompt using the retrieved documents from database,
+        keeping the prompt within the token budget of the context assembler
         """
 
 
-        print("Creating query context prompt")
+        with METRICS.span("prompt_assembly"):
+            return self._create_query_context_prompt(args)
 
+    def _create_query_context_prompt(self, args) -> List[HumanMessage]:
 
         query: str = args['query']
         retrieved_data: List[Document] = args['retrieved_data']
-        
-        messages: List[str] = []
-        text_docs: List[str] = [doc.page_content for doc in retrieved_data if doc.metadata['data_type'] == RAGDataType.TEXT.value]
-        table_docs: List[str] = [doc.page_content for doc in retrieved_data if doc.metadata['data_type'] == RAGDataType.TABLE.value]
-        imgs_docs: List[str] = [doc.page_content for doc in retrieved_data if doc.metadata['data_type'] == RAGDataType.IMAGE.value]
-        
-        print("Retrieved data: ", len(retrieved_data))
-        print("Text docs: ", len(text_docs))
-        print("Table docs: ", len(table_docs))
-        print("Image docs: ", len(imgs_docs))
-
 
-        text_message: dict = {
-            'type': 'text',
-            'text': f"""
+        instructions: str = f"""
 You are given a query and you need to answer the query using the context documents (text, tables and images) below.
 Query: {query}
 
 Context documents:
-{"\n\n".join(text_docs)}
+"""
+        context: AssembledContext = self.context_assembler.assemble(retrieved_data, reserved_text=instructions)
+        
+        logger.info(
+            "Retrieved data: %d, text docs: %d, table docs: %d, image docs: %d",
+            len(retrieved_data), len(context.text_docs), len(context.table_docs), len(context.image_docs)
+        )
+        logger.info("Context selection: %s", context.stats)
+        logger.info("Prompt tokens: %d of budget %d", context.tokens, self.context_assembler.token_budget)
+        METRICS.inc("prompts_assembled")
+        METRICS.inc("prompt_tokens_estimated", context.tokens)
+
+        separator: str = "\n\n"
+
+        text_message: dict = {
+            'type': 'text',
+            'text': f"""{instructions}{separator.join(context.text_docs)}
 """
         }
 
@@ -82,7 +118,7 @@ Context documents:
         table_message: dict = {
             'type': 'text',
             'text': f"""
-{"\n\n".join(table_docs)}
+{separator.join(context.table_docs)}
 """ 
         }
 
@@ -90,7 +126,7 @@ Context documents:
         image_message: dict = {
             'type': 'text',
             'text': f"""
-{"\n\n".join(imgs_docs)}
+{separator.join(context.image_docs)}
 """
         }
 
@@ -100,35 +136,157 @@ Context documents:
 
         return [HumanMessage(content=messages)]
 
+    def _get_generate_answer_chain(self, corpus_version: int):
+
+        """Get the answer generation chain, built once per ingested corpus.
+
+        The chain holds no per query state, so it is shared by every concurrent query.
+
+        Args:
+            corpus_version (int): Version of the ingested corpus
+
+        Returns:
+            Runnable: Chain from {'query': ...} to the chat model's answer message
+        """
+
+        with self._chain_lock:
+            if self._chain_corpus_version != corpus_version or self.generate_answer_chain is None:
+
+                # passes the query to retriver
+                self.retriever_chain = (
+                    "" if itemgetter('query')==None else itemgetter('query')
+                        |
+                    self.retriver.retriever
+                )
+
+                # consists of the retriever chain which passes the result to the prompt
+                #  where it is augmented and passed to the chat model for answer generation.
+
+                self.generate_answer_chain = (
+                    {'query': itemgetter('query'), 'retrieved_data': self.retriever_chain}
+                        |
+                    RunnableLambda(self.create_query_context_prompt)
+                        | 
+                    get_chat_model()
+                        
+                )
+                self._chain_corpus_version = corpus_version
+
+            return self.generate_answer_chain
+
+    def stream_answer(self, query: str) -> Iterator[str]:
+
+        """Answer a query, yielding the answer piece by piece as the chat model generates it.
+
+        The time to first token and the total time are recorded in the metrics and kept in last_query_stats.
+
+        Args:
+            query (str): User query
+
+        Yields:
+            str: Next piece of the answer
+        """
+
+        start: float = time.perf_counter()
+
+        if not self.retriver.has_data():
+            # if no pdf has been ingested the following message is thrown
+
+            yield "Please Insert a proper file"
+            return
+
+        # a previous answer to a similar query on the same corpus is returned without generation
+
+        corpus_version: int = self.retriver.corpus_version()
+        cached_answer: str = self.answer_cache.lookup(query, corpus_version)
+        logger.info("Answer cache: %s", self.answer_cache.stats())
+        if cached_answer is not None:
+            self._record_query_stats(start, time.perf_counter(), cached=True)
+            yield cached_answer
+            return
+
+        generate_answer_chain = self._get_generate_answer_chain(corpus_version)
+
+        pieces: List[str] = []
+        first_token: float = None
+        for chunk in generate_answer_chain.stream({'query': query}):
+            if chunk.usage_metadata:
+                # token usage arrives with the last chunk of the stream
+                METRICS.record_llm_call(get_chat_model().model_name, chunk, None, kind="answer")
+            if not chunk.content:
+                continue
+            if first_token is None:
+                first_token = time.perf_counter()
+            pieces.append(chunk.content)
+            yield chunk.content
+
+        self._record_query_stats(start, first_token, cached=False)
+
+        # Final Output is refined using StrOutputParser
+
+        final_answer: str = StrOutputParser().parse("".join(pieces))
+        self.answer_cache.store(query, corpus_version, final_answer)
+
+    def _record_query_stats(self, start: float, first_token: float, cached: bool) -> None:
+
+        end: float = time.perf_counter()
+        self.last_query_stats = {
+            "time_to_first_token": (first_token or end) - start,
+            "total_time": end - start,
+            "cached": cached
+        }
+        METRICS.inc("answer_cache_hits" if cached else "answer_cache_misses")
+        METRICS.observe("query_time_to_first_token_seconds", self.last_query_stats["time_to_first_token"], cached=cached)
+        METRICS.observe("query_seconds", self.last_query_stats["total_time"], cached=cached)
+        logger.info("Query stats: %s", self.last_query_stats)
+
     def answer_query(self, query: str) -> str:
-        
-        if self.docs_dirs=="":
-            # if no pdf uploaded the following message is thrown
+
+        """Answer a query using the context documents retrieved from the database.
+
+        Args:
+            query (str): User query
+
+        Returns:
+            str: Answer
+        """
+
+        return "".join(self.stream_answer(query))
+
+    async def aanswer_query(self, query: str) -> str:
+
+        """Answer a query without blocking the event loop.
+
+        Retrieval and generation go through the chain's ainvoke, and the blocking docstore and
+        cache lookups run in worker threads, so many queries can be served concurrently.
+
+        Args:
+            query (str): User query
+
+        Returns:
+            str: Answer
+        """
+
+        start: float = time.perf_counter()
+
+        if not await asyncio.to_thread(self.retriver.has_data):
+            # if no pdf has been ingested the following message is thrown
 
             return "Please Insert a proper file"
-        
-        # passes the query to retriver
-        self.retriever_chain = (
-            "" if itemgetter('query')==None else itemgetter('query')
-                |
-            self.retriver.retriever
-        )
 
-        # consists of the retriever chain which passes the result to the prompt
-        #  where it is augmented and passed to the chat model for answer generation.
-        
-        generate_answer_chain = (
-            {'query': itemgetter('query'), 'retrieved_data': self.retriever_chain}
-                |
-            RunnableLambda(MultiModalRAG.create_query_context_prompt)
-                | 
-            chat_model
-                
-        )
+        corpus_version: int = await asyncio.to_thread(self.retriver.corpus_version)
+        cached_answer: str = await asyncio.to_thread(self.answer_cache.lookup, query, corpus_version)
+        if cached_answer is not None:
+            self._record_query_stats(start, time.perf_counter(), cached=True)
+            return cached_answer
 
-        
-        answer: str = generate_answer_chain.invoke({'query': query})
+        generate_answer_chain = self._get_generate_answer_chain(corpus_version)
+        answer: BaseMessage = await generate_answer_chain.ainvoke({'query': query})
+        METRICS.record_llm_call(get_chat_model().model_name, answer, None, kind="answer")
+        self._record_query_stats(start, None, cached=False)
 
         # Final Output is refined using StrOutputParser
 
-        return StrOutputParser().parse(answer.content)
\ No newline at end of file
+        final_answer: str = StrOutputParser().parse(answer.content)
+        await asyncio.to_thread(self.answer_cache.store, query, corpus_version, final_answer)
+        return final_answer
@@ -1,15 +1,46 @@
 import os
-import tempfile
+import uuid
+import hashlib
+import logging
 import streamlit as st
 from streamlit_chat import message
-from multi_modal_rag import MultiModalRAG
+from chat_models import startup_report
+from chat_models import startup_timer
+from metrics import METRICS
 
-from multimodal_rag import Summarizer
+# progress of ingestion and queries is logged to the console
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+
+# imports are timed so the startup report shows what delays the first render,
+# ingestion_jobs comes first since it pulls in the retriever, the ingestor and the summarizer
+
+with startup_timer("import ingestion_jobs"):
+    from ingestion_jobs import IngestionJobManager
+    from ingestion_jobs import JobStatus
+
+with startup_timer("import multi_modal_rag"):
+    from multi_modal_rag import MultiModalRAG
+
+with startup_timer("import summarizer"):
+    from summarizer import Summarizer
 
 #adds a title for the web page
 
 st.set_page_config(page_title="Multimodal RAG Bot")
 
+
+@st.cache_resource
+def get_job_manager() -> IngestionJobManager:
+
+    # one worker pool shared by every session of the server, ingestion runs outside the script thread
+
+    return IngestionJobManager(
+        max_workers=int(os.getenv("INGESTION_WORKERS", "2")),
+        max_parallel_documents=int(os.getenv("INGESTION_PARALLEL_DOCUMENTS", "4")),
+        workspace_ttl=float(os.getenv("WORKSPACE_TTL_HOURS", "24")) * 3600
+    )
+
 def display_messages():
 
     st.subheader('Chat')
@@ -20,25 +51,34 @@ def display_messages():
 
         message(msg,is_user=is_user,key=str(i))
 
+    # latency of the last answer
+
+    if st.session_state.get("query_stats"):
+        stats = st.session_state["query_stats"]
+        st.caption(f"Time to first token: {stats['time_to_first_token']:.2f}s, total: {stats['total_time']:.2f}s")
 
     st.session_state["thinking_spinner"] = st.empty()
 
 def process_image():
 
     # the textual description of the image is obtained.
+    # summaries are kept for the session by content hash, so an image attached to several
+    # messages is summarized once, and new images are summarized concurrently from memory
 
-    st.session_state["summarized_image"] = []
-
-    if st.session_state["image_uploader"]:
-            
-            for i,file in enumerate(st.session_state["image_uploader"]):
+    image_summaries = st.session_state.setdefault("image_summaries", {})
 
-                with open("temp_"+str(i)+".jpg", "wb") as f:
-                    f.write(file.read())
+    images = [file.getvalue() for file in st.session_state["image_uploader"] or []]
+    hashes = [hashlib.sha256(image).hexdigest() for image in images]
 
-                st.session_state["summarized_image"].append(Summarizer.summarize_image("temp_"+str(i)+".jpg"))
+    missing = {h: image for h, image in zip(hashes, images) if h not in image_summaries}
+    if missing:
+        share_across_sessions = os.getenv("SHARE_IMAGE_SUMMARIES", "1") == "1"
+        summaries = Summarizer.summarize_images_bytes(list(missing.values()), use_cache=share_across_sessions)
+        for h, summary in zip(missing, summaries):
+            if summary is not None:
+                image_summaries[h] = summary
 
-                os.remove("temp_"+str(i)+".jpg")
+    st.session_state["summarized_image"] = [image_summaries[h] for h in hashes if h in image_summaries]
 
 
 def process_input():
@@ -73,8 +113,18 @@ def process_input():
             user_text = st.session_state["user_input"].strip()
 
 
-        with st.session_state["thinking_spinner"], st.spinner(f"Thinking"):
-            agent_text = st.session_state["assistant"].answer_query(user_text)
+        # the answer is rendered piece by piece as it is generated
+
+        agent_text = ""
+        with st.session_state["thinking_spinner"].container():
+            answer_placeholder = st.empty()
+            with st.spinner(f"Thinking"):
+                for token in st.session_state["assistant"].stream_answer(user_text):
+                    agent_text += token
+                    answer_placeholder.markdown(agent_text)
+            answer_placeholder.empty()
+
+        st.session_state["query_stats"] = st.session_state["assistant"].last_query_stats
 
         st.session_state["messages"].append((user_text,True))
         st.session_state["messages"].append((agent_text,False))
@@ -82,35 +132,64 @@ def process_input():
 
 def read_and_save_file():
 
-    st.session_state["assistant"].clear() # database cleared when new pdf inserted
+    # the uploaded pdfs are handed to a background job, so the page stays responsive while
+    # they are ingested in parallel straight from memory. only new or changed pdfs are ingested, pdfs that were removed from
+    # the uploader are deleted from the session's database once the job is done
 
 
     st.session_state["messages"] = []
     st.session_state["user_input"] = ""
     st.session_state["p_id"]=""
 
-    for i,file in enumerate(st.session_state["file_uploader"]):
-
-
-        # open the pdf file and store the pdf file in a temporary location
-        with open("temp_"+str(i)+".pdf", "wb") as f:
-            f.write(file.read())
-
-        
-    
-
-        # insert the data in the pdf file into database
-        st.session_state["assistant"].ingest_data("temp_"+str(i)+".pdf")
-
-        #remove the pdf file once the data has been inserted
-        os.remove("temp_"+str(i)+".pdf")
+    job_manager = get_job_manager()
+
+    # a newer upload replaces the pending ones of this session
+    job_manager.cancel_session(st.session_state["session_id"])
+
+    documents = [(file.name, file.getvalue()) for file in st.session_state["file_uploader"]]
+    job_manager.submit(st.session_state["session_id"], st.session_state["assistant"].retriver, documents)
+
+
+@st.fragment(run_every=1.0)
+def display_jobs():
+
+    # progress of the session's ingestion jobs, refreshed every second without rerunning the page.
+    # the refresh also keeps the session's workspace alive while its page is open
+
+    job_manager = get_job_manager()
+    job_manager.touch(st.session_state["session_id"])
+    jobs = job_manager.jobs(st.session_state["session_id"])
+    for job in jobs[-3:]:
+        if job.status == JobStatus.RUNNING:
+            st.progress(
+                job.progress,
+                text=(
+                    f"Ingesting {', '.join(job.sources)}: {job.documents_done} of {len(job.sources)} documents, "
+                    f"{job.chunks_indexed} of {job.chunks_extracted} chunks indexed"
+                )
+            )
+            st.button("Cancel", key="cancel_" + job.job_id, on_click=job.cancel)
+        elif job.status == JobStatus.QUEUED:
+            st.caption(f"Queued: {', '.join(job.sources)}")
+        elif job.status == JobStatus.FAILED:
+            st.error(f"Ingestion failed: {job.error}")
+        elif job.status == JobStatus.CANCELLED:
+            st.caption(f"Ingestion cancelled: {', '.join(job.sources)}")
 
 def page():
 
     if len(st.session_state)==0:
 
+        # every session gets its own collection, docstore and image directory
+
         st.session_state["messages"] = []
-        st.session_state["assistant"] = MultiModalRAG()
+        st.session_state["session_id"] = uuid.uuid4().hex
+        workspace = get_job_manager().workspace(st.session_state["session_id"])
+        st.session_state["assistant"] = MultiModalRAG(retriever=workspace.create_retriever(
+            vector_backend=os.getenv("VECTOR_BACKEND", "chroma"),
+            vector_dtype=os.getenv("VECTOR_DTYPE", "int8"),
+            vector_index=os.getenv("VECTOR_INDEX", "exact")
+        ))
 
     st.header("MultiModal RAG Chatbot")
 
@@ -124,7 +203,7 @@ def page():
         accept_multiple_files=True,
     )
 
-    st.session_state["ingestion_spinner"] = st.empty()
+    display_jobs()
 
     display_messages()
 
@@ -137,6 +216,18 @@ def page():
 
     st.text_input("Message",key="user_input",on_change=process_input)
 
+    # import and model load times, models show up once they have been used
+
+    with st.sidebar.expander("Startup report"):
+        report = startup_report()
+        st.table({"step": list(report), "seconds": [round(t, 3) for t in report.values()]})
+
+    # stage timings, token counts and cache hits of this process, for debugging
+
+    with st.sidebar.expander("Metrics"):
+        st.json(METRICS.to_json(), expanded=False)
+        st.download_button("Download OpenMetrics", METRICS.to_openmetrics(), file_name="metrics.txt")
+
 
 if __name__ == "__main__":
     page()
@@ -0,0 +1,218 @@
+import io
+import os
+import re
+import shutil
+import tempfile
+import os.path as osp
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+from pypdf import PdfReader, PdfWriter
+
+# this module is kept free of model and streamlit imports, since every worker process imports it
+
+import pytesseract  #crucial for performing ocr task, worker processes need the path as well
+pytesseract.pytesseract.tesseract_cmd = os.getenv("TESSERACT_CMD", r'C:\\Program Files\\Tesseract-OCR\\tesseract.exe')
+
+
+_IMAGE_NAME_PATTERN = re.compile(r"^(?P<prefix>[a-z]+)-(?P<page>\d+)-(?P<index>\d+)\.(?P<ext>\w+)$")
+
+
+def count_pages(pdf_bytes: bytes) -> int:
+
+    """Count the pages of a pdf.
+
+    Args:
+        pdf_bytes (bytes): Content of the pdf
+
+    Returns:
+        int: Number of pages
+    """
+
+    return len(PdfReader(io.BytesIO(pdf_bytes)).pages)
+
+
+def split_pdf(pdf_bytes: bytes, page_ranges: List[Tuple[int, int]]) -> List[bytes]:
+
+    """Split a pdf into smaller pdfs.
+
+    Args:
+        pdf_bytes (bytes): Content of the pdf
+        page_ranges (List[Tuple[int, int]]): Zero based [start, end) page ranges
+
+    Returns:
+        List[bytes]: Content of one pdf per page range
+    """
+
+    reader = PdfReader(io.BytesIO(pdf_bytes))
+    shards: List[bytes] = []
+    for start, end in page_ranges:
+        writer = PdfWriter()
+        for page_index in range(start, end):
+            writer.add_page(reader.pages[page_index])
+        buffer = io.BytesIO()
+        writer.write(buffer)
+        shards.append(buffer.getvalue())
+    return shards
+
+
+def classify_pages(pdf_bytes: bytes, min_chars: int = 20, min_ruling_lines: int = 4) -> List[str]:
+
+    """Pick the cheapest partition strategy able to handle each page.
+
+    The text layer, embedded images and ruling lines of every page are inspected with pdfplumber,
+    which is far cheaper than running the layout model:
+    pages without a text layer need OCR, pages with images or table-like ruling need hi_res
+    layout detection and every other page is read from the text layer with the fast strategy.
+
+    Args:
+        pdf_bytes (bytes): Content of the pdf
+        min_chars (int, optional): Minimum characters for a page to count as having a text layer. Defaults to 20.
+        min_ruling_lines (int, optional): Minimum lines and rectangles for a page to count as table-like. Defaults to 4.
+
+    Returns:
+        List[str]: 'fast', 'hi_res' or 'ocr_only' for every page
+    """
+
+    import pdfplumber
+
+    strategies: List[str] = []
+    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+        for page in pdf.pages:
+            has_images = len(page.images) > 0
+            has_ruling = len(page.lines) + len(page.rects) >= min_ruling_lines and len(page.find_tables()) > 0
+            has_text = len(page.chars) >= min_chars
+            if has_images or has_ruling:
+                strategies.append('hi_res')
+            elif not has_text:
+                strategies.append('ocr_only')
+            else:
+                strategies.append('fast')
+            page.close()
+    return strategies
+
+
+def partition_pdf_shard(shard_bytes: bytes, image_output_dir_path: str, strategy: str = 'hi_res') -> list:
+
+    """Partition one pdf shard into elements, without chunking. Runs in a worker process.
+
+    Args:
+        shard_bytes (bytes): Content of the shard
+        image_output_dir_path (str): Directory for the images extracted from the shard
+        strategy (str, optional): Partition strategy of unstructured. Defaults to 'hi_res'.
+
+    Returns:
+        list: Unstructured elements of the shard
+    """
+
+    from unstructured.partition.pdf import partition_pdf
+
+    return partition_pdf(
+        file=io.BytesIO(shard_bytes),
+        extract_images_in_pdf=True,
+        infer_table_structure=True,
+        strategy=strategy,
+        mode='elements',
+        image_output_dir_path=image_output_dir_path
+    )
+
+
+def _merge_shard_images(shard_dir: str, image_output_dir_path: str, page_offset: int) -> dict:
+
+    # images are named after the page they were found on, which is relative to the shard,
+    # so they are renamed to the page number in the full document
+    renamed = {}
+    for file in sorted(os.listdir(shard_dir)):
+        match = _IMAGE_NAME_PATTERN.match(file)
+        if match:
+            target_name = "{}-{}-{}.{}".format(
+                match["prefix"], int(match["page"]) + page_offset, match["index"], match["ext"]
+            )
+        else:
+            target_name = f"page{page_offset + 1}-{file}"
+        target_path = osp.join(image_output_dir_path, target_name)
+        shutil.move(osp.join(shard_dir, file), target_path)
+        renamed[osp.join(shard_dir, file)] = target_path
+    return renamed
+
+
+def _page_ranges(page_strategies: List[str], pages_per_shard: int) -> List[Tuple[int, int, str]]:
+
+    # consecutive pages with the same strategy are grouped, up to pages_per_shard pages per range
+    ranges: List[Tuple[int, int, str]] = []
+    start = 0
+    for end in range(1, len(page_strategies) + 1):
+        if (end == len(page_strategies)
+                or page_strategies[end] != page_strategies[start]
+                or end - start == pages_per_shard):
+            ranges.append((start, end, page_strategies[start]))
+            start = end
+    return ranges
+
+
+def iter_partition_pdf_pages(
+        pdf_bytes: bytes,
+        image_output_dir_path: str,
+        page_strategies: List[str],
+        pages_per_shard: int,
+        max_workers: int,
+        max_characters: int = 4000,
+        pool: Optional[Executor] = None
+    ) -> Iterator:
+
+    """Partition a pdf in page shards, each with its own strategy, and yield the chunks as shards complete.
+
+    Shards are partitioned across worker processes when max_workers is above one, or in the given
+    pool, which lets several documents share one set of worker processes. The elements of
+    every shard are merged in page order with their page numbers and image paths rewritten to the
+    full document. Chunking by title runs on the merged stream and the last chunk is held back until
+    the next shard arrives, so chunks may span shard boundaries exactly as they would when the whole
+    file is partitioned at once.
+
+    Args:
+        pdf_bytes (bytes): Content of the pdf
+        image_output_dir_path (str): Directory for storing extracted images
+        page_strategies (List[str]): Partition strategy for every page
+        pages_per_shard (int): Maximum number of pages partitioned by one worker task
+        max_workers (int): Number of worker processes
+        max_characters (int, optional): Maximum characters of a chunk. Defaults to 4000.
+        pool (Optional[Executor], optional): Shared pool partitioning the shards, left running when done. Defaults to a pool of max_workers processes for this document.
+
+    Yields:
+        Element: Next chunk of the document
+    """
+
+    from unstructured.chunking.title import chunk_by_title
+
+    page_ranges = _page_ranges(page_strategies, pages_per_shard)
+    shards = split_pdf(pdf_bytes, [(start, end) for start, end, _ in page_ranges])
+    strategies = [strategy for _, _, strategy in page_ranges]
+
+    pending = []  #elements of the last chunk, which may still grow with the next shard
+    with tempfile.TemporaryDirectory(dir=image_output_dir_path) as work_dir:
+        shard_dirs = [osp.join(work_dir, f"shard_{i}") for i in range(len(shards))]
+        own_pool = pool is None and max_workers > 1 and len(shards) > 1
+        if own_pool:
+            pool = ProcessPoolExecutor(max_workers=min(max_workers, len(shards)))
+        try:
+            # Executor.map yields results in submission order, so shards are merged in page order
+            shard_results = (pool.map if pool else map)(partition_pdf_shard, shards, shard_dirs, strategies)
+
+            for (start, _, _), shard_dir, shard in zip(page_ranges, shard_dirs, shard_results):
+                renamed = _merge_shard_images(shard_dir, image_output_dir_path, start) if osp.isdir(shard_dir) else {}
+                for element in shard:
+                    if element.metadata.page_number is not None:
+                        element.metadata.page_number += start
+                    if element.metadata.image_path in renamed:
+                        element.metadata.image_path = renamed[element.metadata.image_path]
+
+                chunks = chunk_by_title(pending + shard, max_characters=max_characters)
+                if not chunks:
+                    continue
+                yield from chunks[:-1]
+                pending = chunks[-1].metadata.orig_elements or [chunks[-1]]
+        finally:
+            if own_pool:
+                pool.shutdown(cancel_futures=True)
+
+    yield from chunk_by_title(pending, max_characters=max_characters)
+
@@ -0,0 +1,121 @@
+import queue
+import threading
+from itertools import islice
+from typing import Iterable, Iterator, List, TypeVar
+
+T = TypeVar("T")
+
+_DONE = object()
+
+
+class _Failure:
+
+    # wraps an exception raised by the producer so it can travel through the buffer
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def batched(iterable: Iterable[T], batch_size: int) -> Iterator[List[T]]:
+
+    """Group the items of an iterable into lists of at most batch_size items.
+
+    Args:
+        iterable (Iterable[T]): Items to group
+        batch_size (int): Maximum number of items per batch
+
+    Yields:
+        List[T]: Next batch
+    """
+
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def prefetch(iterable: Iterable[T], max_buffered: int) -> Iterator[T]:
+
+    """Run an iterable in a background thread and hand its items over through a bounded buffer.
+
+    The producer blocks once max_buffered items are waiting, so a fast stage never runs
+    ahead of a slow one by more than the buffer size. Exceptions raised by the producer are
+    re-raised in the consumer, and the producer stops when the consumer stops iterating.
+
+    Args:
+        iterable (Iterable[T]): Items to produce
+        max_buffered (int): Maximum number of produced items waiting to be consumed
+
+    Yields:
+        T: Next item
+    """
+
+    yield from merge([iterable], 1, max_buffered)
+
+
+def merge(iterables: Iterable[Iterable[T]], max_workers: int, max_buffered: int) -> Iterator[T]:
+
+    """Run several iterables in background threads and yield their items as they are produced.
+
+    Up to max_workers iterables are consumed at the same time, each worker taking the next
+    iterable once its current one is exhausted. Items of different iterables are interleaved in
+    the order they are produced, items of one iterable keep their order. Buffering, error
+    propagation and stopping work as in prefetch.
+
+    Args:
+        iterables (Iterable[Iterable[T]]): Iterables to produce, started in order
+        max_workers (int): Maximum number of iterables produced at the same time
+        max_buffered (int): Maximum number of produced items waiting to be consumed
+
+    Yields:
+        T: Next item of any iterable
+    """
+
+    buffer: queue.Queue = queue.Queue(maxsize=max_buffered)
+    stopped = threading.Event()
+    sources: Iterator[Iterable[T]] = iter(iterables)
+    sources_lock = threading.Lock()
+
+    def put(item) -> bool:
+        # the timeout lets the producer notice that the consumer has gone away
+        while not stopped.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            while True:
+                with sources_lock:
+                    iterable = next(sources, _DONE)
+                if iterable is _DONE:
+                    break
+                for item in iterable:
+                    if not put(item):
+                        return
+            put(_DONE)
+        except BaseException as e:
+            put(_Failure(e))
+
+    producers = [threading.Thread(target=produce, daemon=True) for _ in range(max(1, max_workers))]
+    for producer in producers:
+        producer.start()
+    running = len(producers)
+    try:
+        while running:
+            item = buffer.get()
+            if item is _DONE:
+                running -= 1
+                continue
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        # producers exit at their next hand over instead of being joined, so a consumer
+        # that fails does not wait for a long running stage to finish
+        stopped.set()
@@ -0,0 +1,605 @@
+import os
+import json
+import uuid
+import shutil
+import sqlite3
+import threading
+import os.path as osp
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from langchain_core.documents.base import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+VECTOR_DTYPES = ("float16", "int8")
+INDEX_TYPES = ("exact", "ivf")
+
+
+def quantize(vectors: np.ndarray, dtype: str) -> Tuple[np.ndarray, np.ndarray]:
+
+    """Normalize vectors and quantize them for storage.
+
+    int8 vectors are quantized symmetrically per vector, the largest component maps to 127.
+
+    Args:
+        vectors (np.ndarray): (n, dim) vectors
+        dtype (str): 'float16' or 'int8'
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Stored values and the float32 scale of every vector, 1.0 for float16
+    """
+
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.where(norms > 0, norms, 1.0)
+    if dtype == "float16":
+        return vectors.astype(np.float16), np.ones(len(vectors), dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales = np.where(scales > 0, scales, 1.0).astype(np.float32)
+    return np.round(vectors / scales[:, None]).astype(np.int8), scales
+
+
+def top_k(scores: np.ndarray, rows: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+
+    """Select the k highest scores of every query.
+
+    Args:
+        scores (np.ndarray): (m, n) scores
+        rows (np.ndarray): (n,) or (m, n) rows of the scores
+        k (int): Number of results per query
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (m, min(k, n)) rows and scores, best first
+    """
+
+    rows = np.broadcast_to(rows, scores.shape)
+    if scores.shape[1] > k:
+        # argpartition finds the k best in linear time, only those are sorted
+        best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        scores = np.take_along_axis(scores, best, axis=1)
+        rows = np.take_along_axis(rows, best, axis=1)
+    order = np.argsort(-scores, axis=1, kind="stable")
+    return np.take_along_axis(rows, order, axis=1), np.take_along_axis(scores, order, axis=1)
+
+
+def spherical_kmeans(vectors: np.ndarray, n_clusters: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+
+    """Cluster normalized vectors by cosine similarity.
+
+    Args:
+        vectors (np.ndarray): (n, dim) normalized float32 vectors, n at least n_clusters
+        n_clusters (int): Number of clusters
+        iterations (int, optional): Lloyd iterations. Defaults to 10.
+        seed (int, optional): Seed of the initial centroids. Defaults to 0.
+
+    Returns:
+        np.ndarray: (n_clusters, dim) normalized centroids
+    """
+
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.concatenate([
+            np.argmax(vectors[start:start + 4096] @ centroids.T, axis=1)
+            for start in range(0, len(vectors), 4096)
+        ])
+        # sums per cluster through one sort and reduceat, empty clusters keep their centroid
+        order = np.argsort(assignments, kind="stable")
+        labels, starts = np.unique(assignments[order], return_index=True)
+        sums = np.add.reduceat(vectors[order], starts, axis=0)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids[labels] = sums / np.where(norms > 0, norms, 1.0)
+    return centroids
+
+
+class QuantizedVectorStore(VectorStore):
+
+    """
+    In-process vector store keeping quantized embeddings in a memory-mapped NumPy array.
+
+    Vectors are normalized and stored as float16, or as int8 with a float32 scale per vector,
+    which takes a half or a quarter of the memory of float32 vectors. The row of every vector,
+    its doc_id, text and metadata are kept in a SQLite side table next to the array; rows of
+    deleted vectors are reused. Scores are cosine similarities computed with one matrix product
+    per block of rows. The 'exact' index scores every vector, the 'ivf' index clusters the
+    vectors with k-means once there are ivf_min_size of them and scores only the vectors of the
+    n_probe clusters closest to the query, until then it searches exactly.
+    """
+
+    def __init__(
+            self,
+            embedding_function: Embeddings,
+            persist_directory: str,
+            dtype: str = "int8",
+            index: str = "exact",
+            n_lists: Optional[int] = None,
+            n_probe: int = 16,
+            ivf_min_size: int = 10000,
+            block_size: int = 16384
+        ):
+
+        """Initialize QuantizedVectorStore class.
+
+        Args:
+            embedding_function (Embeddings): Embedding model of the texts and queries
+            persist_directory (str): Directory of the vector array and the side table, created if missing
+            dtype (str, optional): 'float16' or 'int8', must match an existing store. Defaults to "int8".
+            index (str, optional): 'exact' or 'ivf'. Defaults to "exact".
+            n_lists (Optional[int], optional): Number of IVF clusters. Defaults to the square root of the number of vectors at training time.
+            n_probe (int, optional): IVF clusters scored per query. Defaults to 16.
+            ivf_min_size (int, optional): Number of vectors from which the IVF index is trained. Defaults to 10000.
+            block_size (int, optional): Rows scored per matrix product. Defaults to 16384.
+
+        Raises:
+            ValueError: Unsupported dtype or index, or a dtype different from the existing store's
+        """
+
+        if dtype not in VECTOR_DTYPES:
+            raise ValueError(f"Unsupported vector dtype {dtype}, expected one of {VECTOR_DTYPES}")
+        if index not in INDEX_TYPES:
+            raise ValueError(f"Unsupported index {index}, expected one of {INDEX_TYPES}")
+
+        self.embedding_function: Embeddings = embedding_function
+        self.persist_directory: str = persist_directory
+        self.dtype: str = dtype
+        self.index: str = index
+        self.n_lists: Optional[int] = n_lists
+        self.n_probe: int = n_probe
+        self.ivf_min_size: int = ivf_min_size
+        self.block_size: int = block_size
+        self._lock = threading.RLock()
+        self._open()
+
+    def _path(self, name: str) -> str:
+
+        return osp.join(self.persist_directory, name)
+
+    def _open(self) -> None:
+
+        os.makedirs(self.persist_directory, exist_ok=True)
+        self._conn = sqlite3.connect(self._path("rows.db"), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS vector_rows ("
+            "row INTEGER PRIMARY KEY, doc_id TEXT NOT NULL UNIQUE, text TEXT NOT NULL, metadata TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS vector_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.commit()
+        meta: Dict[str, str] = dict(self._conn.execute("SELECT key, value FROM vector_meta"))
+
+        if meta.get("dtype", self.dtype) != self.dtype:
+            raise ValueError(f"Vector store at {self.persist_directory} holds {meta['dtype']} vectors, not {self.dtype}")
+
+        self._dim: Optional[int] = int(meta["dim"]) if "dim" in meta else None
+        self._capacity: int = int(meta.get("capacity", 0))
+        self._size: int = int(meta.get("size", 0))  #rows in use or freed, the high water mark
+        self._trained_size: int = int(meta.get("trained_size", 0))
+        self._vectors: Optional[np.memmap] = None
+        self._scales: Optional[np.memmap] = None
+        self._lists: Optional[np.memmap] = None
+        self._alive: np.ndarray = np.zeros(self._capacity, dtype=bool)
+        self._centroids: Optional[np.ndarray] = None
+        self._inverted: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+        if self._dim is not None and self._capacity:
+            self._map_files()
+            rows = np.fromiter((row for row, in self._conn.execute("SELECT row FROM vector_rows")), dtype=np.int64)
+            self._alive[rows] = True
+            # the clusters of an earlier ivf store are only searched when it is opened as ivf again
+            if self.index == "ivf" and osp.exists(self._path("centroids.npy")):
+                self._centroids = np.load(self._path("centroids.npy"))
+        self._free: List[int] = np.flatnonzero(~self._alive[:self._size]).tolist()
+
+    def _map_files(self) -> None:
+
+        # the files are grown in place, so existing rows are never copied
+        for name, dtype, shape in (
+                ("vectors.bin", self.dtype, (self._capacity, self._dim)),
+                ("scales.bin", np.float32, (self._capacity,)),
+                ("lists.bin", np.int32, (self._capacity,))
+            ):
+            path = self._path(name)
+            with open(path, "ab") as f:
+                f.truncate(int(np.prod(shape)) * np.dtype(dtype).itemsize)
+        self._vectors = np.memmap(self._path("vectors.bin"), dtype=self.dtype, mode="r+", shape=(self._capacity, self._dim))
+        self._scales = np.memmap(self._path("scales.bin"), dtype=np.float32, mode="r+", shape=(self._capacity,))
+        self._lists = np.memmap(self._path("lists.bin"), dtype=np.int32, mode="r+", shape=(self._capacity,))
+
+    def _set_meta(self, **values: Any) -> None:
+
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO vector_meta (key, value) VALUES (?, ?)",
+            [(key, str(value)) for key, value in values.items()]
+        )
+
+    def _reserve(self, count: int) -> None:
+
+        needed = self._size + max(0, count - len(self._free))
+        if needed <= self._capacity:
+            return
+        self._flush()
+        self._vectors = self._scales = self._lists = None
+        self._capacity = max(needed, 2 * self._capacity, 1024)
+        self._alive = np.concatenate([self._alive, np.zeros(self._capacity - len(self._alive), dtype=bool)])
+        self._map_files()
+        self._set_meta(capacity=self._capacity)
+
+    def _allocate(self) -> int:
+
+        if self._free:
+            return self._free.pop()
+        self._size += 1
+        return self._size - 1
+
+    def _flush(self) -> None:
+
+        for array in (self._vectors, self._scales, self._lists):
+            if array is not None:
+                array.flush()
+
+    @property
+    def embeddings(self) -> Embeddings:
+
+        return self.embedding_function
+
+    def count(self) -> int:
+
+        """
+        Number of stored vectors.
+        """
+
+        return int(self._alive[:self._size].sum())
+
+    def add_texts(
+            self,
+            texts: Iterable[str],
+            metadatas: Optional[List[dict]] = None,
+            ids: Optional[List[str]] = None,
+            **kwargs: Any
+        ) -> List[str]:
+
+        """Embed and add texts, replacing the vectors of ids that are already stored.
+
+        Args:
+            texts (Iterable[str]): Texts to embed
+            metadatas (Optional[List[dict]], optional): Metadata of every text. Defaults to None.
+            ids (Optional[List[str]], optional): doc_id of every text. Defaults to random ids.
+
+        Returns:
+            List[str]: doc_id of every text
+        """
+
+        texts = list(texts)
+        if not texts:
+            return []
+        return self.add_embeddings(texts, self.embedding_function.embed_documents(texts), metadatas, ids)
+
+    def add_embeddings(
+            self,
+            texts: List[str],
+            embeddings: List[List[float]],
+            metadatas: Optional[List[dict]] = None,
+            ids: Optional[List[str]] = None
+        ) -> List[str]:
+
+        """Add texts with their precomputed embeddings, replacing the vectors of ids that are already stored.
+
+        Args:
+            texts (List[str]): Texts of the vectors
+            embeddings (List[List[float]]): Vector of every text
+            metadatas (Optional[List[dict]], optional): Metadata of every text. Defaults to None.
+            ids (Optional[List[str]], optional): doc_id of every text. Defaults to random ids.
+
+        Raises:
+            ValueError: The vectors do not have the dimension of the stored ones
+
+        Returns:
+            List[str]: doc_id of every text
+        """
+
+        ids = list(ids) if ids else [uuid.uuid4().hex for _ in texts]
+        metadatas = list(metadatas) if metadatas else [{} for _ in texts]
+        values, scales = quantize(np.asarray(embeddings, dtype=np.float32), self.dtype)
+
+        with self._lock:
+            if self._dim is None:
+                self._dim = values.shape[1]
+                self._set_meta(dim=self._dim, dtype=self.dtype)
+            elif values.shape[1] != self._dim:
+                raise ValueError(f"Expected vectors of dimension {self._dim}, got {values.shape[1]}")
+
+            # stored ids keep their row, an id repeated in the input takes its last vector
+            assigned: Dict[str, int] = self._rows_of(ids)
+            self._reserve(len(set(ids) - set(assigned)))
+            for doc_id in ids:
+                if doc_id not in assigned:
+                    assigned[doc_id] = self._allocate()
+            rows = np.array([assigned[doc_id] for doc_id in ids], dtype=np.int64)
+
+            self._vectors[rows] = values
+            self._scales[rows] = scales
+            if self._centroids is not None:
+                self._lists[rows] = self._assign(values.astype(np.float32) * scales[:, None])
+            self._alive[rows] = True
+            self._inverted = None
+            self._flush()
+
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO vector_rows (row, doc_id, text, metadata) VALUES (?, ?, ?, ?)",
+                [(int(row), doc_id, text, json.dumps(metadata)) for row, doc_id, text, metadata in zip(rows, ids, texts, metadatas)]
+            )
+            self._set_meta(size=self._size)
+            self._conn.commit()
+
+            if self.index == "ivf" and self.count() >= max(self.ivf_min_size, 4 * self._trained_size):
+                self._train()
+            elif self.index != "ivf" and self._trained_size:
+                # vectors added without their cluster would be missed by ivf searches,
+                # so the clusters are dropped and trained again once the store is opened as ivf
+                os.remove(self._path("centroids.npy"))
+                self._trained_size = 0
+                self._set_meta(trained_size=0)
+                self._conn.commit()
+        return ids
+
+    def _rows_of(self, ids: List[str]) -> Dict[str, int]:
+
+        rows: Dict[str, int] = {}
+        # sqlite limits the number of bound parameters per statement
+        for start in range(0, len(ids), 500):
+            batch = ids[start:start + 500]
+            placeholders = ",".join("?" for _ in batch)
+            rows.update(self._conn.execute(f"SELECT doc_id, row FROM vector_rows WHERE doc_id IN ({placeholders})", batch))
+        return rows
+
+    def _dequantize(self, rows) -> np.ndarray:
+
+        vectors = self._vectors[rows].astype(np.float32)
+        if self.dtype == "int8":
+            vectors *= self._scales[rows][:, None]
+        return vectors
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+
+        return np.argmax(vectors @ self._centroids.T, axis=1).astype(np.int32)
+
+    def _train(self) -> None:
+
+        # k-means on a sample of the vectors, then every vector is assigned to its closest centroid
+        alive_rows = np.flatnonzero(self._alive[:self._size])
+        n_lists = self.n_lists or max(1, int(np.sqrt(len(alive_rows))))
+        sample_size = min(len(alive_rows), max(256 * n_lists, 50000), 200000)
+        sample = np.sort(np.random.default_rng(0).choice(alive_rows, sample_size, replace=False))
+        self._centroids = spherical_kmeans(self._dequantize(sample), min(n_lists, sample_size))
+        for start in range(0, len(alive_rows), self.block_size):
+            rows = alive_rows[start:start + self.block_size]
+            self._lists[rows] = self._assign(self._dequantize(rows))
+        self._lists.flush()
+        np.save(self._path("centroids.npy"), self._centroids)
+        self._trained_size = len(alive_rows)
+        self._set_meta(trained_size=self._trained_size)
+        self._conn.commit()
+        self._inverted = None
+
+    def _inverted_lists(self) -> Tuple[np.ndarray, np.ndarray]:
+
+        # rows sorted by cluster and the offset of every cluster, rebuilt after changes
+        if self._inverted is None:
+            alive_rows = np.flatnonzero(self._alive[:self._size])
+            order = alive_rows[np.argsort(self._lists[alive_rows], kind="stable")]
+            offsets = np.searchsorted(self._lists[order], np.arange(len(self._centroids) + 1))
+            self._inverted = (order, offsets)
+        return self._inverted
+
+    def _scores(self, rows, queries: np.ndarray) -> np.ndarray:
+
+        # the matrix product runs on the quantized values, int8 scores are rescaled per vector
+        scores = queries @ self._vectors[rows].astype(np.float32).T
+        if self.dtype == "int8":
+            scores *= self._scales[rows]
+        return scores
+
+    def search_vectors(self, queries: np.ndarray, k: int = 4) -> Tuple[np.ndarray, np.ndarray]:
+
+        """Find the stored vectors most similar to a batch of query vectors.
+
+        Args:
+            queries (np.ndarray): (m, dim) query vectors
+            k (int, optional): Number of results per query. Defaults to 4.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: (m, k) rows and cosine similarities, best first, row -1 where fewer vectors are stored
+        """
+
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms > 0, norms, 1.0)
+        best_rows = np.full((len(queries), k), -1, dtype=np.int64)
+        best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+
+        with self._lock:
+            if self._dim is None or not self._size:
+                return best_rows, best_scores
+
+            if self._centroids is None:
+                for start in range(0, self._size, self.block_size):
+                    end = min(start + self.block_size, self._size)
+                    scores = self._scores(slice(start, end), queries)
+                    scores[:, ~self._alive[start:end]] = -np.inf
+                    best_rows, best_scores = top_k(
+                        np.concatenate([best_scores, scores], axis=1),
+                        np.concatenate([best_rows, np.broadcast_to(np.arange(start, end), scores.shape)], axis=1),
+                        k
+                    )
+            else:
+                order, offsets = self._inverted_lists()
+                probes = np.argsort(-(queries @ self._centroids.T), axis=1)[:, :self.n_probe]
+                for i, query_probes in enumerate(probes):
+                    # rows are read in file order, which keeps the memory-mapped reads sequential
+                    candidates = np.sort(np.concatenate([order[offsets[p]:offsets[p + 1]] for p in query_probes]))
+                    if not len(candidates):
+                        continue
+                    rows, scores = top_k(self._scores(candidates, queries[i:i + 1]), candidates, k)
+                    best_rows[i, :rows.shape[1]], best_scores[i, :rows.shape[1]] = rows[0], scores[0]
+
+        best_rows[~np.isfinite(best_scores)] = -1
+        return best_rows, best_scores
+
+    def _documents(self, rows: Iterable[int]) -> Dict[int, Document]:
+
+        rows = [int(row) for row in rows if row >= 0]
+        placeholders = ",".join("?" for _ in rows)
+        with self._lock:
+            records = self._conn.execute(
+                f"SELECT row, doc_id, text, metadata FROM vector_rows WHERE row IN ({placeholders})", rows
+            ).fetchall()
+        return {
+            row: Document(page_content=text, metadata=json.loads(metadata), id=doc_id)
+            for row, doc_id, text, metadata in records
+        }
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4) -> List[Tuple[Document, float]]:
+
+        """Find the documents most similar to a vector.
+
+        Args:
+            embedding (List[float]): Query vector
+            k (int, optional): Number of documents. Defaults to 4.
+
+        Returns:
+            List[Tuple[Document, float]]: Documents with their cosine similarity, best first
+        """
+
+        rows, scores = self.search_vectors(np.asarray([embedding], dtype=np.float32), k)
+        documents = self._documents(rows[0])
+        return [(documents[int(row)], float(score)) for row, score in zip(rows[0], scores[0]) if int(row) in documents]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+
+        """Find the documents most similar to a query.
+
+        Args:
+            query (str): Query text
+            k (int, optional): Number of documents. Defaults to 4.
+
+        Raises:
+            ValueError: A metadata filter was passed, which this store does not support
+
+        Returns:
+            List[Tuple[Document, float]]: Documents with their cosine similarity, best first
+        """
+
+        if kwargs.get("filter"):
+            raise ValueError("QuantizedVectorStore does not support metadata filters")
+        return self.similarity_search_by_vector_with_score(self.embedding_function.embed_query(query), k)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+
+        return [document for document, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+
+        return [document for document, _ in self.similarity_search_by_vector_with_score(embedding, k)]
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+
+        # cosine similarity in [-1, 1] is mapped to a relevance in [0, 1]
+        return lambda similarity: (1.0 + similarity) / 2.0
+
+    def get_by_ids(self, ids: List[str]) -> List[Document]:
+
+        """Get stored documents by doc_id.
+
+        Args:
+            ids (List[str]): doc_ids to look up
+
+        Returns:
+            List[Document]: Documents found, ids that are not stored are left out
+        """
+
+        with self._lock:
+            rows = self._rows_of(list(ids))
+            documents = self._documents(rows.values())
+        return [documents[rows[doc_id]] for doc_id in ids if doc_id in rows and rows[doc_id] in documents]
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+
+        """Delete vectors by doc_id, their rows are reused by later additions.
+
+        Args:
+            ids (Optional[List[str]], optional): doc_ids to delete. Defaults to None, deleting nothing.
+
+        Returns:
+            Optional[bool]: True
+        """
+
+        if not ids:
+            return True
+        with self._lock:
+            rows = self._rows_of(list(ids))
+            if rows:
+                self._alive[list(rows.values())] = False
+                self._free.extend(rows.values())
+                self._inverted = None
+                self._conn.executemany("DELETE FROM vector_rows WHERE doc_id = ?", [(doc_id,) for doc_id in rows])
+                self._conn.commit()
+        return True
+
+    def delete_collection(self) -> None:
+
+        """
+        Delete every vector and the files of the store, the store stays usable and empty.
+        """
+
+        with self._lock:
+            self._vectors = self._scales = self._lists = None
+            self._conn.close()
+            shutil.rmtree(self.persist_directory, ignore_errors=True)
+            self._open()
+
+    def stats(self) -> Dict[str, Any]:
+
+        """Size of the store.
+
+        Returns:
+            Dict[str, Any]: vectors, dim, dtype, index, lists (0 while searching exactly) and vector_bytes, the bytes of the stored vectors and scales
+        """
+
+        with self._lock:
+            itemsize = np.dtype(self.dtype).itemsize
+            return {
+                "vectors": self.count(),
+                "dim": self._dim,
+                "dtype": self.dtype,
+                "index": self.index,
+                "lists": 0 if self._centroids is None else len(self._centroids),
+                "vector_bytes": self._size * ((self._dim or 0) * itemsize + 4)
+            }
+
+    @classmethod
+    def from_texts(
+            cls,
+            texts: List[str],
+            embedding: Embeddings,
+            metadatas: Optional[List[dict]] = None,
+            ids: Optional[List[str]] = None,
+            persist_directory: str = "./quantized_vector_store",
+            **kwargs: Any
+        ) -> "QuantizedVectorStore":
+
+        """Create a store and add texts to it.
+
+        Args:
+            texts (List[str]): Texts to embed
+            embedding (Embeddings): Embedding model of the texts and queries
+            metadatas (Optional[List[dict]], optional): Metadata of every text. Defaults to None.
+            ids (Optional[List[str]], optional): doc_id of every text. Defaults to random ids.
+            persist_directory (str, optional): Directory of the store. Defaults to "./quantized_vector_store".
+            **kwargs: Further QuantizedVectorStore arguments
+
+        Returns:
+            QuantizedVectorStore: Store holding the texts
+        """
+
+        store = cls(embedding, persist_directory, **kwargs)
+        store.add_texts(texts, metadatas, ids)
+        return store
@@ -0,0 +1,325 @@
+import os
+import re
+import time
+import random
+import logging
+import threading
+from typing import Callable, Dict, Optional, TypeVar
+from metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_DURATION_PATTERN = re.compile(r"(?:(?P<h>\d+(?:\.\d+)?)h)?(?:(?P<m>\d+(?:\.\d+)?)m(?!s))?(?:(?P<s>\d+(?:\.\d+)?)s)?(?:(?P<ms>\d+(?:\.\d+)?)ms)?$")
+
+
+def parse_duration(value: str) -> Optional[float]:
+
+    """Parse a rate limit header value such as "2", "7.66s", "2m59.56s" or "120ms".
+
+    Args:
+        value (str): Header value
+
+    Returns:
+        Optional[float]: Seconds, None if the value is not a duration
+    """
+
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    match = _DURATION_PATTERN.match(value)
+    if not value or match is None:
+        return None
+    parts = {name: float(number) for name, number in match.groupdict().items() if number}
+    return parts.get("h", 0) * 3600 + parts.get("m", 0) * 60 + parts.get("s", 0) + parts.get("ms", 0) / 1000
+
+
+class TokenBucket:
+
+    """
+    Token bucket refilled at a fixed rate per minute.
+
+    Callers reserve tokens up front and wait for the returned time, so concurrent callers are
+    served in order instead of polling. The balance may go negative, which pushes later callers back.
+    """
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+
+        """Initialize TokenBucket class.
+
+        Args:
+            per_minute (float): Tokens added per minute
+            capacity (Optional[float], optional): Maximum balance, the largest burst. Defaults to per_minute.
+        """
+
+        self.rate: float = per_minute / 60
+        self.capacity: float = capacity or per_minute
+        self._tokens: float = self.capacity
+        self._updated: float = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+
+        """Take tokens from the bucket.
+
+        Args:
+            amount (float): Tokens needed, capped at the capacity so a large request cannot wait forever
+
+        Returns:
+            float: Seconds to wait before the tokens may be used
+        """
+
+        with self._lock:
+            self._refill()
+            self._tokens -= min(amount, self.capacity)
+            return max(0.0, -self._tokens / self.rate)
+
+    def adjust(self, amount: float) -> None:
+
+        """Correct an earlier reservation once the real usage is known.
+
+        Args:
+            amount (float): Tokens used beyond the reservation, negative to give tokens back
+        """
+
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens - amount)
+
+
+class RateLimiter:
+
+    """
+    Client side limiter for a rate limited model API.
+
+    Requests wait for a request and a token budget per minute and for a free concurrency slot.
+    Rate limit errors halve the concurrency limit, which then grows back by one slot per limit
+    successes (additive increase, multiplicative decrease), and pause every caller for the
+    retry-after time the API asks for. Retryable errors are retried with jittered exponential backoff.
+    """
+
+    def __init__(
+            self,
+            requests_per_minute: float = 30,
+            tokens_per_minute: float = 6000,
+            max_concurrency: int = 8,
+            min_concurrency: int = 1,
+            max_retries: int = 5,
+            base_delay: float = 1.0,
+            max_delay: float = 60.0,
+            name: str = "default"
+        ):
+
+        """Initialize RateLimiter class.
+
+        Args:
+            requests_per_minute (float, optional): Request budget per minute, 0 for unlimited. Defaults to 30.
+            tokens_per_minute (float, optional): Token budget per minute, 0 for unlimited. Defaults to 6000.
+            max_concurrency (int, optional): Upper bound and starting value of the concurrency limit. Defaults to 8.
+            min_concurrency (int, optional): Lower bound of the concurrency limit. Defaults to 1.
+            max_retries (int, optional): Retries of a request before its error is raised. Defaults to 5.
+            base_delay (float, optional): Backoff of the first retry in seconds, doubled per retry. Defaults to 1.0.
+            max_delay (float, optional): Maximum backoff in seconds. Defaults to 60.0.
+            name (str, optional): Name used in metrics and logs, usually the model name. Defaults to "default".
+        """
+
+        self.requests: Optional[TokenBucket] = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens: Optional[TokenBucket] = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_concurrency: int = max_concurrency
+        self.min_concurrency: int = min_concurrency
+        self.max_retries: int = max_retries
+        self.base_delay: float = base_delay
+        self.max_delay: float = max_delay
+        self.name: str = name
+        self._limit: float = float(max_concurrency)
+        self._in_flight: int = 0
+        self._paused_until: float = 0.0
+        self._condition = threading.Condition()
+
+    @property
+    def concurrency_limit(self) -> int:
+
+        """
+        Current number of requests allowed in flight.
+        """
+
+        return int(self._limit)
+
+    def _acquire_slot(self) -> None:
+
+        with self._condition:
+            while self._in_flight >= int(self._limit):
+                self._condition.wait()
+            self._in_flight += 1
+
+    def _release_slot(self) -> None:
+
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def _wait_for_budget(self, estimated_tokens: int) -> None:
+
+        wait = self._paused_until - time.monotonic()
+        if self.requests is not None:
+            wait = max(wait, self.requests.reserve(1))
+        if self.tokens is not None and estimated_tokens:
+            wait = max(wait, self.tokens.reserve(estimated_tokens))
+        if wait > 0:
+            METRICS.observe("rate_limit_wait_seconds", wait, model=self.name)
+            time.sleep(wait)
+
+    @staticmethod
+    def _status_code(error: Exception) -> Optional[int]:
+
+        status = getattr(error, "status_code", None)
+        if status is None:
+            status = getattr(getattr(error, "response", None), "status_code", None)
+        return status if isinstance(status, int) else None
+
+    @staticmethod
+    def _retry_after(error: Exception) -> Optional[float]:
+
+        headers = getattr(getattr(error, "response", None), "headers", None) or {}
+        delays = [
+            parse_duration(str(headers[name]))
+            for name in ("retry-after", "x-ratelimit-reset-requests", "x-ratelimit-reset-tokens") if name in headers
+        ]
+        delays = [delay for delay in delays if delay is not None]
+        return max(delays) if delays else None
+
+    def _on_error(self, error: Exception) -> Optional[float]:
+
+        """Classify a failed request.
+
+        Returns:
+            Optional[float]: Minimum seconds before the retry, None if the error is not retryable
+        """
+
+        status = self._status_code(error)
+        if status == 429 or "RateLimit" in type(error).__name__:
+            retry_after = self._retry_after(error) or 0.0
+            with self._condition:
+                self._limit = max(float(self.min_concurrency), self._limit / 2)
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+            METRICS.inc("llm_rate_limited", model=self.name)
+            logger.info("Rate limited by %s, concurrency limit %d, retry after %.1fs", self.name, self.concurrency_limit, retry_after)
+            return retry_after
+
+        transient_name = any(word in type(error).__name__ for word in ("Timeout", "Connection"))
+        if transient_name or (status is not None and (status in (408, 409) or status >= 500)):
+            return 0.0
+        return None
+
+    def _on_success(self) -> None:
+
+        with self._condition:
+            if self._limit < self.max_concurrency:
+                self._limit = min(float(self.max_concurrency), self._limit + 1 / self._limit)
+                self._condition.notify_all()
+
+    def _backoff(self, attempt: int, retry_after: float) -> float:
+
+        # full jitter spreads the retries of concurrent callers apart
+        ceiling = min(self.max_delay, self.base_delay * 2 ** attempt)
+        return max(retry_after, random.uniform(0, ceiling))
+
+    def call(
+            self,
+            fn: Callable[[], T],
+            estimated_tokens: int = 0,
+            used_tokens: Optional[Callable[[T], Optional[int]]] = None
+        ) -> T:
+
+        """Run a request within the limits, retrying retryable errors.
+
+        Args:
+            fn (Callable[[], T]): Sends the request
+            estimated_tokens (int, optional): Tokens reserved for the request (prompt and completion). Defaults to 0.
+            used_tokens (Optional[Callable[[T], Optional[int]]], optional): Reads the real token usage from the result to correct the reservation. Defaults to None.
+
+        Raises:
+            Exception: Error of the last attempt, or the first error that is not retryable
+
+        Returns:
+            T: Result of fn
+        """
+
+        attempt = 0
+        while True:
+            self._acquire_slot()
+            try:
+                self._wait_for_budget(estimated_tokens)
+                try:
+                    result = fn()
+                except Exception as e:
+                    retry_after = self._on_error(e)
+                    if retry_after is None or attempt >= self.max_retries:
+                        raise
+                else:
+                    self._on_success()
+                    if used_tokens is not None and self.tokens is not None:
+                        used = used_tokens(result)
+                        if used is not None:
+                            self.tokens.adjust(used - estimated_tokens)
+                    return result
+            finally:
+                self._release_slot()
+
+            delay = self._backoff(attempt, retry_after)
+            METRICS.inc("llm_retries", model=self.name)
+            logger.info("Retrying %s request in %.1fs (attempt %d of %d)", self.name, delay, attempt + 1, self.max_retries)
+            time.sleep(delay)
+            attempt += 1
+
+
+# one limiter per model, shared by every thread of the process, since the API limits are per model
+_rate_limiters: Dict[str, RateLimiter] = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(model_name: str) -> RateLimiter:
+
+    """Get the shared limiter of a model, configured from the environment on first use.
+
+    GROQ_REQUESTS_PER_MINUTE (default 30), GROQ_TOKENS_PER_MINUTE (default 6000) and
+    GROQ_MAX_CONCURRENCY (default 8) set the limits, 0 disables a budget.
+
+    Args:
+        model_name (str): Name of the model
+
+    Returns:
+        RateLimiter: Limiter of the model
+    """
+
+    with _rate_limiters_lock:
+        if model_name not in _rate_limiters:
+            _rate_limiters[model_name] = RateLimiter(
+                requests_per_minute=float(os.getenv("GROQ_REQUESTS_PER_MINUTE", "30")),
+                tokens_per_minute=float(os.getenv("GROQ_TOKENS_PER_MINUTE", "6000")),
+                max_concurrency=int(os.getenv("GROQ_MAX_CONCURRENCY", "8")),
+                name=model_name
+            )
+        return _rate_limiters[model_name]
+
+
+def set_rate_limiter(model_name: str, rate_limiter: RateLimiter) -> None:
+
+    """Replace the shared limiter of a model.
+
+    Args:
+        model_name (str): Name of the model
+        rate_limiter (RateLimiter): Limiter used for every later request to the model
+    """
+
+    with _rate_limiters_lock:
+        _rate_limiters[model_name] = rate_limiter
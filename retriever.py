@@ -1,15 +1,130 @@
-import sys
-import uuid
-import streamlit as st
+import asyncio
+import logging
+import threading
+import os.path as osp
+from dataclasses import dataclass, field
 from data_ingestor import DataInstance
 from data_ingestor import DataSummaryInstance
 from data_ingestor import DataIngestor
-from typing import List, Union, ByteString
+from data_ingestor import locate_documents
+from data_classes import RAGDataType
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union, ByteString
 from langchain_chroma import Chroma # vector database to store embeddings
-from langchain.storage import InMemoryStore
+from langchain_core.vectorstores import VectorStore
+from doc_store import SQLiteDocStore
+from lexical_index import BM25Index
+from ingestion_manifest import IngestionManifest
+from ingestion_manifest import bytes_fingerprint
+from ingestion_manifest import chunk_fingerprint
+from pipeline import prefetch
 from langchain_core.documents.base import Document
 from langchain.retrievers.multi_vector import MultiVectorRetriever
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
 from chat_models import hf_embedding
+from metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+
+class IngestionCancelled(Exception):
+
+    """
+    Raised when an ingestion is cancelled, chunks added until then stay indexed.
+    """
+
+
+def _read_file(path: str) -> bytes:
+
+    with open(path, "rb") as f:
+        return f.read()
+
+
+@dataclass
+class _DocumentState:
+
+    # chunks of one document of an ingestion batch, by fingerprint
+
+    fingerprint: str
+    extracted: Dict[str, None] = field(default_factory=dict)  #every extracted chunk, in extraction order
+    indexed: Set[str] = field(default_factory=set)  #extracted chunks already in the db
+    added: Set[str] = field(default_factory=set)  #chunks added to the db by this ingestion
+    pending: Set[str] = field(default_factory=set)  #chunks waiting for their summary
+
+
+class ScoredMultiVectorRetriever(MultiVectorRetriever):
+
+    """
+    MultiVectorRetriever that keeps the relevance score and the summary of every retrieved document.
+
+    When a lexical index is set, its BM25 results over the original chunk text are fused with the
+    vector results over the summaries by reciprocal rank fusion. The score (fused when hybrid) and
+    the summary of every retrieved document are added to its metadata as 'score' and 'summary', so
+    the prompt can be ranked and shrunk without another lookup.
+    """
+
+    lexical_index: Optional[BM25Index] = None
+    """BM25 index fused with the vector results, None for vector search only."""
+
+    fusion_candidates: int = 20
+    """Number of candidates taken from each ranking before fusion."""
+
+    rrf_k: int = 60
+    """Rank offset of reciprocal rank fusion, larger values flatten the contribution of top ranks."""
+
+    def _vector_search_kwargs(self) -> dict:
+
+        if self.lexical_index is None:
+            return self.search_kwargs
+        return {**self.search_kwargs, 'k': max(self.search_kwargs.get('k', 4), self.fusion_candidates)}
+
+    def _rank(self, query: str, sub_docs_and_scores: List[Tuple[Document, float]]) -> Tuple[List[str], Dict[str, Tuple[float, Optional[str]]]]:
+
+        ids: List[str] = []
+        matches: Dict[str, Tuple[float, Optional[str]]] = {}
+        for sub_doc, score in sub_docs_and_scores:
+            doc_id = sub_doc.metadata.get(self.id_key)
+            if doc_id is not None and doc_id not in matches:
+                ids.append(doc_id)
+                matches[doc_id] = (score, sub_doc.page_content)
+
+        if self.lexical_index is None:
+            return ids, matches
+
+        # reciprocal rank fusion of the vector and the lexical ranking
+        lexical_ids: List[str] = [doc_id for doc_id, _ in self.lexical_index.search(query, self.fusion_candidates)]
+        fused: Dict[str, float] = {}
+        for ranking in (ids, lexical_ids):
+            for rank, doc_id in enumerate(ranking):
+                fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+
+        top_ids: List[str] = sorted(fused, key=fused.get, reverse=True)[:self.search_kwargs.get('k', 4)]
+        return top_ids, {doc_id: (fused[doc_id], matches.get(doc_id, (None, None))[1]) for doc_id in top_ids}
+
+    @staticmethod
+    def _annotate(ids: List[str], docs: List[Optional[Document]], matches: Dict[str, Tuple[float, Optional[str]]]) -> List[Document]:
+
+        return [
+            Document(
+                page_content=doc.page_content,
+                metadata={**doc.metadata, 'score': matches[doc_id][0], 'summary': matches[doc_id][1]}
+            )
+            for doc_id, doc in zip(ids, docs) if doc is not None
+        ]
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+
+        with METRICS.span("retrieval"):
+            sub_docs_and_scores = self.vectorstore.similarity_search_with_relevance_scores(query, **self._vector_search_kwargs())
+            ids, matches = self._rank(query, sub_docs_and_scores)
+            return self._annotate(ids, self.docstore.mget(ids), matches)
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun) -> List[Document]:
+
+        with METRICS.span("retrieval"):
+            sub_docs_and_scores = await self.vectorstore.asimilarity_search_with_relevance_scores(query, **self._vector_search_kwargs())
+            ids, matches = await asyncio.to_thread(self._rank, query, sub_docs_and_scores)
+            return self._annotate(ids, await self.docstore.amget(ids), matches)
 
 
 class Retriever:
@@ -19,78 +134,392 @@ class Retriever:
     """
 
 
-    def __init__(self):
-        """
-        Initialize Retriever class.
+    def __init__(
+            self,
+            collection_name: str = "mm_rag",
+            persist_directory: str = "./chroma_db",
+            docstore_path: str = "./docstore.db",
+            batch_size: int = 16,
+            max_buffered_chunks: int = 64,
+            hybrid_search: bool = True,
+            k: int = 4,
+            figures_dir: str = "figures",
+            vector_backend: str = "chroma",
+            vector_dtype: str = "int8",
+            vector_index: str = "exact"
+        ):
+        """Initialize Retriever class.
+
+        The vector database and the docstore are opened from disk, so a corpus ingested
+        by an earlier process can be queried right away.
+
+        Args:
+            collection_name (str, optional): Name of collection in db. Defaults to "mm_rag".
+            persist_directory (str, optional): Directory of the Chroma database. Defaults to "./chroma_db".
+            docstore_path (str, optional): Path of the SQLite docstore. Defaults to "./docstore.db".
+            batch_size (int, optional): Number of chunks summarized and added to the db together. Defaults to 16.
+            max_buffered_chunks (int, optional): Maximum number of extracted chunks waiting to be summarized. Defaults to 64.
+            hybrid_search (bool, optional): Fuse BM25 results over the original chunk text with the vector results. Defaults to True.
+            k (int, optional): Number of documents retrieved per query. Defaults to 4.
+            figures_dir (str, optional): Directory for the images extracted from ingested pdfs. Defaults to "figures".
+            vector_backend (str, optional): 'chroma', or 'quantized' for the in-process QuantizedVectorStore under persist_directory. Defaults to "chroma".
+            vector_dtype (str, optional): 'float16' or 'int8' vectors of the quantized backend. Defaults to "int8".
+            vector_index (str, optional): 'exact' or 'ivf' search of the quantized backend. Defaults to "exact".
+
+        Raises:
+            ValueError: Unsupported vector backend
         """        
+        self.collection_name: str = collection_name
+        self.persist_directory: str = persist_directory
+        self.batch_size: int = batch_size
+        self.max_buffered_chunks: int = max_buffered_chunks
+        self.figures_dir: str = figures_dir
+        self.vector_backend: str = vector_backend
+        self.vector_dtype: str = vector_dtype
+        self.vector_index: str = vector_index
         self.data_ingestor: DataIngestor = None
-        self.vector_db: Chroma = None
-        self.doc_db: InMemoryStore = None
-        self.retriever: MultiVectorRetriever = None
 
+        #Database is setup
+
+        self.vector_db: VectorStore = self._open_vector_db()
+
+        # original data values are stored in a SQLite docstore along with the id 
+        # original values corresponding to the top k ids retrieved are loaded from disk on demand
+
+        self.doc_db: SQLiteDocStore = SQLiteDocStore(docstore_path)
+
+        # BM25 index over the original chunk text, also stored next to the docstore
+        self.lexical_index: BM25Index = BM25Index(docstore_path)
+
+        self.retriever: ScoredMultiVectorRetriever = ScoredMultiVectorRetriever(
+            vectorstore=self.vector_db,
+            docstore=self.doc_db,
+            lexical_index=self.lexical_index if hybrid_search else None,
+            search_kwargs={'k': k},
+        )
+
+        # fingerprints of the ingested documents and their chunks, stored next to the docstore
+        self.manifest: IngestionManifest = IngestionManifest(docstore_path)
 
+    def _open_vector_db(self) -> VectorStore:
+
+        if self.vector_backend == "chroma":
+            return Chroma(
+                collection_name=self.collection_name,
+                embedding_function=hf_embedding,
+                persist_directory=self.persist_directory,
+                create_collection_if_not_exists=True
+            )
+        elif self.vector_backend == "quantized":
+            # numpy backed store for single node deployments, only imported when it is used
+            from quantized_vector_store import QuantizedVectorStore
+            return QuantizedVectorStore(
+                hf_embedding,
+                osp.join(self.persist_directory, self.collection_name),
+                dtype=self.vector_dtype,
+                index=self.vector_index
+            )
+        else:
+            raise ValueError(f"Unsupported vector backend {self.vector_backend}, expected 'chroma' or 'quantized'")
+
+    def has_data(self) -> bool:
+
+        """Check whether any data has been ingested.
+
+        Returns:
+            bool: True if the docstore holds at least one document
+        """
+
+        return self.doc_db.count() > 0
+
+    def corpus_version(self) -> int:
+
+        """Version of the ingested corpus, which changes whenever data is added or removed.
+
+        Returns:
+            int: Corpus version
+        """
+
+        return self.manifest.corpus_version()
+
+    def clear(self) -> None:
+
+        """
+        Delete all ingested data from the vector database and the docstore.
+        """
+
+        self.vector_db.delete_collection()
+        self.vector_db = self._open_vector_db()
+        self.retriever.vectorstore = self.vector_db
+        self.doc_db.clear()
+        self.lexical_index.clear()
+        self.manifest.clear()
 
     def ingest_data(
-            self, docs_dir: str, 
-            collection_name: str = "mm_rag"
+            self,
+            docs_dir: str,
+            source: str = None,
+            progress: Callable[[Dict[str, int]], None] = None,
+            cancel_event: threading.Event = None,
+            max_parallel_documents: int = 4
         ) -> None:
         """Ingest data into vector database(here Chroma is used).
 
+        Ingestion is incremental: a document whose fingerprint is unchanged is skipped, only chunks
+        that are not indexed yet are summarized and added, and chunks the document no longer
+        contains are deleted from the vector database and the docstore.
+        Chunks are summarized and added in batches while extraction is still running.
+        A directory is searched recursively and its pdfs are ingested a few batches of documents at a time.
+        Documents are named as by ingest_cli, see locate_documents, so both ingest the same tree into the same documents.
+
         Args:
-            docs_dir (str): Path to documents directory
-            collection_name (str, optional): Name of collection in db. Defaults to "mm_rag".
+            docs_dir (str): Path to a pdf or to a directory of pdfs
+            source (str, optional): Name identifying a single pdf across ingestions, the pdfs of a directory are named by their path relative to it. Defaults to the file name of the pdf.
+            progress (Callable[[Dict[str, int]], None], optional): Called after every added batch with chunks_extracted, chunks_already_indexed, chunks_indexed and documents_done. Defaults to None.
+            cancel_event (threading.Event, optional): Stops the ingestion after the current batch once set. Defaults to None.
+            max_parallel_documents (int, optional): Maximum number of documents extracted at the same time. Defaults to 4.
+
+        Raises:
+            IngestionCancelled: cancel_event was set, the document is completed by a later ingestion
         """   
 
+        documents: List[Tuple[str, str]] = locate_documents(docs_dir)
+        if not documents:
+            logger.info("No pdf found, skipping: %s", docs_dir)
+            return
+        if source is not None and not osp.isdir(docs_dir):
+            documents = [(source, docs_dir)]
+        logger.info("Located documents: %d", len(documents))
 
-        #Database is setup
+        # only one batch of documents is held in memory at a time
+        for start in range(0, len(documents), max_parallel_documents):
+            self.ingest_documents(
+                ((name, _read_file(path)) for name, path in documents[start:start + max_parallel_documents]),
+                progress=progress,
+                cancel_event=cancel_event,
+                max_parallel_documents=max_parallel_documents
+            )
 
-        self.vector_db: Chroma = Chroma(
-            collection_name=collection_name,
-            embedding_function=hf_embedding,
-            persist_directory="./chroma_db",
-            create_collection_if_not_exists=True
-        )
+    def ingest_documents(
+            self,
+            documents: Iterable[Tuple[str, Union[bytes, BinaryIO]]],
+            progress: Callable[[Dict[str, int]], None] = None,
+            cancel_event: threading.Event = None,
+            max_parallel_documents: int = 4,
+            extraction_workers: Optional[int] = None
+        ) -> None:
+        """Ingest a batch of pdfs held in memory, extracting and summarizing them in parallel.
 
-        # original data values are stored in InMemoryStore along with the id 
-        # original values corresponding to to the top k ids retrived be used
+        The documents are read from bytes or file-like objects, such as uploaded files, without
+        temporary files. They are extracted at the same time and their chunks go through one
+        summarization and insertion pipeline, so a batch takes about as long as its largest
+        document. Every chunk is stored with the name of its document as 'source' metadata.
+        Ingestion is incremental per document, as described in ingest_data; a chunk shared by
+        several documents of the batch is summarized once and recorded for each of them.
 
-        self.doc_db = InMemoryStore()
-        self.data_ingestor = DataIngestor(docs_dir)
-        self.retriever = MultiVectorRetriever(
-            vectorstore=self.vector_db,
-            docstore=self.doc_db,
+        Args:
+            documents (Iterable[Tuple[str, Union[bytes, BinaryIO]]]): (source, content) of every pdf, source names the document across ingestions
+            progress (Callable[[Dict[str, int]], None], optional): Called after every added batch with chunks_extracted, chunks_already_indexed, chunks_indexed and documents_done. Defaults to None.
+            cancel_event (threading.Event, optional): Stops the ingestion after the current batch once set. Defaults to None.
+            max_parallel_documents (int, optional): Maximum number of documents extracted at the same time. Defaults to 4.
+            extraction_workers (Optional[int], optional): Number of processes partitioning the pages of the batch. Defaults to the number of CPUs.
+
+        Raises:
+            IngestionCancelled: cancel_event was set, the documents are completed by a later ingestion
+        """
+
+        self.data_ingestor = DataIngestor(
+            image_output_dir_path=self.figures_dir,
+            document_workers=max_parallel_documents,
+            extraction_workers=extraction_workers
         )
 
-        # pdf is located 
-        self.data_ingestor.locate_data()
+        states: Dict[str, _DocumentState] = {}
+        deferred: List[Tuple[str, bytes]] = []  #documents ingested after this batch
+        image_dirs: Set[str] = set()
+        skipped: int = 0
+        for source, content in documents:
+            content = DataIngestor.read_content(content)
+            fingerprint: str = bytes_fingerprint(content)
+            if self.manifest.is_document_indexed(source, fingerprint):
+                METRICS.inc("documents_skipped")
+                logger.info("Document already indexed, skipping: %s", source)
+                skipped += 1
+                continue
+
+            # every version of a document extracts its images into its own directory, so image paths
+            # stored in the docstore stay valid when other documents are ingested later
+            image_dir: str = osp.join(self.figures_dir, fingerprint[:16])
+
+            # a name or a content that appears twice in the batch would share its state or image
+            # directory, the repeat is ingested after the batch and finds its chunks indexed
+            if source in states or image_dir in image_dirs:
+                deferred.append((source, content))
+                continue
+            states[source] = _DocumentState(fingerprint)
+            image_dirs.add(image_dir)
+            self.data_ingestor.add_document(source, content, image_dir)
+
+        if states:
+            self._ingest_batch(states, skipped, progress, cancel_event)
+        if deferred:
+            self.ingest_documents(deferred, progress, cancel_event, max_parallel_documents, extraction_workers)
+
+    def _ingest_batch(
+            self,
+            states: Dict[str, _DocumentState],
+            skipped: int,
+            progress: Optional[Callable[[Dict[str, int]], None]],
+            cancel_event: Optional[threading.Event]
+        ) -> None:
+
+        # chunk fingerprint -> documents waiting for its summary, shared by the summarization
+        # stage, which adds to it, and the insertion loop, which takes from it
+        waiting: Dict[str, List[str]] = {}
+        lock = threading.Lock()
+
+        def new_chunks(data_instances: Iterable[DataInstance]) -> Iterator[DataInstance]:
+
+            # chunks are fingerprinted and only the ones not yet in the db are passed on to be summarized
+            for d in data_instances:
+                state = states[d.source]
+                chunk_id = chunk_fingerprint(d.data_type, d.data)
+                if chunk_id in state.extracted:
+                    continue
+                state.extracted[chunk_id] = None
+                with lock:
+                    if chunk_id in waiting:
+                        # another document of the batch already sent the chunk to be summarized
+                        waiting[chunk_id].append(d.source)
+                        state.pending.add(chunk_id)
+                        continue
+                    indexed = bool(self.manifest.indexed_chunks([chunk_id]))
+                    if indexed:
+                        # recorded right away, so no other document of the batch orphans the chunk
+                        state.indexed.add(chunk_id)
+                        self.manifest.add_chunks(d.source, [chunk_id])
+                    else:
+                        waiting[chunk_id] = [d.source]
+                        state.pending.add(chunk_id)
+                if not indexed:
+                    yield d
+
+        def report() -> None:
+
+            if progress is None:
+                return
+            extracted = set(self.data_ingestor.extracted_sources)
+            progress({
+                "chunks_extracted": sum(len(state.extracted) for state in states.values()),
+                "chunks_already_indexed": sum(len(state.indexed) for state in states.values()),
+                "chunks_indexed": sum(len(state.added) for state in states.values()),
+                "documents_done": skipped + sum(
+                    1 for source, state in states.items() if source in extracted and not state.pending
+                )
+            })
+
+        logger.info("Ingesting documents: %d", len(states))
+        with METRICS.span("ingest_batch"):
 
-        # data (in form of tables ,images,text) is extracted from the pdf
-        data_instances: List[DataInstance] = self.data_ingestor.extract_text_tables_images()
+            # extraction, summarization and insertion run as concurrent stages connected by bounded
+            # buffers, so batches become searchable as soon as they are summarized and only a few
+            # batches are held in memory at any time
 
-        if len(data_instances) == 0:
-            print("No data instances found, exiting")
-            sys.exit(0)
+            # data (in form of tables ,images,text) is extracted from the pdfs
+            data_instances: Iterator[DataInstance] = prefetch(
+                self.data_ingestor.iter_text_tables_images(), self.max_buffered_chunks
+            )
 
-        # summarize the data extracted from the pdf before storing in db
-        data_summaries: List[DataSummaryInstance] = self.data_ingestor.summarize_text_tables_images(data_instances)
+            # summarize the data extracted from the pdfs before storing in db
+            summary_batches: Iterator[List[DataSummaryInstance]] = prefetch(
+                self.data_ingestor.iter_summaries(new_chunks(data_instances), self.batch_size), 2
+            )
 
-        with st.spinner("Ingesting Data"):# spinner showing ingestion step have started
-            self._ingest_data_into_db(data_summaries)
+            try:
+                for data_summaries in summary_batches:
+                    if cancel_event is not None and cancel_event.is_set():
+                        METRICS.inc("ingestions_cancelled")
+                        raise IngestionCancelled(", ".join(states))
+                    if not data_summaries:
+                        continue
+                    ids: List[str] = [chunk_fingerprint(d.data_type, d.data) for d in data_summaries]
+                    self._ingest_data_into_db(data_summaries, ids)
+                    added: Dict[str, List[str]] = {}
+                    with lock:
+                        for chunk_id in ids:
+                            for source in waiting.pop(chunk_id, []):
+                                added.setdefault(source, []).append(chunk_id)
+                        for source, source_ids in added.items():
+                            self.manifest.add_chunks(source, source_ids)
+                            states[source].added.update(source_ids)
+                            states[source].pending.difference_update(source_ids)
+                    report()
+            finally:
+                # stops the extraction and summarization stages at their next hand over
+                summary_batches.close()
 
+            METRICS.inc("chunks_already_indexed", sum(len(state.indexed) for state in states.values()))
+            logger.info("Extracted data instances: %d", sum(len(state.extracted) for state in states.values()))
+            logger.info("Chunks already indexed: %d", sum(len(state.indexed) for state in states.values()))
+            self.data_ingestor.report_summaries()
 
+            # the fingerprint of a document is only recorded once every chunk made it into the db,
+            # so chunks whose summary failed are retried on the next ingestion
+            for source, state in states.items():
+                present_ids: List[str] = [i for i in state.extracted if i in state.indexed or i in state.added]
+                complete: bool = len(present_ids) == len(state.extracted)
+                orphan_ids: List[str] = self.manifest.update_document(
+                    source, state.fingerprint if complete else None, present_ids
+                )
+                self._delete_from_db(orphan_ids)
+            report()
 
+    def remove_documents(self, sources: Iterable[str]) -> None:
+        """Remove documents and the chunks only they reference from the db.
 
-    def _ingest_data_into_db(self, data_summaries: List[DataSummaryInstance]):
+        Args:
+            sources (Iterable[str]): Names of the documents to remove
+        """
+
+        for source in sources:
+            logger.info("Removing document: %s", source)
+            self._delete_from_db(self.manifest.remove_document(source))
+
+    def sync_documents(self, sources: Iterable[str]) -> None:
+        """Remove every indexed document that is not in sources.
+
+        Args:
+            sources (Iterable[str]): Names of the documents that should stay in the db
+        """
 
-        ids = [str(uuid.uuid4()) for _ in data_summaries] #ids are generated for each  data instance
+        keep: Set[str] = set(sources)
+        self.remove_documents([s for s in self.manifest.sources() if s not in keep])
+
+    def _delete_from_db(self, ids: List[str]) -> None:
+
+        if not ids:
+            return
+        logger.info("Deleting documents from db: %d", len(ids))
+        METRICS.inc("chunks_deleted", len(ids))
+        self.retriever.vectorstore.delete(ids=ids)
+        self.retriever.docstore.mdelete(ids)
+        self.lexical_index.delete(ids)
+
+    @staticmethod
+    def _metadata(d: DataSummaryInstance, doc_id: str) -> Dict[str, Union[str, int]]:
+
+        # chroma rejects None values, so the source is only set when it is known
+        metadata = {'doc_id': doc_id, "data_type": d.data_type.value}
+        if d.source is not None:
+            metadata['source'] = d.source
+        return metadata
+
+    def _ingest_data_into_db(self, data_summaries: List[DataSummaryInstance], ids: List[str]):
 
         summary_docs = [
             Document(
                 page_content=d.summary, 
-                metadata={
-                    'doc_id': ids[i], 
-                    "data_type": d.data_type.value
-                }
+                metadata=Retriever._metadata(d, ids[i])
             ) for i, d in enumerate(data_summaries)
         ]
 
@@ -98,21 +527,26 @@ class Retriever:
         docs = [
             (ids[i], Document(
                 page_content=d.data, 
-                metadata={
-                    'doc_id': ids[i],
-                    "data_type": d.data_type.value
-                }
+                metadata=Retriever._metadata(d, ids[i])
             )) for i, d in enumerate(data_summaries)
         ]
 
 
-        print("Adding documents to db")
-        print("Number of summary documents to add: ", len(summary_docs))
-        print("Number of documents to add: ", len(docs))
+        logger.info("Adding documents to db: %d summaries, %d documents", len(summary_docs), len(docs))
 
         #Documents are added to vector database
-        self.retriever.vectorstore.add_documents(documents=summary_docs,ids=ids)
+        with METRICS.span("vector_insert"):
+            self.retriever.vectorstore.add_documents(documents=summary_docs,ids=ids)
+
+        #Documents are added to the docstore where original data values are preserved
+        with METRICS.span("docstore_insert"):
+            self.retriever.docstore.mset(docs)
 
-        #Documents are added to InMemoryStore where original data values are preserved
-        self.retriever.docstore.mset(docs)
-        print("Data ingested into db")
\ No newline at end of file
+        #original text is added to the lexical index, images are indexed by their summary
+        with METRICS.span("lexical_insert"):
+            self.lexical_index.add(
+                (ids[i], d.summary if d.data_type == RAGDataType.IMAGE else d.data)
+                for i, d in enumerate(data_summaries)
+            )
+        METRICS.inc("chunks_inserted", len(ids))
+        logger.info("Data ingested into db")
\ No newline at end of file
@@ -1,9 +1,60 @@
-
+import re
+import json
+import time
 import base64
+import logging
 import os.path as osp
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Union
 from langchain_core.messages import HumanMessage, BaseMessage
-from chat_models import chat_model
-from chat_models import vision_chat_model
+from langchain_core.language_models.chat_models import BaseChatModel
+from chat_models import SUMMARY_MAX_TOKENS
+from chat_models import get_summary_chat_model
+from chat_models import get_vision_chat_model
+from summary_cache import SummaryCache
+from image_preprocessor import ImagePreprocessor
+from context_assembler import estimate_tokens
+from data_classes import DataInstance
+from data_classes import RAGDataType
+from metrics import METRICS
+from rate_limiter import get_rate_limiter
+
+logger = logging.getLogger(__name__)
+
+
+TEXT_PROMPT_TEMPLATE = '''
+You are given a text. Summarize it in a few sentences for semantic retrieval.
+Do not include any additional words like Summary: etc.
+---
+Here is the text:
+{text}
+'''
+
+IMAGE_PROMPT_TEMPLATE = '''
+You are given a image. Summarize the image for semantic retrieval. 
+Do not include words like "Summary: etc.
+'''
+
+TABLE_PROMPT_TEMPLATE = '''
+You are given a table. Summarize the table for semantic retrieval. 
+Do not include any additional words like Summary: etc.
+---
+Here is the table:
+{table}
+'''
+
+PACKED_PROMPT_TEMPLATE = '''
+You are given {count} numbered items, each a text or a table. Summarize every item in a few sentences for semantic retrieval.
+Answer only with a JSON object mapping every item number to the summary of that item, like {{"1": "...", "2": "..."}}.
+Do not include any additional words like Summary: etc.
+---
+{items}
+'''
+
+PACKED_ITEM_TEMPLATE = '''
+Item {number} ({kind}):
+{content}
+'''
 
 
 class Summarizer:
@@ -12,6 +63,118 @@ class Summarizer:
     Summarizer class to summarize text, tables and images using chat_model and vision_chat_model of llama.
     """
 
+    # summaries are looked up here before any request is sent, set to None to disable caching
+    cache: SummaryCache = SummaryCache()
+
+    # shrinks images before they are uploaded to vision_chat_model
+    image_preprocessor: ImagePreprocessor = ImagePreprocessor()
+
+    # tokens reserved from the rate limit budget for a response, and for an uploaded image
+    expected_completion_tokens: int = 200
+    image_token_estimate: int = 1000
+
+    # output tokens of one summary of a packed response, including its JSON quoting
+    packed_item_tokens: int = 120
+
+    # templates of the single item requests, packed summaries are cached under the same keys
+    item_prompt_templates: Dict[RAGDataType, str] = {
+        RAGDataType.TEXT: TEXT_PROMPT_TEMPLATE,
+        RAGDataType.TABLE: TABLE_PROMPT_TEMPLATE
+    }
+
+    @staticmethod
+    def _cache_get(key: str) -> Optional[str]:
+
+        summary = Summarizer.cache.get(key)
+        METRICS.inc("summary_cache_hits" if summary is not None else "summary_cache_misses")
+        return summary
+
+    @staticmethod
+    def _invoke(model: BaseChatModel, message_content: List[dict], caller: str) -> Optional[BaseMessage]:
+
+        """Send one request to a chat model, recording its latency, tokens and failures.
+
+        The request goes through the model's shared rate limiter, which retries rate limit and
+        transient errors with backoff. None is only returned once those retries are exhausted.
+
+        Args:
+            model (BaseChatModel): Model answering the request
+            message_content (List[dict]): Content of the HumanMessage sent to the model
+            caller (str): Name of the calling method, used in error messages
+
+        Returns:
+            Optional[BaseMessage]: Response or None if the request failed
+        """
+
+        estimated_tokens: int = Summarizer.expected_completion_tokens + sum(
+            estimate_tokens(part['text']) if part.get('type') == 'text' else Summarizer.image_token_estimate
+            for part in message_content
+        )
+
+        start = time.perf_counter()
+        try:
+            response: BaseMessage = get_rate_limiter(model.model_name).call(
+                lambda: model.invoke([HumanMessage(content=message_content)]),
+                estimated_tokens,
+                lambda response: (response.usage_metadata or {}).get('total_tokens')
+            )
+        except Exception as e:
+            METRICS.inc("llm_errors", model=model.model_name, caller=caller)
+            logger.warning("Error in Summarizer.%s %s", caller, e)
+            return None
+
+        METRICS.record_llm_call(model.model_name, response, time.perf_counter() - start)
+        return response
+
+    @staticmethod
+    def _summarize(
+            model: BaseChatModel,
+            prompt_template: str,
+            content: Union[bytes, str],
+            message_content: Union[List[dict], Callable[[], List[dict]]],
+            caller: str,
+            use_cache: bool = True
+        ) -> str:
+
+        """Send a summary request, going through the summary cache first.
+
+        Args:
+            model (BaseChatModel): Model answering the request
+            prompt_template (str): Prompt template, part of the cache key
+            content (Union[bytes, str]): Summarized content, part of the cache key
+            message_content (Union[List[dict], Callable[[], List[dict]]]): Content of the HumanMessage sent to the model, or a function building it on a cache miss
+            caller (str): Name of the calling method, used in error messages
+            use_cache (bool, optional): Look up and store the summary in the shared summary cache. Defaults to True.
+
+        Returns:
+            str: Summary or None if the request failed
+        """
+
+        cache = Summarizer.cache if use_cache else None
+        key: str = None
+        if cache is not None:
+            key = SummaryCache.make_key(content, prompt_template, model.model_name)
+            summary = Summarizer._cache_get(key)
+            if summary is not None:
+                return summary
+
+        if callable(message_content):
+            # building the content may decode an image, an undecodable one fails this item only
+            try:
+                message_content = message_content()
+            except Exception as e:
+                METRICS.inc("llm_errors", model=model.model_name, caller=caller)
+                logger.warning("Error in Summarizer.%s %s", caller, e)
+                return None
+
+        response: BaseMessage = Summarizer._invoke(model, message_content, caller)
+        if response is None:
+            return None
+
+        if cache is not None:
+            cache.put(key, response.content)
+        return response.content
+
     @staticmethod
     def summarize_text(text: str) -> str:
 
@@ -25,29 +188,20 @@ class Summarizer:
         """
 
 
-        prompt = f'''
-You are given a text. Summarize it in a few sentences for semantic retrieval.
-Do not include any additional words like Summary: etc.
----
-Here is the text:
-{text}
-'''
-        try:
-            response: BaseMessage = chat_model.invoke([
-                HumanMessage(content=[
-                    {'type': 'text', 'text': prompt},
-                ])
-            ])
-            return response.content
-        except Exception as e:
-            print(f"Error in Summarizer.summarize_text {e}")
-            return None
+        prompt = TEXT_PROMPT_TEMPLATE.format(text=text)
+        return Summarizer._summarize(
+            get_summary_chat_model(),
+            TEXT_PROMPT_TEMPLATE,
+            text,
+            [{'type': 'text', 'text': prompt}],
+            "summarize_text"
+        )
+
 
-        
     @staticmethod
     def encode_image(image_path: str) -> str:
 
-    
+
         """Encode image to base64.
 
         Args:
@@ -55,7 +209,7 @@ Here is the text:
 
         Returns:
             str: Base64 encoded image
-        """        
+        """
 
 
         with open(image_path, "rb") as image_file:
@@ -71,34 +225,71 @@ Here is the text:
 
         Returns:
             str: Summarized image
-        """        
+        """
 
 
+        assert osp.exists(image_path), f"Image path does not exist {image_path}"
+        with open(image_path, "rb") as image_file:
+            return Summarizer.summarize_image_bytes(image_file.read())
 
-        prompt = '''
-You are given a image. Summarize the image for semantic retrieval. 
-Do not include words like "Summary: etc.
-'''
+    @staticmethod
+    def summarize_image_bytes(image_bytes: bytes, use_cache: bool = True) -> str:
 
+        """Summarize an image held in memory, e.g. an uploaded file, using vision_chat_model.
+
+        The summary cache is keyed by the image content, so the same image is summarized once
+        whether it was read from a file or uploaded.
+
+        Args:
+            image_bytes (bytes): Content of the image file
+            use_cache (bool, optional): Share the summary through the summary cache across sessions. Defaults to True.
+
+        Returns:
+            str: Summarized image or None if the request failed
+        """
+
+        def message_content() -> List[dict]:
+
+            # the image is downscaled and re-encoded only when it is actually uploaded
+            upload_bytes, mime_type = Summarizer.image_preprocessor.prepare_for_upload(image_bytes)
+            base64_image = base64.b64encode(upload_bytes).decode("utf-8")
+            return [
+                {"type": "text", "text": IMAGE_PROMPT_TEMPLATE},
+                {
+                    "type": "image_url",
+                    "image_url": {
+                        "url": f"data:{mime_type};base64,{base64_image}"},
+                },
+            ]
+
+        return Summarizer._summarize(
+            get_vision_chat_model(),
+            IMAGE_PROMPT_TEMPLATE,
+            image_bytes,
+            message_content,
+            "summarize_image",
+            use_cache
+        )
+
+    @staticmethod
+    def summarize_images_bytes(images: List[bytes], max_workers: int = 4, use_cache: bool = True) -> List[Optional[str]]:
+
+        """Summarize several in-memory images concurrently.
+
+        Args:
+            images (List[bytes]): Contents of the image files
+            max_workers (int, optional): Maximum parallel vision_chat_model requests. Defaults to 4.
+            use_cache (bool, optional): Share the summaries through the summary cache across sessions. Defaults to True.
+
+        Returns:
+            List[Optional[str]]: Summary of every image in input order, None where the request failed
+        """
+
+        if len(images) <= 1:
+            return [Summarizer.summarize_image_bytes(image, use_cache) for image in images]
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(images))) as pool:
+            return list(pool.map(lambda image: Summarizer.summarize_image_bytes(image, use_cache), images))
 
-        assert osp.exists(image_path), f"Image path does not exist {image_path}"
-        base64_image = Summarizer.encode_image(image_path)
-        try:
-            response: BaseMessage = vision_chat_model.invoke([
-                HumanMessage(content=[
-                    {"type": "text", "text": prompt},
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/jpeg;base64,{base64_image}"},
-                    },
-                ])
-            ])
-            return response.content
-        except Exception as e:
-            print(f"Error in Summarizer.summarize_image {e}")
-            return None
-    
     @staticmethod
     def summarize_table(table: str) -> str:
 
@@ -110,24 +301,179 @@ Do not include words like "Summary: etc.
 
         Returns:
             str: Summarized table
-        """    
+        """
 
 
-        prompt = f'''
-You are given a table. Summarize the table for semantic retrieval. 
-Do not include any additional words like Summary: etc.
----
-Here is the table:
-{table}
-'''
-        
+        prompt = TABLE_PROMPT_TEMPLATE.format(table=table)
+        return Summarizer._summarize(
+            get_summary_chat_model(),
+            TABLE_PROMPT_TEMPLATE,
+            table,
+            [{"type": "text", "text": prompt}],
+            "summarize_table"
+        )
+
+    @staticmethod
+    def pack(
+            data_instances: List[DataInstance],
+            max_request_tokens: int = 4000,
+            max_items_per_request: Optional[int] = None
+        ) -> List[List[DataInstance]]:
+
+        """Group text and table data instances into packed summary requests.
+
+        Items are packed greedily in input order until the next one would exceed the request's
+        token budget or item limit. An item larger than the budget gets a request of its own.
+
+        Args:
+            data_instances (List[DataInstance]): Text and table data instances
+            max_request_tokens (int, optional): Maximum estimated prompt tokens per request. Defaults to 4000.
+            max_items_per_request (Optional[int], optional): Maximum items per request. Defaults to Summarizer.max_packed_items().
+
+        Returns:
+            List[List[DataInstance]]: Data instances of every request
+        """
+
+        if max_items_per_request is None:
+            max_items_per_request = Summarizer.max_packed_items()
+
+        overhead: int = estimate_tokens(PACKED_PROMPT_TEMPLATE)
+        packs: List[List[DataInstance]] = []
+        current: List[DataInstance] = []
+        current_tokens: int = overhead
+        for data_instance in data_instances:
+            tokens = estimate_tokens(data_instance.data) + estimate_tokens(PACKED_ITEM_TEMPLATE)
+            if current and (current_tokens + tokens > max_request_tokens or len(current) >= max_items_per_request):
+                packs.append(current)
+                current, current_tokens = [], overhead
+            current.append(data_instance)
+            current_tokens += tokens
+        if current:
+            packs.append(current)
+        return packs
+
+    @staticmethod
+    def max_packed_items(max_tokens: int = SUMMARY_MAX_TOKENS) -> int:
+
+        """Number of items whose summaries fit into the output of one packed request.
+
+        A response cut off at the output limit is not valid JSON and every item of it is sent
+        again on its own, so the items are bounded by the output budget, not by the prompt.
+
+        Args:
+            max_tokens (int, optional): Output tokens of the summary model. Defaults to SUMMARY_MAX_TOKENS.
+
+        Returns:
+            int: Maximum items per packed request, at least 1
+        """
+
+        return max(1, max_tokens // Summarizer.packed_item_tokens)
+
+    @staticmethod
+    def _parse_packed_response(content: str, count: int) -> Dict[int, str]:
+
+        """Read the per item summaries out of a packed response.
+
+        Args:
+            content (str): Response of the model
+            count (int): Number of items in the request
+
+        Returns:
+            Dict[int, str]: Summaries by zero based item index, missing items are left out
+        """
+
+        # models sometimes wrap the object in a code fence or add a sentence around it
+        match = re.search(r"\{.*\}", content, re.DOTALL)
+        if match is None:
+            return {}
         try:
-            response: BaseMessage = chat_model.invoke([
-                HumanMessage(content=[
-                    {"type": "text", "text": prompt},
-                ])
-            ])
-            return response.content
-        except Exception as e:
-            print(f"Error in Summarizer.summarize_table {e}")
-            return None
\ No newline at end of file
+            parsed = json.loads(match.group(0))
+        except ValueError:
+            return {}
+        if not isinstance(parsed, dict):
+            return {}
+
+        summaries: Dict[int, str] = {}
+        for number in range(1, count + 1):
+            summary = parsed.get(str(number))
+            if isinstance(summary, str) and summary.strip():
+                summaries[number - 1] = summary.strip()
+        return summaries
+
+    @staticmethod
+    def summarize_packed(data_instances: List[DataInstance]) -> List[Optional[str]]:
+
+        """Summarize several text and table data instances with a single chat_model request.
+
+        Cached summaries are used first and only the remaining items are sent, numbered, in one
+        prompt asking for a JSON object of summaries. Items missing from the response, or all of
+        them if it cannot be parsed, are summarized again one at a time.
+
+        Args:
+            data_instances (List[DataInstance]): Text and table data instances, usually one group of Summarizer.pack
+
+        Raises:
+            ValueError: Unsupported data type
+
+        Returns:
+            List[Optional[str]]: Summary of every data instance in input order, None where the request failed
+        """
+
+        for data_instance in data_instances:
+            if data_instance.data_type not in Summarizer.item_prompt_templates:
+                raise ValueError(f"Unsupported data type for packed summaries {data_instance.data_type}")
+
+        model: BaseChatModel = get_summary_chat_model()
+        cache = Summarizer.cache
+        summaries: List[Optional[str]] = [None] * len(data_instances)
+        keys: List[str] = [None] * len(data_instances)
+        pending: List[int] = []
+        for i, data_instance in enumerate(data_instances):
+            if cache is not None:
+                keys[i] = SummaryCache.make_key(
+                    data_instance.data, Summarizer.item_prompt_templates[data_instance.data_type], model.model_name
+                )
+                summaries[i] = Summarizer._cache_get(keys[i])
+            if summaries[i] is None:
+                pending.append(i)
+
+        # a single item gains nothing from packing
+        if len(pending) > 1:
+            items = "".join(
+                PACKED_ITEM_TEMPLATE.format(
+                    number=number,
+                    kind=data_instances[i].data_type.name.lower(),
+                    content=data_instances[i].data
+                )
+                for number, i in enumerate(pending, start=1)
+            )
+            prompt = PACKED_PROMPT_TEMPLATE.format(count=len(pending), items=items)
+            response: BaseMessage = Summarizer._invoke(model, [{'type': 'text', 'text': prompt}], "summarize_packed")
+            parsed: Dict[int, str] = {}
+            if response is not None:
+                parsed = Summarizer._parse_packed_response(response.content, len(pending))
+                if not parsed:
+                    # usually a response cut off at the output limit
+                    finish_reason = (getattr(response, "response_metadata", None) or {}).get("finish_reason", "unknown")
+                    METRICS.inc("packed_summary_parse_errors", finish_reason=finish_reason)
+                    logger.warning(
+                        "Packed summary of %d items could not be parsed (finish reason %s)", len(pending), finish_reason
+                    )
+            METRICS.inc("packed_summary_items", len(parsed))
+
+            if len(parsed) < len(pending):
+                METRICS.inc("summary_retries", len(pending) - len(parsed))
+                logger.info("Packed summary returned %d of %d items, retrying the rest one at a time", len(parsed), len(pending))
+            for number, i in enumerate(pending):
+                if number in parsed:
+                    summaries[i] = parsed[number]
+                    if cache is not None:
+                        cache.put(keys[i], summaries[i])
+            pending = [i for i in pending if summaries[i] is None]
+
+        for i in pending:
+            if data_instances[i].data_type == RAGDataType.TEXT:
+                summaries[i] = Summarizer.summarize_text(data_instances[i].data)
+            else:
+                summaries[i] = Summarizer.summarize_table(data_instances[i].data)
+        return summaries
@@ -0,0 +1,148 @@
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Dict, Optional, Union
+
+
+class SummaryCache:
+
+    """
+    Content-addressed on-disk cache of summaries, backed by SQLite.
+
+    Entries are keyed by a hash of the summarized content, the prompt template and the model name,
+    so an unchanged chunk is never sent to the model twice. The cache is bounded by the total size
+    of the stored summaries and evicts the least recently used entries first.
+    """
+
+    def __init__(self, db_path: str = "./summary_cache.db", max_size_bytes: int = 64 * 1024 * 1024):
+
+        """Initialize SummaryCache class.
+
+        Args:
+            db_path (str, optional): Path to the SQLite database file. Defaults to "./summary_cache.db".
+            max_size_bytes (int, optional): Maximum total size of cached summaries in bytes. Defaults to 64 MiB.
+        """
+
+        self.db_path: str = db_path
+        self.max_size_bytes: int = max_size_bytes
+        self.hits: int = 0
+        self.misses: int = 0
+        self._conn: sqlite3.Connection = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(content: Union[bytes, str], prompt_template: str, model_name: str) -> str:
+
+        """Build the cache key for a summary request.
+
+        Args:
+            content (Union[bytes, str]): Text of the chunk or raw bytes of the image
+            prompt_template (str): Prompt template used for the request
+            model_name (str): Name of the model answering the request
+
+        Returns:
+            str: Hex digest identifying the request
+        """
+
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+
+        digest = hashlib.sha256()
+        for part in (model_name.encode("utf-8"), prompt_template.encode("utf-8"), content):
+            # length prefix keeps the boundaries between the parts unambiguous
+            digest.update(len(part).to_bytes(8, "big"))
+            digest.update(part)
+        return digest.hexdigest()
+
+    def _connection(self) -> sqlite3.Connection:
+
+        # the database is opened on first use so importing the module has no side effects
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS summaries ("
+                "key TEXT PRIMARY KEY, summary TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS summaries_last_access ON summaries (last_access)")
+            self._conn.commit()
+        return self._conn
+
+    def get(self, key: str) -> Optional[str]:
+
+        """Look up a cached summary and mark it as recently used.
+
+        Args:
+            key (str): Cache key from make_key
+
+        Returns:
+            Optional[str]: Cached summary or None on a miss
+        """
+
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("SELECT summary FROM summaries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            conn.execute("UPDATE summaries SET last_access = ? WHERE key = ?", (time.time(), key))
+            conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, summary: str) -> None:
+
+        """Store a summary and evict least recently used entries beyond the size bound.
+
+        Args:
+            key (str): Cache key from make_key
+            summary (str): Summary returned by the model
+        """
+
+        size = len(summary.encode("utf-8"))
+        if size > self.max_size_bytes:
+            return
+
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO summaries (key, summary, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, summary, size, time.time())
+            )
+            total_size = conn.execute("SELECT COALESCE(SUM(size), 0) FROM summaries").fetchone()[0]
+            if total_size > self.max_size_bytes:
+                # walk the entries from least to most recently used until enough space is freed
+                evict_keys = []
+                for old_key, old_size in conn.execute("SELECT key, size FROM summaries ORDER BY last_access"):
+                    if total_size <= self.max_size_bytes:
+                        break
+                    evict_keys.append((old_key,))
+                    total_size -= old_size
+                conn.executemany("DELETE FROM summaries WHERE key = ?", evict_keys)
+            conn.commit()
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+
+        """Hit and miss counters of this cache instance.
+
+        Returns:
+            Dict[str, Union[int, float]]: hits, misses and hit_rate
+        """
+
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+    def clear(self) -> None:
+
+        """
+        Remove every cached summary.
+        """
+
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM summaries")
+            conn.commit()
@@ -0,0 +1,118 @@
+import re
+from dataclasses import dataclass
+from typing import Dict, Optional
+from data_classes import DataInstance
+from data_classes import RAGDataType
+
+
+@dataclass
+class SummaryThreshold:
+
+    """
+    Data class for the limits deciding when a chunk of one data type is embedded without a summary.
+    """
+
+    # chunks shorter than this are embedded as they are
+    min_chars: int
+    # chunks up to this length are embedded as they are when their words are dense enough
+    max_raw_chars: int
+    # share of distinct words above which a chunk counts as dense, None to never treat chunks as dense
+    dense_ratio: Optional[float] = None
+
+
+# all-mpnet-base-v2 reads at most 384 tokens, so raw chunks are kept well below ~1500 characters
+DEFAULT_THRESHOLDS: Dict[RAGDataType, Optional[SummaryThreshold]] = {
+    RAGDataType.TEXT: SummaryThreshold(min_chars=600, max_raw_chars=1500, dense_ratio=0.75),
+    RAGDataType.TABLE: SummaryThreshold(min_chars=400, max_raw_chars=1500, dense_ratio=None),
+    RAGDataType.IMAGE: None
+}
+
+
+class SummaryPolicy:
+
+    """
+    Policy deciding per chunk whether it is summarized by a model or embedded directly.
+
+    Short chunks and dense chunks (lists of terms, specifications) are already as compact as a
+    summary of them would be, so their raw text is used as the summary and no model call is made.
+    Data types without a threshold, images by default, are always summarized.
+    """
+
+    def __init__(self, thresholds: Optional[Dict[RAGDataType, Optional[SummaryThreshold]]] = None):
+
+        """Initialize SummaryPolicy class.
+
+        Args:
+            thresholds (Optional[Dict[RAGDataType, Optional[SummaryThreshold]]], optional): Threshold per data type, None for a type to always summarize it. Defaults to DEFAULT_THRESHOLDS.
+        """
+
+        self.thresholds: Dict[RAGDataType, Optional[SummaryThreshold]] = dict(DEFAULT_THRESHOLDS)
+        if thresholds is not None:
+            self.thresholds.update(thresholds)
+        self.skipped: Dict[RAGDataType, int] = {data_type: 0 for data_type in RAGDataType}
+        self.summarized: Dict[RAGDataType, int] = {data_type: 0 for data_type in RAGDataType}
+
+    @staticmethod
+    def density(text: str) -> float:
+
+        """Share of distinct words in a text.
+
+        Args:
+            text (str): Text to measure
+
+        Returns:
+            float: Distinct words divided by words, 0.0 for a text without words
+        """
+
+        words = re.findall(r"\w+", text.lower())
+        return len(set(words)) / len(words) if words else 0.0
+
+    def should_summarize(self, data_instance: DataInstance) -> bool:
+
+        """Decide whether a data instance needs a model summary, counting the decision.
+
+        Args:
+            data_instance (DataInstance): Data instance about to be summarized
+
+        Returns:
+            bool: False if the raw data should be embedded as its own summary
+        """
+
+        threshold = self.thresholds.get(data_instance.data_type)
+        summarize = True
+        if threshold is not None:
+            length = len(data_instance.data)
+            if length < threshold.min_chars:
+                summarize = False
+            elif length <= threshold.max_raw_chars and threshold.dense_ratio is not None:
+                summarize = SummaryPolicy.density(data_instance.data) < threshold.dense_ratio
+
+        if summarize:
+            self.summarized[data_instance.data_type] += 1
+        else:
+            self.skipped[data_instance.data_type] += 1
+        return summarize
+
+    def reset(self) -> None:
+
+        """
+        Reset the decision counters.
+        """
+
+        self.skipped = {data_type: 0 for data_type in RAGDataType}
+        self.summarized = {data_type: 0 for data_type in RAGDataType}
+
+    def stats(self) -> Dict[str, int]:
+
+        """Number of model calls skipped and made per data type.
+
+        Returns:
+            Dict[str, int]: skipped_<type> and summarized_<type> counts and the total skipped_calls
+        """
+
+        stats: Dict[str, int] = {}
+        for data_type in RAGDataType:
+            stats[f"skipped_{data_type.name.lower()}"] = self.skipped[data_type]
+            stats[f"summarized_{data_type.name.lower()}"] = self.summarized[data_type]
+        stats["skipped_calls"] = sum(self.skipped.values())
+        return stats
@@ -0,0 +1,5 @@
+import sys
+import os.path as osp
+
+# the modules live flat at the root of the repository
+sys.path.insert(0, osp.dirname(osp.dirname(osp.abspath(__file__))))
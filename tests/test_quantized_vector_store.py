@@ -0,0 +1,164 @@
+import os.path as osp
+from typing import Dict, List
+import numpy as np
+import pytest
+from langchain_core.embeddings import Embeddings
+from quantized_vector_store import QuantizedVectorStore, quantize, top_k
+
+DIM = 32
+
+
+class TableEmbeddings(Embeddings):
+
+    # every text gets a fixed random vector, "q:<text>" is a noisy copy of the vector of <text>
+
+    def __init__(self):
+
+        self.rng = np.random.default_rng(1)
+        self.table: Dict[str, np.ndarray] = {}
+
+    def vector(self, text: str) -> np.ndarray:
+
+        if text not in self.table:
+            self.table[text] = self.rng.standard_normal(DIM).astype(np.float32)
+        return self.table[text]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+
+        return [self.vector(text).tolist() for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+
+        return (self.vector(text[2:]) + 0.05 * self.rng.standard_normal(DIM)).tolist()
+
+
+def brute_force(vectors: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+
+    vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    return np.argsort(-(queries @ vectors.T), axis=1)[:, :k]
+
+
+def test_quantize_int8_keeps_direction():
+
+    vectors = np.random.default_rng(0).standard_normal((10, DIM)).astype(np.float32)
+    values, scales = quantize(vectors, "int8")
+    assert values.dtype == np.int8
+    assert np.abs(values).max() == 127
+    restored = values.astype(np.float32) * scales[:, None]
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    assert np.all(np.sum(restored * normalized, axis=1) > 0.999)
+
+
+def test_top_k_orders_best_first():
+
+    scores = np.array([[0.1, 0.9, 0.5, 0.7]], dtype=np.float32)
+    rows, best = top_k(scores, np.array([10, 11, 12, 13]), 2)
+    assert rows.tolist() == [[11, 13]]
+    assert best[0].tolist() == pytest.approx([0.9, 0.7])
+
+
+@pytest.mark.parametrize("dtype", ["int8", "float16"])
+def test_exact_recall_matches_brute_force(tmp_path, dtype):
+
+    rng = np.random.default_rng(2)
+    vectors = rng.standard_normal((2000, DIM)).astype(np.float32)
+    queries = rng.standard_normal((50, DIM)).astype(np.float32)
+    store = QuantizedVectorStore(None, str(tmp_path), dtype=dtype, block_size=512)
+    store.add_embeddings([str(i) for i in range(len(vectors))], vectors, ids=[str(i) for i in range(len(vectors))])
+
+    k = 10
+    rows, _ = store.search_vectors(queries, k)
+    expected = brute_force(vectors, queries, k)
+    # rows are allocated in insertion order, so a row is the index of its vector
+    recall = np.mean([len(set(r) & set(e)) / k for r, e in zip(rows.tolist(), expected.tolist())])
+    assert recall >= 0.95
+
+
+def test_delete_and_readd_reuse_rows(tmp_path):
+
+    embedding = TableEmbeddings()
+    store = QuantizedVectorStore(embedding, str(tmp_path))
+    texts = [f"t{i}" for i in range(10)]
+    store.add_texts(texts, [{"doc_id": text} for text in texts], ids=texts)
+    size = store.stats()["vector_bytes"]
+
+    store.delete(["t3", "t7"])
+    assert store.count() == 8
+    assert store.get_by_ids(["t3", "t7"]) == []
+    assert all(document.id not in ("t3", "t7") for document in store.similarity_search("q:t3", k=10))
+
+    store.add_texts(["n1", "n2"], ids=["n1", "n2"])
+    assert store.count() == 10
+    assert store.stats()["vector_bytes"] == size
+    assert store.similarity_search("q:n1", k=1)[0].id == "n1"
+
+
+def test_upsert_replaces_vector(tmp_path):
+
+    embedding = TableEmbeddings()
+    store = QuantizedVectorStore(embedding, str(tmp_path))
+    store.add_texts(["a", "b"], ids=["a", "b"])
+    store.add_texts(["c"], [{"version": 2}], ids=["a"])
+    assert store.count() == 2
+    [document] = store.get_by_ids(["a"])
+    assert document.page_content == "c"
+    assert document.metadata == {"version": 2}
+    assert store.similarity_search("q:c", k=1)[0].id == "a"
+
+
+def test_get_by_ids_skips_missing_and_keeps_order(tmp_path):
+
+    store = QuantizedVectorStore(TableEmbeddings(), str(tmp_path))
+    store.add_texts(["x", "y", "z"], [{"n": 1}, {"n": 2}, {"n": 3}], ids=["x", "y", "z"])
+    documents = store.get_by_ids(["z", "missing", "x"])
+    assert [document.id for document in documents] == ["z", "x"]
+    assert [document.metadata["n"] for document in documents] == [3, 1]
+    assert store.delete(["missing"]) is True
+    assert store.count() == 3
+
+
+def test_reopen_keeps_vectors_and_rejects_other_dtype(tmp_path):
+
+    embedding = TableEmbeddings()
+    store = QuantizedVectorStore(embedding, str(tmp_path), dtype="float16")
+    store.add_texts(["a", "b", "c"], ids=["a", "b", "c"])
+    reopened = QuantizedVectorStore(embedding, str(tmp_path), dtype="float16")
+    assert reopened.count() == 3
+    assert reopened.similarity_search("q:b", k=1)[0].id == "b"
+    with pytest.raises(ValueError):
+        QuantizedVectorStore(embedding, str(tmp_path), dtype="int8")
+
+
+def test_ivf_store_reopened_as_exact(tmp_path):
+
+    rng = np.random.default_rng(3)
+    vectors = rng.standard_normal((1200, DIM)).astype(np.float32)
+    ids = [str(i) for i in range(len(vectors))]
+    ivf = QuantizedVectorStore(None, str(tmp_path), index="ivf", ivf_min_size=1000, n_probe=1)
+    ivf.add_embeddings(ids, vectors, ids=ids)
+    assert ivf.stats()["lists"] > 0
+
+    # an exact store scores every vector, whatever clusters an earlier ivf store left behind
+    exact = QuantizedVectorStore(None, str(tmp_path), index="exact")
+    assert exact.stats()["lists"] == 0
+    queries = rng.standard_normal((20, DIM)).astype(np.float32)
+    rows, _ = exact.search_vectors(queries, 5)
+    expected = brute_force(vectors, queries, 5)
+    # int8 rounding may swap near ties, not drop the best vectors
+    assert rows[:, 0].tolist() == expected[:, 0].tolist()
+    assert all(len(set(r) & set(e)) >= 4 for r, e in zip(rows.tolist(), expected.tolist()))
+
+    # writing through the exact store drops the clusters, which no longer cover every vector
+    exact.add_embeddings(["new"], vectors[:1] * -1, ids=["new"])
+    assert not osp.exists(osp.join(str(tmp_path), "centroids.npy"))
+
+    reopened = QuantizedVectorStore(None, str(tmp_path), index="ivf", ivf_min_size=1000)
+    assert reopened.stats()["lists"] == 0
+    rows, _ = reopened.search_vectors(-vectors[:1], 1)
+    assert reopened.get_by_ids(["new"])[0].id == "new"
+    assert rows[0, 0] == reopened._rows_of(["new"])["new"]
+
+    # the next write trains the clusters again
+    reopened.add_embeddings(["newer"], vectors[1:2], ids=["newer"])
+    assert reopened.stats()["lists"] > 0
@@ -0,0 +1,142 @@
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+import pytest
+import rate_limiter
+from rate_limiter import RateLimiter, TokenBucket, parse_duration
+
+
+class FakeAPIError(Exception):
+
+    # carries the attributes the Groq SDK errors expose
+
+    def __init__(self, status_code: int, headers: Optional[Dict[str, str]] = None):
+
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(status_code=status_code, headers=headers or {})
+
+
+class Flaky:
+
+    # raises the given errors in turn, then answers
+
+    def __init__(self, *errors: Exception):
+
+        self.errors: List[Exception] = list(errors)
+        self.calls: int = 0
+
+    def __call__(self) -> str:
+
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+@pytest.fixture
+def sleeps(monkeypatch) -> List[float]:
+
+    slept: List[float] = []
+    monkeypatch.setattr(rate_limiter.time, "sleep", slept.append)
+    return slept
+
+
+def limiter(**kwargs) -> RateLimiter:
+
+    return RateLimiter(requests_per_minute=0, tokens_per_minute=0, **kwargs)
+
+
+@pytest.mark.parametrize("value, seconds", [("2", 2.0), ("7.66s", 7.66), ("2m59.56s", 179.56), ("120ms", 0.12), ("1h", 3600.0)])
+def test_parse_duration(value, seconds):
+
+    assert parse_duration(value) == pytest.approx(seconds)
+
+
+def test_parse_duration_rejects_other_values():
+
+    assert parse_duration("") is None
+    assert parse_duration("soon") is None
+
+
+def test_token_bucket_waits_once_empty():
+
+    bucket = TokenBucket(per_minute=60)
+    assert bucket.reserve(60) == 0.0
+    assert bucket.reserve(30) == pytest.approx(30.0, abs=0.1)
+    # usage below the reservation is given back
+    bucket.adjust(-30)
+    assert bucket.reserve(1) == pytest.approx(1.0, abs=0.1)
+
+
+def test_rate_limit_halves_the_concurrency_limit(sleeps):
+
+    rl = limiter(max_concurrency=8)
+    assert rl.call(Flaky(FakeAPIError(429))) == "ok"
+    assert rl.concurrency_limit == 4
+
+    rl.call(Flaky(FakeAPIError(429), FakeAPIError(429)))
+    assert rl.concurrency_limit >= 1
+    assert rl.concurrency_limit < 4
+
+
+def test_concurrency_limit_stays_above_minimum(sleeps):
+
+    rl = limiter(max_concurrency=4, min_concurrency=2, max_retries=10)
+    rl.call(Flaky(*[FakeAPIError(429) for _ in range(5)]))
+    assert rl.concurrency_limit >= 2
+
+
+def test_successes_grow_the_limit_back(sleeps):
+
+    rl = limiter(max_concurrency=4)
+    rl.call(Flaky(FakeAPIError(429)))
+    assert rl.concurrency_limit == 2
+    for _ in range(10):
+        rl.call(Flaky())
+    assert rl.concurrency_limit == 4
+
+
+def test_retry_after_header_is_respected(sleeps):
+
+    rl = limiter(base_delay=0.01, max_delay=0.01)
+    rl.call(Flaky(FakeAPIError(429, {"retry-after": "7"})))
+    # every caller is paused for the retry-after, and the retry waits at least as long
+    assert max(sleeps) >= 7.0 - 0.1
+
+
+def test_non_retryable_error_raises_at_once(sleeps):
+
+    rl = limiter()
+    fn = Flaky(FakeAPIError(400))
+    with pytest.raises(FakeAPIError):
+        rl.call(fn)
+    assert fn.calls == 1
+    assert sleeps == []
+    assert rl.concurrency_limit == rl.max_concurrency
+
+
+def test_server_errors_are_retried(sleeps):
+
+    rl = limiter()
+    fn = Flaky(FakeAPIError(503), FakeAPIError(500))
+    assert rl.call(fn) == "ok"
+    assert fn.calls == 3
+    # only rate limits shrink the concurrency limit
+    assert rl.concurrency_limit == rl.max_concurrency
+
+
+def test_retries_are_bounded_by_max_retries(sleeps):
+
+    rl = limiter(max_retries=3)
+    fn = Flaky(*[FakeAPIError(429) for _ in range(10)])
+    with pytest.raises(FakeAPIError):
+        rl.call(fn)
+    assert fn.calls == 4
+
+
+def test_used_tokens_correct_the_reservation(sleeps):
+
+    rl = RateLimiter(requests_per_minute=0, tokens_per_minute=600)
+    rl.call(lambda: "ok", estimated_tokens=600, used_tokens=lambda result: 60)
+    # 540 of the 600 reserved tokens were given back
+    assert rl.tokens.reserve(540) == 0.0